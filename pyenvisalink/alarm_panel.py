@@ -1,12 +1,19 @@
 import asyncio
 import logging
 import re
+import time
 from enum import Enum
 from functools import partial
 
 import aiohttp
 
-from .alarm_state import AlarmState
+from .alarm_state import (
+    PARTITION_INDEX_FIELDS,
+    ZONE_INDEX_FIELDS,
+    AlarmState,
+    StateIndex,
+)
+from .callback_dispatcher import OVERFLOW_MERGE, CallbackDispatcher
 from .const import (
     EVL3_MAX_ZONES,
     EVL4_MAX_ZONES,
@@ -15,14 +22,30 @@ from .const import (
     PANEL_TYPE_HONEYWELL,
     PANEL_TYPE_UNO,
 )
+from .discovery_cache import DISCOVERY_FIELDS
 from .dsc_client import DSCClient
+from .event_history import DEFAULT_EVENT_HISTORY_SIZE, EventHistory
 from .honeywell_client import HoneywellClient
+from .state_snapshot import (
+    build_snapshot,
+    invalidate_snapshot_metadata,
+    load_snapshot,
+    restore_alarm_state,
+    save_snapshot,
+)
 from .uno_client import UnoClient
 
 _LOGGER = logging.getLogger(__name__)
 
 COMMAND_ERR = "Cannot run this command while disconnected. Please run start() first."
 
+# Used to scrape the panel details from the EVL's web interface
+_TITLE_REGEX = re.compile(r"<TITLE>([^<]+)<\/TITLE>")
+_EVL_VERSION_REGEX = re.compile(r"Envisalink (.+)")
+_PANEL_TYPE_REGEX = re.compile(r">Security Subsystem - ([^<]*)<")
+_FIRMWARE_REGEX = re.compile(r"Firmware Version: ([^ ]*)")
+_MAC_REGEX = re.compile(r"MAC: ([0-9a-fA-F]*)")
+
 
 class EnvisalinkAlarmPanel:
     """This class represents an envisalink-based alarm panel."""
@@ -49,6 +72,16 @@ class EnvisalinkAlarmPanel:
         commandTimeout=5.0,
         httpPort=8080,
         httpHost=None,
+        commandPipelineDepth=1,
+        stateChangeBatchWindow=None,
+        callbackQueueSize=0,
+        callbackWorkers=1,
+        callbackOverflowPolicy=OVERFLOW_MERGE,
+        stateSnapshotFile=None,
+        discoveryCache=None,
+        httpSession=None,
+        captureFile=None,
+        eventHistorySize=DEFAULT_EVENT_HISTORY_SIZE,
     ):
         self._macAddress = None
         self._firmwareVersion = None
@@ -65,9 +98,26 @@ class EnvisalinkAlarmPanel:
         self._zoneTimerInterval = zoneTimerInterval
         self._maxPartitions = EnvisalinkAlarmPanel.get_max_partitions()
         self._alarmState = None
+        self._zoneIndex = None
+        self._partitionIndex = None
         self._client = None
         self._zoneBypassEnabled = zoneBypassEnabled
         self._commandTimeout = commandTimeout
+        self._commandPipelineDepth = commandPipelineDepth
+        self._stateChangeBatchWindow = stateChangeBatchWindow
+        self._callbackDispatcher = CallbackDispatcher(
+            callbackQueueSize, callbackWorkers, callbackOverflowPolicy
+        )
+        self._scheduler = None
+        self._stateSnapshotFile = stateSnapshotFile
+        self._snapshotTime = None
+        self._discoveryCache = discoveryCache
+        self._httpSession = httpSession
+        self._ownsHttpSession = False
+        self._lastConnectionResult = None
+        self._disconnectCount = 0
+        self._captureFile = captureFile
+        self._eventHistory = EventHistory(eventHistorySize) if eventHistorySize else None
 
         self._connectionStatusCallback = self._defaultCallback
         self._loginSuccessCallback = partial(self._defaultCallback, None)
@@ -78,6 +128,8 @@ class EnvisalinkAlarmPanel:
         self._partitionStateChangeCallback = self._defaultCallback
         self._zoneBypassStateChangeCallback = self._defaultCallback
         self._cidEventCallback = self._defaultCallback
+        # Only invoked if set since the details of each change are not needed otherwise
+        self._stateDiffCallback = None
 
     @property
     def host(self):
@@ -103,6 +155,14 @@ class EnvisalinkAlarmPanel:
     def command_timeout(self):
         return self._commandTimeout
 
+    @property
+    def command_pipeline_depth(self):
+        return self._commandPipelineDepth
+
+    @property
+    def state_change_batch_window(self):
+        return self._stateChangeBatchWindow
+
     @property
     def user_name(self):
         return self._username
@@ -139,6 +199,99 @@ class EnvisalinkAlarmPanel:
     def alarm_state(self):
         return self._alarmState
 
+    @property
+    def zone_index(self):
+        """StateIndex of the zones in alarm_state by the ZONE_INDEX_FIELDS, e.g.
+        zone_index.members("open") lists the open zones and zone_index.count("bypassed")
+        counts the bypassed zones."""
+        return self._zoneIndex
+
+    @property
+    def partition_index(self):
+        """StateIndex of the partitions in alarm_state by the PARTITION_INDEX_FIELDS, e.g.
+        partition_index.members(*PARTITION_ARMED_FIELDS) lists the armed partitions."""
+        return self._partitionIndex
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, scheduler):
+        """PeriodicScheduler used to run this panel's keepalives and zone timer dumps (e.g. one
+        shared by a PanelManager).  If not set, they run from the default scheduler shared by
+        all panels on the event loop."""
+        self._scheduler = scheduler
+
+    @property
+    def state_snapshot_file(self):
+        return self._stateSnapshotFile
+
+    @property
+    def discovery_cache(self):
+        return self._discoveryCache
+
+    @discovery_cache.setter
+    def discovery_cache(self, cache):
+        """DiscoveryCache used to skip discovering the panel type (and firmware version and
+        MAC address) when they are already known."""
+        self._discoveryCache = cache
+
+    @property
+    def capture_file(self):
+        return self._captureFile
+
+    @property
+    def event_history(self):
+        """EventHistory of the panel's state changes, or None if disabled (eventHistorySize
+        of 0).  It is kept across restarts of the panel."""
+        return self._eventHistory
+
+    @property
+    def http_session(self):
+        return self._httpSession
+
+    @http_session.setter
+    def http_session(self, session):
+        """aiohttp.ClientSession used to query the EVL's web interface.  It may be shared by
+        many panels and is not closed by the panel.  If not set the panel creates its own,
+        which is closed by stop() or close_http_session()."""
+        self._httpSession = session
+        self._ownsHttpSession = False
+
+    def get_http_session(self) -> aiohttp.ClientSession:
+        if self._httpSession is None or self._httpSession.closed:
+            self._httpSession = aiohttp.ClientSession()
+            self._ownsHttpSession = True
+        return self._httpSession
+
+    async def close_http_session(self):
+        """Close the HTTP session if it was created by this panel."""
+        if self._ownsHttpSession and self._httpSession is not None:
+            await self._httpSession.close()
+            self._httpSession = None
+            self._ownsHttpSession = False
+
+    @property
+    def snapshot_time(self):
+        """Time at which the snapshot the current state was restored from was saved, or None
+        if the state was not restored from a snapshot."""
+        return self._snapshotTime
+
+    @property
+    def last_connection_result(self):
+        return self._lastConnectionResult
+
+    @property
+    def disconnect_count(self):
+        return self._disconnectCount
+
+    @property
+    def last_message_time(self):
+        if not self._client:
+            return 0
+        return self._client.last_message_time
+
     @property
     def firmware_version(self):
         return self._firmwareVersion
@@ -235,19 +388,47 @@ class EnvisalinkAlarmPanel:
     def callback_realtime_cid_event(self, value):
         self._cidEventCallback = value
 
+    @property
+    def callback_state_diff(self):
+        return self._stateDiffCallback
+
+    @callback_state_diff.setter
+    def callback_state_diff(self, value):
+        self._stateDiffCallback = value
+
+    def invoke_callback(self, callback, *args):
+        """Invoke one of the user callbacks (inline or through the callback queue)."""
+        self._callbackDispatcher.dispatch(callback, *args)
+
+    def callback_stats(self):
+        return self._callbackDispatcher.stats()
+
     def _defaultCallback(self, data):
         """This is the callback that occurs when the client doesn't subscribe."""
         _LOGGER.debug("Callback has not been set by client.")
 
     async def start(self):
+        snapshot = None
+        usingCachedDetails = False
+        if self._panelType is None and self._discoveryCache is not None:
+            details = self._discoveryCache.get(self._host, self._port)
+            if details and details["panel_type"]:
+                _LOGGER.debug("Using cached discovery details for %s", self._host)
+                self.restore_metadata(details)
+                usingCachedDetails = True
+
+        if self._stateSnapshotFile:
+            snapshot = load_snapshot(self._stateSnapshotFile, self._host, self._port)
+            if snapshot and self._panelType is None and not snapshot["metadata"].get("invalid"):
+                self.restore_metadata(snapshot["metadata"])
+                usingCachedDetails = self._panelType is not None
+
         if self._panelType is None:
             result = await self.discover_panel_type()
             if result != self.ConnectionResult.SUCCESS:
+                self._lastConnectionResult = result
                 return result
-
-        self._alarmState = AlarmState.get_initial_alarm_state(
-            max(EVL3_MAX_ZONES, EVL4_MAX_ZONES), MAX_PARTITIONS
-        )
+            self.cache_discovery_details()
 
         """Connect to the envisalink, and listen for events to occur."""
         logging.info(
@@ -257,19 +438,20 @@ class EnvisalinkAlarmPanel:
                 self._port,
             )
         )
-        self._syncConnect: asyncio.Future[self.ConnectionResult] = asyncio.Future()
-        if self._panelType == PANEL_TYPE_UNO:
-            self._client = UnoClient(self)
-            self._client.start()
-        elif self._panelType == PANEL_TYPE_HONEYWELL:
-            self._client = HoneywellClient(self)
-            self._client.start()
-        elif self._panelType == PANEL_TYPE_DSC:
-            self._client = DSCClient(self)
-            self._client.start()
+        if not self.create_client():
+            self._lastConnectionResult = self.ConnectionResult.INVALID_PANEL_TYPE
+            return self._lastConnectionResult
+
+        self._snapshotTime = None
+        if snapshot and snapshot["metadata"].get("panel_type") == self._panelType:
+            restore_alarm_state(self._alarmState, snapshot)
+            self._snapshotTime = snapshot["saved"]
+            _LOGGER.info("Restored alarm state saved at %s", time.ctime(self._snapshotTime))
         else:
-            _LOGGER.error("Unexpected panel type: '%s'", self._panelType)
-            return self.ConnectionResult.INVALID_PANEL_TYPE
+            snapshot = None
+        if snapshot:
+            self._client.restore_snapshot_data(snapshot["client"])
+        self._client.start()
 
         # Wait until we are successfully connected and authenticated
         try:
@@ -277,18 +459,102 @@ class EnvisalinkAlarmPanel:
         except asyncio.exceptions.TimeoutError:
             result = self.ConnectionResult.TIMEOUT
 
+        self._lastConnectionResult = result
         if result != self.ConnectionResult.SUCCESS:
             await self.stop()
+            if usingCachedDetails and result != self.ConnectionResult.CONNECTION_FAILED:
+                # Logging in failed so the cached details may be out of date (e.g. the EVL
+                # was replaced); rediscover them next time.
+                self.invalidate_discovery_details()
         return result
 
+    def create_client(self):
+        """Create fresh alarm state and a client for the panel type without connecting it
+        (start() does that).  Returns the client, or None if the panel type is unknown."""
+        self._zoneIndex = StateIndex(ZONE_INDEX_FIELDS)
+        self._partitionIndex = StateIndex(PARTITION_INDEX_FIELDS)
+        self._alarmState = AlarmState.get_initial_alarm_state(
+            max(EVL3_MAX_ZONES, EVL4_MAX_ZONES),
+            MAX_PARTITIONS,
+            self._zoneIndex,
+            self._partitionIndex,
+        )
+        self._syncConnect: asyncio.Future[self.ConnectionResult] = asyncio.Future()
+        if self._panelType == PANEL_TYPE_UNO:
+            self._client = UnoClient(self)
+        elif self._panelType == PANEL_TYPE_HONEYWELL:
+            self._client = HoneywellClient(self)
+        elif self._panelType == PANEL_TYPE_DSC:
+            self._client = DSCClient(self)
+        else:
+            _LOGGER.error("Unexpected panel type: '%s'", self._panelType)
+            self._client = None
+        return self._client
+
     async def stop(self):
         """Shut down and close our connection to the envisalink."""
         if self._client:
             _LOGGER.info("Disconnecting from the envisalink...")
             await self._client.stop()
+            await self._callbackDispatcher.stop()
+            await self.close_http_session()
+            if (
+                self._stateSnapshotFile
+                and self._lastConnectionResult == self.ConnectionResult.SUCCESS
+            ):
+                self.save_state_snapshot()
         else:
             _LOGGER.error(COMMAND_ERR)
 
+    def save_state_snapshot(self, path=None) -> bool:
+        """Save the current alarm state, client bookkeeping (e.g. Honeywell zone timers) and
+        discovered metadata to 'path' (defaults to stateSnapshotFile) so that it can be
+        restored by start() after a restart.  Restored zones and partitions are marked
+        'stale' until the panel reports on them."""
+        path = path or self._stateSnapshotFile
+        if not path or not self._client:
+            return False
+        snapshot = build_snapshot(self, self._client.get_snapshot_data())
+        try:
+            save_snapshot(path, snapshot)
+        except OSError as ex:
+            _LOGGER.error("Unable to save state snapshot to %s: %r", path, ex)
+            return False
+        return True
+
+    def cache_discovery_details(self, credentialsVerified=False, discoveryCache=None):
+        """Record the discovered details of the EVL in the discovery cache (the panel's own
+        unless another is given), if any.  Set 'credentialsVerified' if the EVL's web
+        interface has just accepted the credentials."""
+        cache = discoveryCache if discoveryCache is not None else self._discoveryCache
+        if cache is not None:
+            cache.put(
+                self._host,
+                self._port,
+                {
+                    "panel_type": self._panelType,
+                    "envisalink_version": self._evlVersion,
+                    "firmware_version": self._firmwareVersion,
+                    "mac_address": self._macAddress,
+                },
+                (self._username, self._password) if credentialsVerified else None,
+            )
+
+    def invalidate_discovery_details(self):
+        """Forget the discovered details of the EVL, both in the discovery cache and in the
+        state snapshot, so that the next start() discovers them again."""
+        self._panelType = None
+        if self._discoveryCache is not None:
+            self._discoveryCache.invalidate(self._host, self._port)
+        if self._stateSnapshotFile:
+            invalidate_snapshot_metadata(self._stateSnapshotFile)
+
+    def restore_metadata(self, metadata: dict):
+        self._panelType = metadata.get("panel_type")
+        self._evlVersion = metadata.get("envisalink_version", self._evlVersion)
+        self._firmwareVersion = metadata.get("firmware_version")
+        self._macAddress = metadata.get("mac_address")
+
     async def dump_zone_timers(self):
         """Request a zone timer dump from the envisalink."""
         if self._client:
@@ -382,126 +648,154 @@ class EnvisalinkAlarmPanel:
         else:
             _LOGGER.error(COMMAND_ERR)
 
-    async def discover_device_details(self) -> bool:
+    async def fetch_page(self, path, httpSession=None):
+        """Fetch a page from the EVL's web interface (over the given HTTP session, or the
+        panel's own) and return its status and (if it was fetched successfully) its HTML."""
+        session = httpSession or self.get_http_session()
+        async with session.get(
+            f"http://{self._httpHost}:{self._httpPort}{path}",
+            auth=aiohttp.BasicAuth(self._username, self._password),
+            timeout=aiohttp.ClientTimeout(total=self.connection_timeout),
+        ) as resp:
+            if resp.status != 200:
+                return resp.status, None
+            return resp.status, await resp.text()
+
+    async def discover_device_details(self, httpSession=None) -> bool:
+        try:
+            status, html = await self.fetch_page("/2", httpSession)
+        except Exception as ex:
+            _LOGGER.error("Unable to fetch panel information: %s", ex)
+            self._evlVersion = 0
+            self._panelType = None
+            return False
+
+        return self.parse_device_details(status, html)
+
+    def parse_device_details(self, status, html) -> bool:
+        """Scrape the EVL version and panel type from the EVL's '/2' page."""
         self._evlVersion = 0
         self._panelType = None
 
-        try:
-            async with aiohttp.ClientSession(
-                auth=aiohttp.BasicAuth(self._username, self._password),
-                timeout=aiohttp.ClientTimeout(total=self.connection_timeout),
-            ) as client:
-                url = f"http://{self._httpHost}:{self._httpPort}/2"
-                resp = await client.get(url)
-                if resp.status != 200:
-                    _LOGGER.warn(
-                        "Unable to discover Envisalink version and panel type: '%s'",
-                        resp.status,
-                    )
-                    return False
-
-                # Try and scrape the HTML for the EVL version and panel type
-                html = await resp.text()
-                success = True
-
-                m = re.search(r"<TITLE>([^<]+)<\/TITLE>", html)
-                if m is None or m.lastindex != 1:
-                    success = False
-                elif m.group(1).upper() == PANEL_TYPE_UNO:
-                    self._evlVersion = 0
+        if status != 200:
+            _LOGGER.warning("Unable to discover Envisalink version and panel type: '%s'", status)
+            return False
+
+        success = True
+        m = _TITLE_REGEX.search(html)
+        if m is None:
+            success = False
+        elif m.group(1).upper() == PANEL_TYPE_UNO:
+            self._evlVersion = 0
+            self._panelType = PANEL_TYPE_UNO
+        else:
+            m2 = _EVL_VERSION_REGEX.search(m.group(1))
+            if m2:
+                self._evlVersion = m2.group(1)
+
+            m = _PANEL_TYPE_REGEX.search(html)
+            if m:
+                panelType = m.group(1).upper()
+                # Handle the UNO STANDALONE variant
+                if PANEL_TYPE_UNO in panelType:
                     self._panelType = PANEL_TYPE_UNO
                 else:
-                    m = re.search(r"Envisalink (.+)", m.group(1))
-                    if m and m.lastindex == 1:
-                        self._evlVersion = m.group(1)
-
-                    panel_regex = ">Security Subsystem - ([^<]*)<"
-                    m = re.search(panel_regex, html)
-                    if m and m.lastindex == 1:
-                        panelType = m.group(1).upper()
-                        # Handle the UNO STANDALONE variant
-                        if PANEL_TYPE_UNO in panelType:
-                            self._panelType = PANEL_TYPE_UNO
-                        else:
-                            self._panelType = panelType
-                    else:
-                        success = False
-
-                if success:
-                    if self._panelType not in [
-                        PANEL_TYPE_DSC,
-                        PANEL_TYPE_HONEYWELL,
-                        PANEL_TYPE_UNO,
-                    ]:
-                        _LOGGER.warn("Unrecognized panel type: %s", self._panelType)
-                else:
-                    _LOGGER.warn("Unable to parse panel info: raw HTML: %s", html)
-
-        except Exception as ex:
-            _LOGGER.error("Unable to fetch panel information: %s", ex)
-            return self.ConnectionResult.CONNECTION_FAILED
+                    self._panelType = panelType
+            else:
+                success = False
+
+        if success:
+            if self._panelType not in [
+                PANEL_TYPE_DSC,
+                PANEL_TYPE_HONEYWELL,
+                PANEL_TYPE_UNO,
+            ]:
+                _LOGGER.warning("Unrecognized panel type: %s", self._panelType)
+        else:
+            _LOGGER.warning("Unable to parse panel info: raw HTML: %s", html)
 
         _LOGGER.info("Discovered Envisalink %s: %s", self._evlVersion, self._panelType)
         return True
 
-    async def discover(self) -> ConnectionResult:
+    async def discover(self, httpSession=None, discoveryCache=None) -> ConnectionResult:
+        """Discover the firmware version, MAC address, EVL version and panel type of the EVL
+        from its web interface.  Both pages needed are fetched at the same time over the
+        given HTTP session (or the panel's own).  If all of the details are in the discovery
+        cache (the given one or the panel's own), and the EVL accepted the same credentials
+        when they were discovered, it is not contacted at all."""
+        cache = discoveryCache if discoveryCache is not None else self._discoveryCache
+        if cache is not None:
+            details = cache.get(self._host, self._port)
+            if (
+                details
+                and cache.credentials_verified(
+                    self._host, self._port, self._username, self._password
+                )
+                and all(details[field] is not None for field in DISCOVERY_FIELDS)
+            ):
+                self.restore_metadata(details)
+                _LOGGER.info(
+                    "Using cached discovery details for %s: Firmware Version: '%s' / "
+                    "MAC address: '%s'",
+                    self._host,
+                    self._firmwareVersion,
+                    self._macAddress,
+                )
+                return self.ConnectionResult.SUCCESS
+
         self._macAddress = None
         self._firmwareVersion = None
 
-        try:
-            async with aiohttp.ClientSession(
-                auth=aiohttp.BasicAuth(self._username, self._password),
-                timeout=aiohttp.ClientTimeout(total=self.connection_timeout),
-            ) as client:
-                url = f"http://{self._httpHost}:{self._httpPort}/3"
-                resp = await client.get(url)
-                if resp.status == 401:
-                    _LOGGER.error("Unable to validate connection: invalid authorization.")
-                    return self.ConnectionResult.INVALID_AUTHORIZATION
-                elif resp.status == 404:
-                    # Connection was successful but unable to extract FW and MAC info
-                    _LOGGER.warn(
-                        (
-                            "Connection successful but unable to fetch FW/MAC: "
-                            "404 (page not found): '%s'"
-                        ),
-                        url,
-                    )
-                elif resp.status != 200:
-                    # Connection was successful but unable to extract FW and MAC info
-                    _LOGGER.warn(
-                        "Connection successful but unable to fetch FW/MAC: '%s'",
-                        resp.status,
-                    )
-                else:
-                    # Attempt to extract the firmware version and MAC address from the returned HTML
-                    html = await resp.text()
-                    fw_regex = "Firmware Version: ([^ ]*)"
-                    mac_regex = "MAC: ([0-9a-fA-F]*)"
-
-                    m = re.search(fw_regex, html)
-                    if m is None or m.lastindex != 1:
-                        _LOGGER.warn("# Unable to extract Firmware version")
-                    else:
-                        self._firmwareVersion = m.group(1)
-
-                    m = re.search(mac_regex, html)
-                    if m is None or m.lastindex != 1:
-                        _LOGGER.warn("# Unable to extract MAC address")
-                    else:
-                        self._macAddress = m.group(1).lower()
-        except Exception as ex:
-            _LOGGER.error("Unable to validate connection: %r", ex)
+        statusPage, detailsPage = await asyncio.gather(
+            self.fetch_page("/3", httpSession),
+            self.fetch_page("/2", httpSession),
+            return_exceptions=True,
+        )
+        if isinstance(statusPage, Exception):
+            _LOGGER.error("Unable to validate connection: %r", statusPage)
             return self.ConnectionResult.CONNECTION_FAILED
 
-        await self.discover_device_details()
+        status, html = statusPage
+        if status == 401:
+            _LOGGER.error("Unable to validate connection: invalid authorization.")
+            return self.ConnectionResult.INVALID_AUTHORIZATION
+        elif status == 404:
+            # Connection was successful but unable to extract FW and MAC info
+            _LOGGER.warning(
+                "Connection successful but unable to fetch FW/MAC: 404 (page not found): '%s'",
+                f"http://{self._httpHost}:{self._httpPort}/3",
+            )
+        elif status != 200:
+            # Connection was successful but unable to extract FW and MAC info
+            _LOGGER.warning("Connection successful but unable to fetch FW/MAC: '%s'", status)
+        else:
+            # Attempt to extract the firmware version and MAC address from the returned HTML
+            m = _FIRMWARE_REGEX.search(html)
+            if m is None:
+                _LOGGER.warning("# Unable to extract Firmware version")
+            else:
+                self._firmwareVersion = m.group(1)
+
+            m = _MAC_REGEX.search(html)
+            if m is None:
+                _LOGGER.warning("# Unable to extract MAC address")
+            else:
+                self._macAddress = m.group(1).lower()
+
+        if isinstance(detailsPage, Exception):
+            _LOGGER.error("Unable to fetch panel information: %s", detailsPage)
+            self._evlVersion = 0
+            self._panelType = None
+        else:
+            self.parse_device_details(*detailsPage)
+        self.cache_discovery_details(True, cache)
 
         _LOGGER.info(
             f"Firmware Version: '{self._firmwareVersion}' / MAC address: '{self._macAddress}'"
         )
         return self.ConnectionResult.SUCCESS
 
-    async def discover_panel_type(self) -> ConnectionResult:
+    async def discover_panel_type(self, httpSession=None) -> ConnectionResult:
         _LOGGER.info("Checking panel type for %s", self.host)
         self._panelType = None
         try:
@@ -520,7 +814,7 @@ class EnvisalinkAlarmPanel:
                 elif HoneywellClient.detect(data):
                     # This could be either a Honeywell or UNO panel so try and query the
                     # web interface on the device to determine which one it is.
-                    if not await self.discover_device_details():
+                    if not await self.discover_device_details(httpSession):
                         # Unable to determine type so default to Honeywell
                         self._panelType = PANEL_TYPE_HONEYWELL
 
@@ -549,23 +843,35 @@ class EnvisalinkAlarmPanel:
             return False
         return self._client.is_online()
 
+    def command_latency_stats(self):
+        if not self._client:
+            return {}
+        return self._client.command_latency_stats()
+
+    def keypad_cache_stats(self):
+        if not self._client:
+            return {}
+        return self._client.keypad_cache_stats()
+
     def handle_connection_status(self, status):
-        if not status and not self._syncConnect.done():
-            self._syncConnect.set_result(self.ConnectionResult.CONNECTION_FAILED)
+        if not status:
+            self._disconnectCount += 1
+            if not self._syncConnect.done():
+                self._syncConnect.set_result(self.ConnectionResult.CONNECTION_FAILED)
 
-        self.callback_connection_status(status)
+        self.invoke_callback(self.callback_connection_status, status)
 
     def handle_login_success(self):
         if not self._syncConnect.done():
             self._syncConnect.set_result(self.ConnectionResult.SUCCESS)
-        self.callback_login_success()
+        self.invoke_callback(self.callback_login_success)
 
     def handle_login_failure(self):
         if not self._syncConnect.done():
             self._syncConnect.set_result(self.ConnectionResult.INVALID_AUTHORIZATION)
-        self.callback_login_failure()
+        self.invoke_callback(self.callback_login_failure)
 
     def handle_login_timeout(self):
         if not self._syncConnect.done():
             self._syncConnect.set_result(self.ConnectionResult.INVALID_AUTHORIZATION)
-        self.callback_login_timeout()
+        self.invoke_callback(self.callback_login_timeout)
@@ -1,51 +1,387 @@
+from collections.abc import MutableMapping
+
+_UNSET = object()
+
+
+class _StateMapping(MutableMapping):
+    """Base class for the slotted alarm state records.
+
+    Each record stores its fields in __slots__ rather than a per-instance dict, but still
+    behaves like the dict it replaces so that existing consumers using
+    alarm_state["zone"][n]["status"]["open"] keep working.  A slot that has never been
+    assigned is treated as a missing key."""
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fieldset = frozenset(cls._fields)
+
+    def __getitem__(self, key):
+        if key in self._fieldset:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fieldset:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self._fieldset:
+            raise KeyError(key)
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for key in self._fields:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def update(self, other=(), **kwargs):
+        """Faster version of MutableMapping.update for the common dict case."""
+        if isinstance(other, dict):
+            for key, value in other.items():
+                self[key] = value
+        else:
+            super().update(other)
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def apply(self, values: dict) -> dict:
+        """Update the record from a dict and return the fields whose value actually changed as
+        {field: (old, new)} (old is None for a field that was not previously set)."""
+        changes = {}
+        fieldset = self._fieldset
+        for key, value in values.items():
+            if key in fieldset:
+                old = getattr(self, key, _UNSET)
+                if old == value:
+                    continue
+                setattr(self, key, value)
+            else:
+                old = self.get(key, _UNSET)
+                if old == value:
+                    continue
+                self[key] = value
+            changes[key] = (None if old is _UNSET else old, value)
+        return changes
+
+    def as_dict(self) -> dict:
+        """Return a plain (deep) dict copy of this record, e.g. for json.dumps()."""
+        result = {}
+        for key, value in self.items():
+            if isinstance(value, _StateMapping):
+                value = value.as_dict()
+            result[key] = value
+        return result
+
+    def copy(self) -> dict:
+        """Return a plain dict copy of this record as dict.copy() did when the alarm state
+        was made of dicts.  Nested records are copied too rather than shared."""
+        return self.as_dict()
+
+
+class _StatusMapping(_StateMapping):
+    """Base class for the status records, which carry a 'stale' attribute.  A record is
+    stale when it was restored from a state snapshot and the panel has not reported on it
+    since.  It is not one of the record's fields, so it never appears as a key."""
+
+    __slots__ = ("stale",)
+
+    def apply(self, values: dict) -> dict:
+        """As _StateMapping.apply(), but an update from the panel also clears the stale
+        marker."""
+        changes = super().apply(values)
+        if self.stale:
+            self.stale = False
+        return changes
+
+
+class StateIndex:
+    """Bitset index of the zones (or partitions) that have each of a set of boolean fields
+    set, e.g. which zones are open.  Bit N of a field's bitset is set when zone N has that
+    field set, so a query costs time proportional to the number of matching zones rather
+    than the number of zones.  The records keep the index up to date as they are changed."""
+
+    __slots__ = ("_bits",)
+
+    def __init__(self, fields):
+        self._bits = dict.fromkeys(fields, 0)
+
+    @property
+    def fields(self) -> tuple:
+        return tuple(self._bits)
+
+    def set(self, field, bit, value):
+        if value:
+            self._bits[field] |= bit
+        else:
+            self._bits[field] &= ~bit
+
+    def bits(self, *fields) -> int:
+        """Return the bitset of the records with any of the given fields set."""
+        bits = 0
+        for field in fields:
+            bits |= self._bits[field]
+        return bits
+
+    def members(self, *fields) -> list:
+        """Return the (ascending) numbers of the records with any of the given fields set."""
+        bits = self.bits(*fields)
+        members = []
+        while bits:
+            lowest = bits & -bits
+            members.append(lowest.bit_length() - 1)
+            bits ^= lowest
+        return members
+
+    def count(self, *fields) -> int:
+        return bin(self.bits(*fields)).count("1")
+
+    def is_set(self, field, number) -> bool:
+        return bool(self._bits[field] >> number & 1)
+
+
+class _IndexedMapping:
+    """Mixin for records whose boolean fields named in '_indexed' are tracked in a
+    StateIndex (given to the record when it is created, along with its bit).  The index is
+    kept up to date by apply() and item assignment and deletion, so those fields must be
+    changed through them rather than by assigning the attribute."""
+
+    __slots__ = ()
+    _indexed = frozenset()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key in self._indexed and self._index is not None:
+            self._index.set(key, self._bit, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        if key in self._indexed and self._index is not None:
+            self._index.set(key, self._bit, False)
+
+    def apply(self, values: dict) -> dict:
+        changes = super().apply(values)
+        if changes and self._index is not None:
+            indexed = self._indexed
+            for key, change in changes.items():
+                if key in indexed:
+                    self._index.set(key, self._bit, change[1])
+        return changes
+
+
+# Fields of the zone and partition records that are indexed
+ZONE_INDEX_FIELDS = ("open", "fault", "alarm", "tamper", "low_battery", "bypassed")
+PARTITION_INDEX_FIELDS = (
+    "ready",
+    "alarm",
+    "armed_away",
+    "armed_stay",
+    "armed_zero_entry_delay",
+    "armed_night",
+)
+PARTITION_ARMED_FIELDS = ("armed_away", "armed_stay", "armed_zero_entry_delay", "armed_night")
+
+
+class ZoneStatus(_IndexedMapping, _StatusMapping):
+    """Status flags for a single zone."""
+
+    _fields = ("open", "fault", "alarm", "tamper", "low_battery")
+    __slots__ = _fields + ("_index", "_bit")
+    _indexed = frozenset(ZONE_INDEX_FIELDS)
+
+    def __init__(self, index=None, number=0):
+        self._index = index
+        self._bit = 1 << number
+        self.open = False
+        self.fault = False
+        self.alarm = False
+        self.tamper = False
+        self.low_battery = False
+        self.stale = False
+
+
+class ZoneState(_StateMapping):
+    """State of a single zone."""
+
+    _fields = ("status", "last_fault", "bypassed", "updated")
+    __slots__ = ("status", "last_fault", "_bypassed", "updated", "_index", "_bit")
+
+    def __init__(self, index=None, number=0):
+        self._index = index
+        self._bit = 1 << number
+        self.status = ZoneStatus(index, number)
+        self.last_fault = 0
+        self._bypassed = False
+        self.updated = 0.0
+
+    # The clients set 'bypassed' directly so it is a property that keeps the index up to date
+    @property
+    def bypassed(self):
+        return self._bypassed
+
+    @bypassed.setter
+    def bypassed(self, value):
+        self._bypassed = value
+        if self._index is not None:
+            self._index.set("bypassed", self._bit, value)
+
+    @bypassed.deleter
+    def bypassed(self):
+        del self._bypassed
+        if self._index is not None:
+            self._index.set("bypassed", self._bit, False)
+
+
+class PartitionStatus(_IndexedMapping, _StatusMapping):
+    """Status flags for a single partition.
+
+    'chime' and 'armed' are only reported by some panels so they are left unset (i.e.
+    missing) until the panel reports them.  Keys that are not known ahead of time (e.g.
+    the DSC 'pgm_N_last_triggered' entries) are kept in a small overflow dict."""
+
+    _fields = (
+        "partition_state",
+        "alpha",
+        "ac_present",
+        "beep",
+        "armed_bypass",
+        "entry_delay",
+        "exit_delay",
+        "last_armed_by_user",
+        "last_disarmed_by_user",
+        "ready",
+        "bat_trouble",
+        "trouble",
+        "fire",
+        "panic",
+        "alarm",
+        "alarm_fire_zone",
+        "alarm_in_memory",
+        "armed_away",
+        "armed_stay",
+        "armed_zero_entry_delay",
+        "armed_night",
+        "bell_trouble",
+        "chime",
+        "armed",
+    )
+    __slots__ = _fields + ("_extra", "_index", "_bit")
+    _indexed = frozenset(PARTITION_INDEX_FIELDS)
+
+    def __init__(self, index=None, number=0):
+        self._index = index
+        self._bit = 1 << number
+        self.partition_state = "N/A"
+        self.alpha = "N/A"
+        self.ac_present = True
+        self.beep = False
+        self.armed_bypass = False
+        self.entry_delay = False
+        self.exit_delay = False
+        self.last_armed_by_user = ""
+        self.last_disarmed_by_user = ""
+        self.ready = False
+        self.bat_trouble = False
+        self.trouble = False
+        self.fire = False
+        self.panic = False
+        self.alarm = False
+        self.alarm_fire_zone = False
+        self.alarm_in_memory = False
+        self.armed_away = False
+        self.armed_stay = False
+        self.armed_zero_entry_delay = False
+        self.armed_night = False
+        self.bell_trouble = False
+        self.stale = False
+        self._extra = None
+
+    def __getitem__(self, key):
+        if key in self._fieldset:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._fieldset:
+            super().__setitem__(key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fieldset:
+            super().__delitem__(key)
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        yield from super().__iter__()
+        if self._extra:
+            yield from self._extra
+
+
+class PartitionState(_StateMapping):
+    """State of a single partition."""
+
+    _fields = ("status",)
+    __slots__ = _fields
+
+    def __init__(self, index=None, number=0):
+        self.status = PartitionStatus(index, number)
+
+
 class AlarmState:
     """Helper class for alarm state functionality."""
 
     @staticmethod
-    def get_initial_alarm_state(maxZones, maxPartitions):
-        """Builds the proper alarm state collection."""
+    def get_initial_alarm_state(maxZones, maxPartitions, zoneIndex=None, partitionIndex=None):
+        """Builds the proper alarm state collection.  The zones and partitions are tracked in
+        the given StateIndexes, if any."""
 
         _alarmState = {"partition": {}, "zone": {}}
 
         for i in range(1, maxPartitions + 1):
-            _alarmState["partition"][i] = {
-                "status": {
-                    "partition_state": "N/A",
-                    "alpha": "N/A",
-                    "ac_present": True,
-                    "beep": False,
-                    "armed_bypass": False,
-                    "entry_delay": False,
-                    "exit_delay": False,
-                    "last_armed_by_user": "",
-                    "last_disarmed_by_user": "",
-                    "ready": False,
-                    "bat_trouble": False,
-                    "trouble": False,
-                    "fire": False,
-                    "panic": False,
-                    "alarm": False,
-                    "alarm_fire_zone": False,
-                    "alarm_in_memory": False,
-                    "armed_away": False,
-                    "armed_stay": False,
-                    "armed_zero_entry_delay": False,
-                    "armed_night": False,
-                    "bell_trouble": False,
-                }
-            }
+            _alarmState["partition"][i] = PartitionState(partitionIndex, i)
         for j in range(1, maxZones + 1):
-            _alarmState["zone"][j] = {
-                "status": {
-                    "open": False,
-                    "fault": False,
-                    "alarm": False,
-                    "tamper": False,
-                    "low_battery": False,
-                },
-                "last_fault": 0,
-                "bypassed": False,
-                "updated": 0.0,
-            }
+            _alarmState["zone"][j] = ZoneState(zoneIndex, j)
 
         return _alarmState
+
+    @staticmethod
+    def as_dict(alarmState) -> dict:
+        """Return a plain dict copy of an alarm state collection (e.g. for json.dumps())."""
+        return {
+            kind: {number: record.as_dict() for number, record in records.items()}
+            for kind, records in alarmState.items()
+        }
+
+    @staticmethod
+    def json_default(value):
+        """'default' for json.dumps() so that alarm state records can be serialized directly,
+        e.g. json.dumps(panel.alarm_state, default=AlarmState.json_default)."""
+        if isinstance(value, _StateMapping):
+            return value.as_dict()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
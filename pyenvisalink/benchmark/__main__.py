@@ -0,0 +1,140 @@
+"""Measure the throughput and latency of the clients against the bundled mock EVLs.
+
+    python -m pyenvisalink.benchmark --panel-type DSC --zones 128 --panels 10 --rate 200 \\
+        --output results.json --baseline previous.json
+
+Each run reports messages processed per second, the time taken to process each message,
+the latency from a zone changing on the mock EVL to the zone callback and the round trip
+time of a command.  Results are written as JSON and, if a baseline file from a previous run
+is given, any metric more than --threshold worse than the baseline is reported and the exit
+status is non-zero."""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from ..const import EVL3_MAX_ZONES, PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO
+from .runner import compare_results, environment, run_benchmark
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m pyenvisalink.benchmark",
+        description="Benchmark the pyenvisalink clients against in-process mock EVLs.",
+    )
+    parser.add_argument(
+        "--panel-type",
+        action="append",
+        choices=[PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO],
+        help="Panel type to benchmark (may be repeated; defaults to all)",
+    )
+    parser.add_argument(
+        "--zones",
+        type=int,
+        action="append",
+        choices=[64, 128],
+        help="Zone count, i.e. EVL3 (64) or EVL4 (128) (may be repeated; defaults to 128)",
+    )
+    parser.add_argument("--panels", type=int, default=1, help="Number of panels per run")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=100.0,
+        help="Zone changes per second per panel (0 for as fast as possible)",
+    )
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument(
+        "--command-interval",
+        type=float,
+        default=0.1,
+        help="Seconds between the commands timed on each panel (0 to send none)",
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=None,
+        help="Panel stateChangeBatchWindow (default: callbacks are not batched)",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results with this earlier JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fraction by which a metric may be worse than the baseline (default 0.1)",
+    )
+    return parser.parse_args(argv)
+
+
+async def run(args) -> dict:
+    runs = []
+    for panelType in args.panel_type or [PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO]:
+        for zones in args.zones or [128]:
+            evlVersion = "3" if zones == EVL3_MAX_ZONES else "4"
+            result = await run_benchmark(
+                panelType,
+                evlVersion,
+                args.panels,
+                args.rate,
+                args.duration,
+                args.command_interval,
+                args.batch_window,
+            )
+            result["name"] = f"{panelType}-{zones}z-{args.panels}p"
+            print_result(result)
+            runs.append(result)
+    return {"environment": environment(), "runs": runs}
+
+
+def print_result(result):
+    parse = result["parse_latency_us"]
+    callback = result["callback_latency_ms"]
+    command = result["command_rtt_ms"]
+    print(f"{result['name']}:")
+    print(
+        f"  {result['messages']} messages in {result['duration']:.2f}s "
+        f"({result['messages_per_sec']:.0f}/s, {result['cpu_seconds']:.2f}s CPU)"
+    )
+    if parse["count"]:
+        print(
+            f"  parse latency (us):     p50 {parse['p50']:.1f}  p90 {parse['p90']:.1f}  "
+            f"p99 {parse['p99']:.1f}  max {parse['max']:.1f}"
+        )
+    if callback["count"]:
+        print(
+            f"  callback latency (ms):  p50 {callback['p50']:.2f}  p90 {callback['p90']:.2f}  "
+            f"p99 {callback['p99']:.2f}  max {callback['max']:.2f}"
+        )
+    if command["count"]:
+        print(
+            f"  command round trip (ms): p50 {command['p50']:.2f}  p90 {command['p90']:.2f}  "
+            f"p99 {command['p99']:.2f}  max {command['max']:.2f}"
+        )
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        for name, metric, old, new, change in regressions:
+            print(f"REGRESSION {name} {metric}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
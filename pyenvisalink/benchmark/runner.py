@@ -0,0 +1,259 @@
+import asyncio
+import itertools
+import logging
+import platform
+import sys
+import time
+
+from ..alarm_panel import EnvisalinkAlarmPanel
+from ..mock_panel_server import MockPanelServer
+
+_LOGGER = logging.getLogger(__name__)
+
+# How often the load generator sends a batch of zone changes
+_TICK = 0.01
+
+# Zone changes sent per batch when the load generator is not rate limited
+_UNTHROTTLED_BATCH = 50
+
+# Time allowed for the panels to log in and settle before measuring
+_SETTLE_TIME = 1.0
+
+# Metrics compared against a baseline and whether a higher value is better
+COMPARED_METRICS = {
+    ("messages_per_sec",): True,
+    ("parse_latency_us", "p50"): False,
+    ("parse_latency_us", "p99"): False,
+    ("callback_latency_ms", "p50"): False,
+    ("callback_latency_ms", "p99"): False,
+    ("command_rtt_ms", "p50"): False,
+    ("command_rtt_ms", "p99"): False,
+}
+
+
+def percentiles(samples, scale=1.0) -> dict:
+    """Summarise a list of samples (scaled by 'scale') as percentiles."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def at(fraction):
+        return ordered[min(count - 1, int(fraction * count))] * scale
+
+    return {
+        "count": count,
+        "mean": sum(ordered) / count * scale,
+        "p50": at(0.50),
+        "p90": at(0.90),
+        "p99": at(0.99),
+        "max": ordered[-1] * scale,
+    }
+
+
+class PanelProbe:
+    """Measures one panel: the time taken to process each message received from the EVL and
+    the time from a zone being changed on the mock EVL to the panel's zone callback.
+
+    Callback latency is measured from the most recent change of each zone, so zone changes
+    that the panel only reports later (e.g. Honeywell zones closing, which are only noticed
+    once the keypad stops cycling through them) show up as a long tail."""
+
+    def __init__(self, panel: EnvisalinkAlarmPanel):
+        self.panel = panel
+        self.zoneChanges = 0
+        self.parseSamples = []
+        self.callbackSamples = []
+        self.commandSamples = []
+        self.commandsFailed = 0
+        self.zoneChangeTimes = {}
+        panel.callback_zone_state_change = self.zone_state_change
+
+    def instrument(self):
+        """Time every message processed by the panel's client."""
+        client = self.panel._client
+        processData = client.process_data
+        samples = self.parseSamples
+        counter = time.perf_counter
+
+        def timed_process_data(data):
+            start = counter()
+            processData(data)
+            samples.append(counter() - start)
+
+        client.process_data = timed_process_data
+
+    def reset(self):
+        self.parseSamples.clear()
+        self.callbackSamples.clear()
+        self.commandSamples.clear()
+        self.commandsFailed = 0
+        self.zoneChanges = 0
+        self.zoneChangeTimes.clear()
+
+    def zone_changed(self, zone):
+        self.zoneChanges += 1
+        self.zoneChangeTimes[zone] = time.perf_counter()
+
+    def zone_state_change(self, zones):
+        now = time.perf_counter()
+        changeTimes = self.zoneChangeTimes
+        for zone in zones:
+            changed = changeTimes.pop(zone, None)
+            if changed is not None:
+                self.callbackSamples.append(now - changed)
+
+    async def send_commands(self, interval):
+        """Repeatedly time the round trip of a command until cancelled."""
+        while True:
+            start = time.perf_counter()
+            if await self.panel._client.keep_alive():
+                self.commandSamples.append(time.perf_counter() - start)
+            else:
+                self.commandsFailed += 1
+            await asyncio.sleep(interval)
+
+
+async def generate_load(server: MockPanelServer, probe: PanelProbe, rate, zones):
+    """Fault and restore zones on a mock EVL at 'rate' zone changes per second (or as fast
+    as possible if 'rate' is 0) until cancelled."""
+    zoneCycle = itertools.cycle(range(1, zones + 1))
+    faulted = set()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    sent = 0
+    while True:
+        if rate > 0:
+            due = int((loop.time() - start) * rate)
+        else:
+            due = sent + _UNTHROTTLED_BATCH
+        while sent < due:
+            zone = next(zoneCycle)
+            fault = zone not in faulted
+            if fault:
+                faulted.add(zone)
+            else:
+                faulted.discard(zone)
+            probe.zone_changed(zone)
+            await server.set_zone_state(zone, fault)
+            sent += 1
+        await asyncio.sleep(_TICK if rate > 0 else 0)
+
+
+async def run_benchmark(
+    panelType,
+    evlVersion="4",
+    panels=1,
+    rate=100.0,
+    duration=5.0,
+    commandInterval=0.1,
+    batchWindow=None,
+) -> dict:
+    """Run the clients for 'panels' panels of the given type against in-process mock EVLs
+    for 'duration' seconds, changing zones on each at 'rate' changes per second, and return
+    the measurements."""
+    servers = [MockPanelServer(panelType, evlVersion) for _ in range(panels)]
+    for server in servers:
+        await server.start()
+
+    probes = []
+    for server in servers:
+        panel = EnvisalinkAlarmPanel(
+            server.host,
+            server.port,
+            password="user",
+            zoneTimerInterval=0,
+            keepAliveInterval=0,
+            stateChangeBatchWindow=batchWindow,
+        )
+        panel.panel_type = panelType
+        panel.envisalink_version = evlVersion
+        probes.append(PanelProbe(panel))
+
+    results = await asyncio.gather(*[probe.panel.start() for probe in probes])
+    failed = [r for r in results if r != EnvisalinkAlarmPanel.ConnectionResult.SUCCESS]
+    if failed:
+        raise RuntimeError(f"{len(failed)} panel(s) failed to start: {failed[0]}")
+
+    for probe in probes:
+        probe.instrument()
+    await asyncio.sleep(_SETTLE_TIME)
+
+    for probe in probes:
+        probe.reset()
+    zones = servers[0].num_zones
+    tasks = [
+        asyncio.create_task(generate_load(server, probe, rate, zones))
+        for server, probe in zip(servers, probes)
+    ]
+    if commandInterval > 0:
+        tasks.extend(asyncio.create_task(probe.send_commands(commandInterval)) for probe in probes)
+
+    cpuStart = time.process_time()
+    wallStart = time.perf_counter()
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Give the last of the messages a moment to arrive
+    await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - wallStart
+    cpu = time.process_time() - cpuStart
+
+    for probe in probes:
+        await probe.panel.stop()
+    for server in servers:
+        await server.stop()
+
+    parseSamples = [s for probe in probes for s in probe.parseSamples]
+    callbackSamples = [s for probe in probes for s in probe.callbackSamples]
+    commandSamples = [s for probe in probes for s in probe.commandSamples]
+    return {
+        "panel_type": panelType,
+        "evl_version": evlVersion,
+        "zones": zones,
+        "panels": panels,
+        "zone_change_rate": rate,
+        "batch_window": batchWindow,
+        "duration": elapsed,
+        "cpu_seconds": cpu,
+        "zone_changes": sum(probe.zoneChanges for probe in probes),
+        "messages": len(parseSamples),
+        "messages_per_sec": len(parseSamples) / elapsed,
+        "parse_latency_us": percentiles(parseSamples, 1e6),
+        "callback_latency_ms": percentiles(callbackSamples, 1e3),
+        "command_rtt_ms": percentiles(commandSamples, 1e3),
+        "commands_failed": sum(probe.commandsFailed for probe in probes),
+    }
+
+
+def environment() -> dict:
+    return {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+    }
+
+
+def compare_results(baseline: dict, current: dict, threshold) -> list:
+    """Compare two benchmark result files.  Returns a list of (name, metric, baseline,
+    current, change) for every compared metric that is more than 'threshold' (a fraction)
+    worse than the baseline."""
+    regressions = []
+    baselineRuns = {run["name"]: run for run in baseline.get("runs", [])}
+    for run in current.get("runs", []):
+        previous = baselineRuns.get(run["name"])
+        if previous is None:
+            continue
+        for path, higherIsBetter in COMPARED_METRICS.items():
+            old, new = previous, run
+            for key in path:
+                old = old.get(key, {}) if isinstance(old, dict) else None
+                new = new.get(key, {}) if isinstance(new, dict) else None
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / old
+            if (change < -threshold) if higherIsBetter else (change > threshold):
+                regressions.append((run["name"], ".".join(path), old, new, change))
+    return regressions
@@ -0,0 +1,193 @@
+import asyncio
+import inspect
+import logging
+import time
+from collections import deque
+
+_LOGGER = logging.getLogger(__name__)
+
+# What to do with a new callback when the queue is full
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_MERGE = "merge"
+
+
+class CallbackDispatcher:
+    """Invokes the user callbacks registered on a panel.
+
+    Callbacks may be plain functions or coroutine functions.  With a maxQueueSize of 0 they
+    are called inline (as they always have been) and any coroutine they return is run as a
+    separate task.  Otherwise callbacks are queued and run by a small pool of worker tasks so
+    that a slow consumer can never hold up reading from the EVL.  When the queue is full the
+    overflow policy decides what to give up: the oldest queued callback, the new one, or
+    (for 'merge') the new callback's list of IDs is merged into a callback of the same kind
+    that is still waiting in the queue."""
+
+    def __init__(self, maxQueueSize=0, workers=1, overflowPolicy=OVERFLOW_MERGE):
+        if overflowPolicy not in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_MERGE):
+            raise ValueError(f"Unknown callback overflow policy '{overflowPolicy}'")
+        self._maxQueueSize = maxQueueSize
+        self._workerCount = max(1, workers)
+        self._overflowPolicy = overflowPolicy
+        self._queue = deque()
+        self._workers = []
+        self._busyWorkers = 0
+        self._wakeup = None
+        self._idle = None
+        self._tasks = set()
+        self._stats = {
+            "dispatched": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "merged": 0,
+            "max_queue_length": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "total_run": 0.0,
+            "max_run": 0.0,
+        }
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._queue)
+
+    def dispatch(self, callback, *args):
+        """Invoke (or queue) a callback.  Never blocks."""
+        self._stats["dispatched"] += 1
+        if self._maxQueueSize <= 0:
+            self.invoke_inline(callback, args)
+            return
+
+        if len(self._queue) >= self._maxQueueSize and not self.handle_overflow(callback, args):
+            return
+
+        self._queue.append([callback, args, time.monotonic()])
+        if len(self._queue) > self._stats["max_queue_length"]:
+            self._stats["max_queue_length"] = len(self._queue)
+        self.start_workers()
+        self._idle.clear()
+        self._wakeup.set()
+
+    def handle_overflow(self, callback, args) -> bool:
+        """Apply the overflow policy to a full queue.  Returns True if the new callback should
+        still be queued."""
+        if self._overflowPolicy == OVERFLOW_MERGE and len(args) == 1 and isinstance(args[0], list):
+            for entry in reversed(self._queue):
+                queuedArgs = entry[1]
+                if (
+                    entry[0] == callback
+                    and len(queuedArgs) == 1
+                    and isinstance(queuedArgs[0], list)
+                ):
+                    merged = dict.fromkeys(queuedArgs[0])
+                    merged.update(dict.fromkeys(args[0]))
+                    entry[1] = (list(merged),)
+                    self._stats["merged"] += 1
+                    return False
+
+        self._stats["dropped"] += 1
+        if self._overflowPolicy == OVERFLOW_DROP_NEWEST:
+            _LOGGER.warning("Callback queue is full; dropping callback %s", callback)
+            return False
+
+        dropped = self._queue.popleft()
+        _LOGGER.warning("Callback queue is full; dropping oldest callback %s", dropped[0])
+        return True
+
+    def start_workers(self):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for idx in range(self._workerCount):
+            self._workers.append(loop.create_task(self.worker(), name=f"callback_worker_{idx}"))
+
+    async def worker(self):
+        while True:
+            while not self._queue:
+                if self._busyWorkers == 0:
+                    self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            callback, args, queuedTime = self._queue.popleft()
+            self._busyWorkers += 1
+            try:
+                await self.invoke(callback, args, queuedTime)
+            finally:
+                self._busyWorkers -= 1
+
+    async def invoke(self, callback, args, queuedTime):
+        start = time.monotonic()
+        self.record_latency("wait", start - queuedTime)
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                await result
+            self._stats["completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            self._stats["failed"] += 1
+            _LOGGER.error("Callback %s raised an exception: %r", callback, ex)
+        self.record_latency("run", time.monotonic() - start)
+
+    def invoke_inline(self, callback, args):
+        start = time.monotonic()
+        try:
+            result = callback(*args)
+        except Exception as ex:
+            self._stats["failed"] += 1
+            _LOGGER.error("Callback %s raised an exception: %r", callback, ex)
+            return
+
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(self.invoke(lambda: result, (), start))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self._stats["completed"] += 1
+            self.record_latency("run", time.monotonic() - start)
+
+    def record_latency(self, kind, latency):
+        self._stats[f"total_{kind}"] += latency
+        if latency > self._stats[f"max_{kind}"]:
+            self._stats[f"max_{kind}"] = latency
+
+    async def stop(self, timeout=5.0):
+        """Give queued callbacks up to 'timeout' seconds to complete and then stop the
+        workers."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.exceptions.TimeoutError:
+                _LOGGER.warning(
+                    "Discarding %d callbacks that did not complete in time", len(self._queue)
+                )
+            for worker in self._workers:
+                worker.cancel()
+            self._workers = []
+            self._queue.clear()
+
+    def stats(self) -> dict:
+        """Counts of callbacks dispatched, completed, failed, dropped and merged along with the
+        time they spent waiting in the queue and running."""
+        stats = self._stats
+        started = stats["completed"] + stats["failed"]
+        return {
+            "dispatched": stats["dispatched"],
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "dropped": stats["dropped"],
+            "merged": stats["merged"],
+            "queue_length": len(self._queue),
+            "max_queue_length": stats["max_queue_length"],
+            "average_wait": stats["total_wait"] / started if started else 0.0,
+            "max_wait": stats["max_wait"],
+            "average_run": stats["total_run"] / started if started else 0.0,
+            "max_run": stats["max_run"],
+        }
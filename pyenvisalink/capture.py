@@ -0,0 +1,285 @@
+"""Capture the TPI traffic exchanged with an EVL and replay it offline.
+
+A capture is started by giving EnvisalinkAlarmPanel a captureFile.  Each line received from
+or sent to the EVL is appended to it, timestamped and with the password and alarm codes
+scrubbed, e.g.:
+
+    # {"version": 1, "panel_type": "DSC", "envisalink_version": "4", "started": 1700000000.0}
+    1700000000.125000 RX 5053CD
+    1700000000.126000 TX 005****54
+
+A capture can then be replayed through a client without a panel, either as fast as possible
+or in real time, to profile the parser against production-like traffic:
+
+    python -m pyenvisalink.capture panel.capture --output timeline.json"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+
+from .const import PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_VERSION = 1
+CAPTURE_RX = "RX"
+CAPTURE_TX = "TX"
+
+# Host name given to the panel a capture is replayed through
+REPLAY_HOST = "replay"
+
+
+class CaptureWriter:
+    """Appends timestamped RX/TX lines to a capture file.  Each time the file is opened a
+    header recording the panel's details is written so that a file holding several
+    sessions can still be replayed.  Every write is flushed so that the capture survives
+    the process being killed; should writing fail, capturing stops."""
+
+    def __init__(self, path, metadata=None):
+        self._path = path
+        self._file = open(path, "a", encoding="ascii", errors="replace")
+        header = {"version": CAPTURE_VERSION, "started": time.time()}
+        header.update(metadata or {})
+        self._file.write("# %s\n" % json.dumps(header))
+        self.flush()
+
+    @property
+    def path(self):
+        return self._path
+
+    def record(self, direction, line, timestamp=None):
+        if self._file:
+            try:
+                self._file.write("%.6f %s %s\n" % (timestamp or time.time(), direction, line))
+                self._file.flush()
+            except OSError as ex:
+                self.write_failed(ex)
+
+    def record_lines(self, direction, lines, timestamp=None):
+        """Record lines handled together (e.g. received in the same read) with one timestamp."""
+        if self._file:
+            timestamp = "%.6f %s " % (timestamp or time.time(), direction)
+            try:
+                self._file.writelines(timestamp + line + "\n" for line in lines)
+                self._file.flush()
+            except OSError as ex:
+                self.write_failed(ex)
+
+    def flush(self):
+        if self._file:
+            try:
+                self._file.flush()
+            except OSError as ex:
+                self.write_failed(ex)
+
+    def write_failed(self, ex):
+        _LOGGER.error("Unable to write to capture file %s; capture stopped: %r", self._path, ex)
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def close(self):
+        if self._file:
+            try:
+                self._file.close()
+            except OSError as ex:
+                _LOGGER.error("Unable to write to capture file %s: %r", self._path, ex)
+            self._file = None
+
+
+def read_capture(path) -> tuple:
+    """Read a capture file.  Returns (metadata, records) where 'metadata' is the most recent
+    header in the file and each record is a (timestamp, direction, line) tuple."""
+    metadata = {}
+    records = []
+    with open(path, encoding="ascii", errors="replace") as f:
+        for lineNumber, line in enumerate(f, start=1):
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if line.startswith("#"):
+                try:
+                    metadata = json.loads(line[1:])
+                except ValueError:
+                    pass
+                continue
+
+            fields = line.split(" ", 2)
+            try:
+                timestamp = float(fields[0])
+                direction = fields[1]
+            except (ValueError, IndexError):
+                _LOGGER.warning("Skipping malformed line %d of %s", lineNumber, path)
+                continue
+            if direction not in (CAPTURE_RX, CAPTURE_TX):
+                _LOGGER.warning("Skipping malformed line %d of %s", lineNumber, path)
+                continue
+            records.append((timestamp, direction, fields[2] if len(fields) > 2 else ""))
+    return metadata, records
+
+
+# Endings of the errors the client logs for a command acknowledgement (or command error)
+# that arrives without a command of its own in flight
+_UNMATCHED_ACK_ERRORS = ("when no command was issued.", "when no command is active.")
+
+
+class _UnmatchedAckFilter(logging.Filter):
+    """Counts and hides the errors logged for command acknowledgements and command errors
+    during a replay; the commands they answer were sent by the original session, not the
+    replaying client."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record) -> bool:
+        if record.getMessage().endswith(_UNMATCHED_ACK_ERRORS):
+            self.count += 1
+            return False
+        return True
+
+
+async def replay_capture(
+    path,
+    panelType=None,
+    evlVersion=None,
+    realtime=False,
+    speed=1.0,
+    zoneBypassEnabled=True,
+    stateChangeBatchWindow=None,
+) -> dict:
+    """Feed the lines received from the EVL in a capture through a client of the captured
+    panel type (or 'panelType') and report how quickly they were parsed along with the
+    timeline of state changes they produced.  Lines are replayed as fast as possible unless
+    'realtime' is set, in which case the original spacing (divided by 'speed') is kept.
+    Lines received together in one read are replayed together."""
+    # Imported here since the clients import this module for capturing
+    from .alarm_panel import EnvisalinkAlarmPanel
+    from .envisalink_base_client import EnvisalinkClient
+
+    metadata, records = read_capture(path)
+    panelType = panelType or metadata.get("panel_type")
+    if panelType not in (PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO):
+        raise ValueError(f"Unknown panel type for replay: {panelType}")
+
+    panel = EnvisalinkAlarmPanel(
+        REPLAY_HOST,
+        zoneTimerInterval=0,
+        keepAliveInterval=0,
+        zoneBypassEnabled=zoneBypassEnabled,
+        stateChangeBatchWindow=stateChangeBatchWindow,
+    )
+    panel.panel_type = panelType
+    panel.envisalink_version = evlVersion or metadata.get("envisalink_version") or "4"
+    client = panel.create_client()
+
+    timeline = []
+    currentTime = [0.0]
+    panel.callback_state_diff = lambda diff: timeline.append((currentTime[0], diff))
+
+    # Group the received lines back into the reads they arrived in
+    batches = []
+    for timestamp, direction, line in records:
+        if direction != CAPTURE_RX:
+            continue
+        if batches and batches[-1][0] == timestamp:
+            batches[-1][1].append(line)
+        else:
+            batches.append((timestamp, [line]))
+
+    ackFilter = _UnmatchedAckFilter()
+    clientLogger = logging.getLogger(EnvisalinkClient.__module__)
+    clientLogger.addFilter(ackFilter)
+
+    loop = asyncio.get_running_loop()
+    counter = time.perf_counter
+    parseTime = 0.0
+    messages = 0
+    replayStart = loop.time()
+    firstTimestamp = batches[0][0] if batches else 0.0
+    wallStart = counter()
+    try:
+        for timestamp, lines in batches:
+            if realtime:
+                delay = replayStart + (timestamp - firstTimestamp) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            currentTime[0] = timestamp
+            start = counter()
+            client.process_lines(lines)
+            parseTime += counter() - start
+            messages += len(lines)
+        # Let any batched state changes be delivered
+        client.flush_state_change_updates()
+    finally:
+        elapsed = counter() - wallStart
+        await client.stop()
+        clientLogger.removeFilter(ackFilter)
+
+    return {
+        "panel_type": panelType,
+        "envisalink_version": panel.envisalink_version,
+        "messages": messages,
+        "sent": sum(1 for record in records if record[1] == CAPTURE_TX),
+        "acknowledgements": ackFilter.count,
+        "captured_duration": (batches[-1][0] - firstTimestamp) if batches else 0.0,
+        "duration": elapsed,
+        "parse_seconds": parseTime,
+        "messages_per_sec": messages / parseTime if parseTime else 0.0,
+        "state_changes": len(timeline),
+        "timeline": timeline,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m pyenvisalink.capture",
+        description="Replay a captured EVL session through a client without a panel.",
+    )
+    parser.add_argument("capture", help="Capture file to replay")
+    parser.add_argument(
+        "--panel-type",
+        choices=[PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO],
+        help="Panel type (defaults to the one recorded in the capture)",
+    )
+    parser.add_argument("--realtime", action="store_true", help="Keep the captured timing")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Speed up factor for --realtime replays"
+    )
+    parser.add_argument("--output", help="Write the state change timeline to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        result = asyncio.run(
+            replay_capture(args.capture, args.panel_type, realtime=args.realtime, speed=args.speed)
+        )
+    except (OSError, ValueError) as ex:
+        print(f"Unable to replay {args.capture}: {ex}")
+        return 1
+
+    print(
+        f"Replayed {result['messages']} {result['panel_type']} messages "
+        f"({result['captured_duration']:.1f}s captured) in {result['duration']:.3f}s"
+    )
+    print(
+        f"  parsing: {result['parse_seconds']:.3f}s ({result['messages_per_sec']:.0f} messages/s)"
+    )
+    print(f"  state changes: {result['state_changes']}")
+
+    if args.output:
+        timeline = [{"time": timestamp, "changes": diff} for timestamp, diff in result["timeline"]]
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(timeline, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+import aiohttp
+
+from .alarm_panel import EnvisalinkAlarmPanel
+
+_LOGGER = logging.getLogger(__name__)
+
+# Maximum number of EVLs being discovered at once
+DEFAULT_MAX_CONCURRENT_DISCOVERIES = 50
+
+# Maximum time spent discovering a single EVL
+DEFAULT_DISCOVERY_TIMEOUT = 10
+
+# Outcome of discovering a single EVL.  'result' is an EnvisalinkAlarmPanel.ConnectionResult.
+DiscoveryResult = namedtuple(
+    "DiscoveryResult",
+    [
+        "host",
+        "port",
+        "result",
+        "panel_type",
+        "envisalink_version",
+        "firmware_version",
+        "mac_address",
+        "elapsed",
+    ],
+)
+
+
+async def discover_panels(
+    targets,
+    maxConcurrent=DEFAULT_MAX_CONCURRENT_DISCOVERIES,
+    timeout=DEFAULT_DISCOVERY_TIMEOUT,
+    httpSession=None,
+    discoveryCache=None,
+):
+    """Discover the firmware version, MAC address, EVL version and panel type of many EVLs
+    at once, yielding a DiscoveryResult for each as soon as it is known:
+
+        async for result in discover_panels([{"host": "10.0.0.5", "password": "pw"}]):
+            ...
+
+    Each target is either an EnvisalinkAlarmPanel or a dict of the arguments used to
+    create one (at least 'host', usually along with 'userName' and 'password').  At most
+    'maxConcurrent' EVLs are discovered at a time and each is given up on after 'timeout'
+    seconds.  The EVLs' web interfaces are queried over a single HTTP session (created for
+    the duration of the discovery unless one is given) and a DiscoveryCache, if given, is
+    both used and updated."""
+    ownsSession = httpSession is None
+    if ownsSession:
+        httpSession = aiohttp.ClientSession()
+
+    panels = []
+    for target in targets:
+        if isinstance(target, EnvisalinkAlarmPanel):
+            panels.append(target)
+        else:
+            args = {"connectionTimeout": timeout}
+            args.update(target)
+            panels.append(EnvisalinkAlarmPanel(**args))
+
+    semaphore = asyncio.Semaphore(maxConcurrent)
+    tasks = [
+        asyncio.ensure_future(
+            discover_panel(panel, semaphore, timeout, httpSession, discoveryCache)
+        )
+        for panel in panels
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        if ownsSession:
+            await httpSession.close()
+
+
+async def discover_panel(panel, semaphore, timeout, httpSession, discoveryCache):
+    """Discover a single EVL for discover_panels().  Never raises; failures are reported
+    in the DiscoveryResult."""
+    async with semaphore:
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                discover_panel_details(panel, httpSession, discoveryCache), timeout
+            )
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Timed out discovering %s", panel.host)
+            result = EnvisalinkAlarmPanel.ConnectionResult.TIMEOUT
+        except Exception as ex:
+            _LOGGER.error("Unexpected exception discovering %s: %r", panel.host, ex)
+            result = EnvisalinkAlarmPanel.ConnectionResult.CONNECTION_FAILED
+
+        return DiscoveryResult(
+            panel.host,
+            panel.port,
+            result,
+            panel.panel_type,
+            panel.envisalink_version,
+            panel.firmware_version,
+            panel.mac_address,
+            time.monotonic() - start,
+        )
+
+
+async def discover_panel_details(panel, httpSession, discoveryCache):
+    result = await panel.discover(httpSession, discoveryCache)
+    if result == EnvisalinkAlarmPanel.ConnectionResult.INVALID_AUTHORIZATION:
+        return result
+
+    if panel.panel_type is None:
+        # The web interface could not tell us the panel type so ask the TPI instead
+        typeResult = await panel.discover_panel_type(httpSession)
+        if typeResult != EnvisalinkAlarmPanel.ConnectionResult.SUCCESS:
+            return typeResult
+        panel.cache_discovery_details(discoveryCache=discoveryCache)
+    return EnvisalinkAlarmPanel.ConnectionResult.SUCCESS
@@ -0,0 +1,185 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# How long discovered details are trusted before the EVL is probed again
+DEFAULT_DISCOVERY_TTL = 24 * 60 * 60
+
+# Details of an EVL that are cached
+DISCOVERY_FIELDS = ("panel_type", "envisalink_version", "firmware_version", "mac_address")
+
+
+class DiscoveryCache:
+    """Remembers what was discovered about each EVL (panel type, EVL version, firmware version
+    and MAC address) so that a restart can connect straight away rather than first probing
+    the TPI port and scraping the EVL's web pages.
+
+    The cache also remembers a fingerprint of the credentials each EVL's web interface last
+    accepted so that it cannot vouch for a different user name or password.  Fingerprints
+    are HMACs keyed with a random secret held only by this cache and are never written to
+    its file, so details loaded from the file are checked against the EVL once before
+    discover() trusts them.
+
+    Entries are keyed by host and port and indexed by MAC address.  Should a MAC address be
+    discovered at a new host (e.g. its DHCP lease changed) the entry for the old host is
+    dropped, and discovering a different MAC address at a known host replaces its entry.
+    Entries expire after 'ttl' seconds and the panel invalidates its entry if logging in
+    with the cached details fails.  If 'path' is given the cache is persisted to that file
+    (and loaded from it) so it survives a process restart; it can be shared by any number
+    of panels."""
+
+    def __init__(self, path=None, ttl=DEFAULT_DISCOVERY_TTL):
+        self._path = path
+        self._ttl = ttl
+        self._entries = {}
+        self._macIndex = {}
+        self._secret = os.urandom(32)
+        self._credentials = {}
+        if path:
+            self.load()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @staticmethod
+    def cache_key(host, port) -> str:
+        return f"{host}:{port}"
+
+    def credentials_key(self, host, port, userName, password) -> str:
+        """Fingerprint of the credentials used to access the EVL at host:port."""
+        message = f"{host}:{port}:{userName}:{password}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def credentials_verified(self, host, port, userName, password) -> bool:
+        """Whether the EVL at host:port accepted these credentials when its cached details
+        were discovered."""
+        fingerprint = self._credentials.get(DiscoveryCache.cache_key(host, port))
+        return fingerprint is not None and hmac.compare_digest(
+            fingerprint, self.credentials_key(host, port, userName, password)
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, host, port):
+        """Return the cached details of the EVL at host:port, or None if there are none
+        that are still fresh."""
+        key = DiscoveryCache.cache_key(host, port)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["discovered"] > self._ttl:
+            _LOGGER.debug("Cached discovery details for %s have expired", key)
+            self.remove(key)
+            return None
+        return entry
+
+    def get_by_mac(self, macAddress):
+        """Return the 'host:port' key and cached details of the EVL with the given MAC
+        address, or None."""
+        key = self._macIndex.get(macAddress.lower()) if macAddress else None
+        if key is None:
+            return None
+        host, _, port = key.rpartition(":")
+        entry = self.get(host, int(port))
+        return (key, entry) if entry else None
+
+    def put(self, host, port, details: dict, credentials=None):
+        """Record newly discovered details of the EVL at host:port, along with the
+        (userName, password) 'credentials' it accepted if they were checked.  Details that
+        are not given (or are None) are kept from the existing entry if it is for the same
+        device, as are the credentials it accepted."""
+        key = DiscoveryCache.cache_key(host, port)
+        details = {field: details.get(field) for field in DISCOVERY_FIELDS}
+        macAddress = details["mac_address"]
+        if macAddress:
+            macAddress = details["mac_address"] = macAddress.lower()
+
+        fingerprint = None
+        if credentials is not None:
+            fingerprint = self.credentials_key(host, port, *credentials)
+        entry = self._entries.get(key)
+        if entry and (macAddress is None or entry["mac_address"] in (None, macAddress)):
+            for field, value in details.items():
+                if value is None:
+                    details[field] = entry[field]
+            macAddress = details["mac_address"]
+            if fingerprint is None:
+                fingerprint = self._credentials.get(key)
+        elif entry:
+            _LOGGER.info("The EVL at %s has been replaced; discarding cached details", key)
+
+        if macAddress:
+            previousKey = self._macIndex.get(macAddress)
+            if previousKey is not None and previousKey != key:
+                _LOGGER.info("EVL %s has moved from %s to %s", macAddress, previousKey, key)
+                self.remove(previousKey, save=False)
+
+        self.remove(key, save=False)
+        details["discovered"] = time.time()
+        self._entries[key] = details
+        if fingerprint is not None:
+            self._credentials[key] = fingerprint
+        if macAddress:
+            self._macIndex[macAddress] = key
+        self.save()
+
+    def invalidate(self, host, port):
+        """Forget the cached details of the EVL at host:port."""
+        self.remove(DiscoveryCache.cache_key(host, port))
+
+    def remove(self, key, save=True):
+        self._credentials.pop(key, None)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        macAddress = entry.get("mac_address")
+        if macAddress and self._macIndex.get(macAddress) == key:
+            del self._macIndex[macAddress]
+        if save:
+            self.save()
+
+    def load(self):
+        """Load the cache from its file, discarding any entries that have expired."""
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as ex:
+            _LOGGER.warning("Ignoring unreadable discovery cache %s: %r", self._path, ex)
+            return
+
+        now = time.time()
+        self._entries = {}
+        self._macIndex = {}
+        self._credentials = {}
+        for key, entry in entries.items():
+            if not isinstance(entry, dict) or now - entry.get("discovered", 0) > self._ttl:
+                continue
+            self._entries[key] = {field: entry.get(field) for field in DISCOVERY_FIELDS}
+            self._entries[key]["discovered"] = entry["discovered"]
+            if entry.get("mac_address"):
+                self._macIndex[entry["mac_address"]] = key
+
+    def save(self):
+        """Write the cache to its file (if it has one)."""
+        if not self._path:
+            return
+        tmpPath = f"{self._path}.tmp"
+        try:
+            with open(tmpPath, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, separators=(",", ":"))
+            os.replace(tmpPath, self._path)
+        except OSError as ex:
+            _LOGGER.error("Unable to save discovery cache to %s: %r", self._path, ex)
@@ -1,6 +1,5 @@
 import asyncio
 import datetime
-import json
 import logging
 import re
 import time
@@ -20,10 +19,12 @@ from .dsc_envisalinkdefs import (
     evl_TPI_Response_Codes,
     evl_verboseTrouble,
 )
-from .envisalink_base_client import EnvisalinkClient
+from .envisalink_base_client import CommandPriority, EnvisalinkClient
 
 _LOGGER = logging.getLogger(__name__)
 
+_TIMESTAMP_PREFIX = re.compile(r"\d\d:\d\d:\d\d\s")
+
 
 class DSCClient(EnvisalinkClient):
     """Represents a dsc alarm client."""
@@ -39,6 +40,34 @@ class DSCClient(EnvisalinkClient):
         super().__init__(panel)
         self._loginEvent = asyncio.Event()
         self._bypassStateInitialized = False
+        self._coalescedCommands = frozenset(
+            (
+                evl_Commands["KeepAlive"],
+                evl_Commands["StatusReport"],
+                evl_Commands["DumpZoneTimers"],
+            )
+        )
+        self._commandPriorities = {
+            evl_Commands["Panic"]: CommandPriority.PANIC,
+            evl_Commands["Disarm"]: CommandPriority.ARM,
+            evl_Commands["ArmStay"]: CommandPriority.ARM,
+            evl_Commands["ArmAway"]: CommandPriority.ARM,
+            evl_Commands["ArmMax"]: CommandPriority.ARM,
+            evl_Commands["SendCode"]: CommandPriority.ARM,
+            evl_Commands["KeepAlive"]: CommandPriority.BACKGROUND,
+            evl_Commands["StatusReport"]: CommandPriority.BACKGROUND,
+            evl_Commands["DumpZoneTimers"]: CommandPriority.BACKGROUND,
+            evl_Commands["SetTime"]: CommandPriority.BACKGROUND,
+        }
+        self.build_dispatch_table(evl_ResponseTypes)
+
+        # The login response (505) is dispatched based on its data
+        self._loginHandlers = {
+            "3": self.handle_login,
+            "2": self.handle_login_timeout,
+            "1": self.handle_login_success,
+            "0": self.handle_login_failure,
+        }
 
     def to_chars(string):
         chars = []
@@ -68,7 +97,7 @@ class DSCClient(EnvisalinkClient):
 
     async def keep_alive(self):
         """Send a keepalive command to reset it's watchdog timer."""
-        await self.queue_command(evl_Commands["KeepAlive"], "")
+        return await self.queue_command(evl_Commands["KeepAlive"], "")
 
     async def arm_stay_partition(self, code, partitionNumber):
         """Public method to arm/stay a partition."""
@@ -112,35 +141,27 @@ class DSCClient(EnvisalinkClient):
 
     def parseHandler(self, rawInput):
         """When the envisalink contacts us- parse out which command and data."""
-        cmd = {}
-        dataoffset = 0
-        if rawInput != "":
-            if re.match(r"\d\d:\d\d:\d\d\s", rawInput):
-                dataoffset = dataoffset + 9
-            code = rawInput[dataoffset : dataoffset + 3]
-            cmd["code"] = code
-            cmd["data"] = rawInput[dataoffset + 3 :][:-2]
-
-            try:
-                # Interpret the login command further to see what our handler is.
-                if evl_ResponseTypes[code]["handler"] == "login":
-                    if cmd["data"] == "3":
-                        handler = "login"
-                    elif cmd["data"] == "2":
-                        handler = "login_timeout"
-                    elif cmd["data"] == "1":
-                        handler = "login_success"
-                    elif cmd["data"] == "0":
-                        handler = "login_failure"
-
-                    cmd["handler"] = "handle_%s" % handler
-                else:
-                    cmd["handler"] = "handle_%s" % evl_ResponseTypes[code]["handler"]
-                cmd["state_change"] = evl_ResponseTypes[code].get("state_change", False)
-            except KeyError:
-                _LOGGER.debug(str.format("No handler defined in config for {0}, skipping...", code))
+        if rawInput == "":
+            return None
 
-        return cmd
+        dataoffset = 0
+        if _TIMESTAMP_PREFIX.match(rawInput):
+            dataoffset = 9
+        code = rawInput[dataoffset : dataoffset + 3]
+        data = rawInput[dataoffset + 3 : -2]
+
+        msg = self.lookup_handler(code, data)
+        if msg is None:
+            _LOGGER.debug("No handler defined in config for %s, skipping...", code)
+        elif code == "505":
+            # Interpret the login command further to see what our handler is.
+            handler = self._loginHandlers.get(data)
+            if handler is None:
+                _LOGGER.error("Unrecognized login response: '%s'", data)
+                return None
+            msg = msg._replace(handler=handler)
+
+        return msg
 
     def handle_login(self, code, data):
         """When the envisalink asks us for our password- send it."""
@@ -199,7 +220,7 @@ class DSCClient(EnvisalinkClient):
                     _LOGGER.error(msg)
 
             else:
-                _LOGGER.error(f"Unrecognized system error for issued command: '{data}'")
+                _LOGGER.error("Unrecognized system error for issued command: '%s'", data)
             self.command_failed(retry=retry)
 
     def handle_zone_state_change(self, code, data):
@@ -209,22 +230,18 @@ class DSCClient(EnvisalinkClient):
         parse = re.match("^[0-9]{3,4}$", data)
         if parse:
             zoneNumber = int(data[-3:])
-            self._alarmPanel.alarm_state["zone"][zoneNumber]["status"].update(
-                evl_ResponseTypes[code]["status"]
-            )
-            self._alarmPanel.alarm_state["zone"][zoneNumber]["updated"] = now
+            zone = self._alarmPanel.alarm_state["zone"][zoneNumber]
+            changes = zone.status.apply(evl_ResponseTypes[code]["status"])
+            zone.updated = now
 
             if evl_ResponseTypes[code]["is_fault"]:
-                self._alarmPanel.alarm_state["zone"][zoneNumber]["last_fault"] = now
+                zone.last_fault = now
 
             _LOGGER.debug(
-                str.format(
-                    "(zone {0}) state has updated: {1}",
-                    zoneNumber,
-                    json.dumps(evl_ResponseTypes[code]["status"]),
-                )
+                "(zone %s) state has updated: %s", zoneNumber, evl_ResponseTypes[code]["status"]
             )
-            return {STATE_CHANGE_ZONE: [zoneNumber]}
+            if changes:
+                return {STATE_CHANGE_ZONE: {zoneNumber: changes}}
         else:
             _LOGGER.error("Invalid data has been passed in the zone update.")
 
@@ -236,45 +253,42 @@ class DSCClient(EnvisalinkClient):
             parse = re.match("^[0-9]{2}$", data)
             if parse:
                 partitionNumber = int(data[0])
-                self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
+                changes = self._alarmPanel.alarm_state["partition"][partitionNumber].status.apply(
                     evl_ArmModes[data[1]]["status"]
                 )
                 _LOGGER.debug(
-                    str.format(
-                        "(partition {0}) state has updated: {1}",
-                        partitionNumber,
-                        json.dumps(evl_ArmModes[data[1]]["status"]),
-                    )
+                    "(partition %s) state has updated: %s",
+                    partitionNumber,
+                    evl_ArmModes[data[1]]["status"],
                 )
-                return {STATE_CHANGE_PARTITION: [partitionNumber]}
+                if changes:
+                    return {STATE_CHANGE_PARTITION: {partitionNumber: changes}}
             else:
                 _LOGGER.error("Invalid data has been passed when arming the alarm.")
         else:
             parse = re.match("^[0-9]+$", data)
             if parse:
                 partitionNumber = int(data[0])
-                status = self._alarmPanel.alarm_state["partition"][partitionNumber]["status"]
-                status.update(evl_ResponseTypes[code]["status"])
+                status = self._alarmPanel.alarm_state["partition"][partitionNumber].status
+                changes = status.apply(evl_ResponseTypes[code]["status"])
                 _LOGGER.debug(
-                    str.format(
-                        "(partition {0}) state has updated: {1}",
-                        partitionNumber,
-                        json.dumps(evl_ResponseTypes[code]["status"]),
-                    )
+                    "(partition %s) state has updated: %s",
+                    partitionNumber,
+                    evl_ResponseTypes[code]["status"],
                 )
 
                 """Log the user who last armed or disarmed the alarm"""
                 if code == "700":
-                    lastArmedBy = {"last_armed_by_user": int(data[1:5])}
-                    status.update(lastArmedBy)
+                    changes.update(status.apply({"last_armed_by_user": int(data[1:5])}))
                 elif code == "750":
-                    lastDisarmedBy = {"last_disarmed_by_user": int(data[1:5])}
-                    status.update(lastDisarmedBy)
+                    changes.update(status.apply({"last_disarmed_by_user": int(data[1:5])}))
                 elif code == "654":
                     # Update the alpha based on whether fire/panic are set
-                    self.set_in_alarm_alpha(partitionNumber)
+                    changes.update(self.set_in_alarm_alpha(partitionNumber))
 
-                result = {STATE_CHANGE_PARTITION: [partitionNumber]}
+                result = {}
+                if changes:
+                    result[STATE_CHANGE_PARTITION] = {partitionNumber: changes}
                 if code == "655":
                     if self._alarmPanel._zoneBypassEnabled:
                         """Partition was disarmed so any zone bypasses will have been reset"""
@@ -317,11 +331,12 @@ class DSCClient(EnvisalinkClient):
         else:
             new_status = evl_ResponseTypes[code]["status"]
 
-        updatedPartitions = []
-        for part in self._alarmPanel.alarm_state["partition"]:
-            self._alarmPanel.alarm_state["partition"][part]["status"].update(new_status)
-            updatedPartitions.append(part)
-        _LOGGER.debug(str.format("(All partitions) state has updated: {0}", json.dumps(new_status)))
+        updatedPartitions = {}
+        for part, partition in self._alarmPanel.alarm_state["partition"].items():
+            changes = partition.status.apply(new_status)
+            if changes:
+                updatedPartitions[part] = changes
+        _LOGGER.debug("(All partitions) state has updated: %s", new_status)
         return {STATE_CHANGE_KEYPAD: updatedPartitions}
 
     def handle_zone_bypass_update(self, code, data):
@@ -330,32 +345,28 @@ class DSCClient(EnvisalinkClient):
             return
 
         if len(data) == 16:
-            updates = []
+            updates = {}
+            debug = _LOGGER.isEnabledFor(logging.DEBUG)
             for byte in range(8):
                 bypassBitfield = int("0x" + data[byte * 2] + data[(byte * 2) + 1], 0)
 
                 for bit in range(8):
                     zoneNumber = (byte * 8) + bit + 1
                     bypassed = bypassBitfield & (1 << bit) != 0
-                    if self._alarmPanel.alarm_state["zone"][zoneNumber]["bypassed"] != bypassed:
-                        updates.append(zoneNumber)
-                    self._alarmPanel.alarm_state["zone"][zoneNumber]["bypassed"] = bypassed
-                    _LOGGER.debug(
-                        str.format(
-                            "(zone {0}) bypass state has updated: {1}",
-                            zoneNumber,
-                            bypassed,
+                    zone = self._alarmPanel.alarm_state["zone"][zoneNumber]
+                    if zone.bypassed != bypassed:
+                        updates[zoneNumber] = {"bypassed": (zone.bypassed, bypassed)}
+                        zone.bypassed = bypassed
+                    if debug:
+                        _LOGGER.debug(
+                            "(zone %s) bypass state has updated: %s", zoneNumber, bypassed
                         )
-                    )
 
-            _LOGGER.debug(str.format("zone bypass updates: {0}", updates))
+            _LOGGER.debug("zone bypass updates: %s", updates)
             return {STATE_CHANGE_ZONE_BYPASS: updates}
         else:
             _LOGGER.error(
-                str.format(
-                    "Invalid data length ({0}) has been received in the bypass update.",
-                    len(data),
-                )
+                "Invalid data length (%d) has been received in the bypass update.", len(data)
             )
 
     async def dump_zone_bypass_status(self):
@@ -378,16 +389,14 @@ class DSCClient(EnvisalinkClient):
         flags = KeypadLED_Flags()
         flags.asByte = int(data, 16)
 
-        _LOGGER.debug(f"Keypad LED state update: {flags}")
+        _LOGGER.debug("Keypad LED state update: %s", flags)
 
-        updatedPartitions = []
-        new_status = {
-            "alarm_fire_zone": bool(flags.fire),
-            "alarm_in_memory": bool(flags.memory),
-        }
-        for part in self._alarmPanel.alarm_state["partition"]:
-            self._alarmPanel.alarm_state["partition"][part]["status"].update(new_status)
-            updatedPartitions.append(part)
+        updatedPartitions = {}
+        new_status = {"alarm_fire_zone": bool(flags.fire), "alarm_in_memory": bool(flags.memory)}
+        for part, partition in self._alarmPanel.alarm_state["partition"].items():
+            changes = partition.status.apply(new_status)
+            if changes:
+                updatedPartitions[part] = changes
 
         if (
             self._alarmPanel._zoneBypassEnabled
@@ -410,15 +419,15 @@ class DSCClient(EnvisalinkClient):
         _LOGGER.debug("Keypad LED FLASH state update")
         self.handle_keypad_led_state_update(code, data)
 
-    def set_in_alarm_alpha(self, partition_number):
-        status = self._alarmPanel.alarm_state["partition"][partition_number]["status"]
+    def set_in_alarm_alpha(self, partition_number) -> dict:
+        status = self._alarmPanel.alarm_state["partition"][partition_number].status
         alpha = "Alarm"
-        if status["fire"]:
+        if status.fire:
             alpha = "Fire Alarm"
-        elif status["panic"]:
+        elif status.panic:
             alpha = "Panic Alarm"
 
-        status["alpha"] = alpha
+        return status.apply({"alpha": alpha})
 
     def handle_command_output_pressed(self, code, data):
         """Handle PGM output triggered"""
@@ -427,11 +436,10 @@ class DSCClient(EnvisalinkClient):
             partitionNumber = int(data[0])
             pgm = int(data[1])
 
-            self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
+            changes = self._alarmPanel.alarm_state["partition"][partitionNumber].status.apply(
                 {f"pgm_{pgm}_last_triggered": datetime.datetime.now().isoformat()}
             )
-            # _LOGGER.debug(f"Command output pressed on partition {partitionNumber} for PGM {pgm}")
             _LOGGER.debug("Command output pressed on partition %d for PGM %d", partitionNumber, pgm)
-            return {STATE_CHANGE_KEYPAD: [partitionNumber]}
+            return {STATE_CHANGE_KEYPAD: {partitionNumber: changes}}
         else:
             _LOGGER.error("Invalid data has been passed in the command output update.")
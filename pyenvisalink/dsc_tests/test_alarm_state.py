@@ -0,0 +1,137 @@
+import json
+
+from pyenvisalink.alarm_state import AlarmState
+
+# The initial alarm state as it was when it was built from plain dicts
+INITIAL_PARTITION = {
+    "status": {
+        "partition_state": "N/A",
+        "alpha": "N/A",
+        "ac_present": True,
+        "beep": False,
+        "armed_bypass": False,
+        "entry_delay": False,
+        "exit_delay": False,
+        "last_armed_by_user": "",
+        "last_disarmed_by_user": "",
+        "ready": False,
+        "bat_trouble": False,
+        "trouble": False,
+        "fire": False,
+        "panic": False,
+        "alarm": False,
+        "alarm_fire_zone": False,
+        "alarm_in_memory": False,
+        "armed_away": False,
+        "armed_stay": False,
+        "armed_zero_entry_delay": False,
+        "armed_night": False,
+        "bell_trouble": False,
+    }
+}
+INITIAL_ZONE = {
+    "status": {
+        "open": False,
+        "fault": False,
+        "alarm": False,
+        "tamper": False,
+        "low_battery": False,
+    },
+    "last_fault": 0,
+    "bypassed": False,
+    "updated": 0.0,
+}
+
+
+def test_initial_state_reads_as_before():
+    alarmState = AlarmState.get_initial_alarm_state(64, 8)
+    assert list(alarmState["partition"]) == list(range(1, 9))
+    assert list(alarmState["zone"]) == list(range(1, 65))
+
+    for partition in alarmState["partition"].values():
+        for key, value in INITIAL_PARTITION["status"].items():
+            assert partition["status"][key] == value
+            assert partition["status"].get(key) == value
+    for zone in alarmState["zone"].values():
+        for key, value in INITIAL_ZONE["status"].items():
+            assert zone["status"][key] == value
+        for key in ("last_fault", "bypassed", "updated"):
+            assert zone[key] == INITIAL_ZONE[key]
+
+
+def test_records_behave_like_dicts():
+    alarmState = AlarmState.get_initial_alarm_state(8, 1)
+    zone = alarmState["zone"][3]
+    zone["status"].update({"open": True, "fault": True})
+    zone["last_fault"] = 1234
+
+    assert zone["status"]["open"] is True
+    assert zone.status.open is True
+    assert "open" in zone["status"]
+    assert "missing" not in zone["status"]
+    assert zone["status"].get("missing", "default") == "default"
+
+    # Keys that are only reported by some panels are missing until they are set
+    status = alarmState["partition"][1]["status"]
+    assert "chime" not in status
+    status["chime"] = True
+    assert status["chime"] is True
+    status["pgm_1_last_triggered"] = 5
+    assert status["pgm_1_last_triggered"] == 5
+    del status["pgm_1_last_triggered"]
+    assert "pgm_1_last_triggered" not in status
+
+
+def test_copy_and_json():
+    alarmState = AlarmState.get_initial_alarm_state(4, 1)
+    zone = alarmState["zone"][1]
+    copied = zone.copy()
+    assert isinstance(copied, dict)
+    assert isinstance(copied["status"], dict)
+    for key, value in INITIAL_ZONE["status"].items():
+        assert copied["status"][key] == value
+
+    # The copy is independent of the record
+    copied["status"]["open"] = True
+    assert zone["status"]["open"] is False
+
+    encoded = json.dumps(alarmState, default=AlarmState.json_default)
+    decoded = json.loads(encoded)
+    assert decoded["zone"]["1"]["status"]["open"] is False
+    assert decoded["partition"]["1"]["status"]["alpha"] == "N/A"
+    assert json.loads(json.dumps(AlarmState.as_dict(alarmState))) == decoded
+
+
+def test_apply_reports_only_changes():
+    alarmState = AlarmState.get_initial_alarm_state(4, 1)
+    status = alarmState["zone"][2]["status"]
+
+    assert status.apply({"open": True, "fault": False}) == {"open": (False, True)}
+    assert status.apply({"open": True}) == {}
+    assert status.apply({"open": False, "alarm": True}) == {
+        "open": (True, False),
+        "alarm": (False, True),
+    }
+
+    partition = alarmState["partition"][1]["status"]
+    # A field that was never set is reported with an old value of None, as are the keys that
+    # are not known ahead of time
+    assert partition.apply({"chime": False, "pgm_2_last_triggered": 10}) == {
+        "chime": (None, False),
+        "pgm_2_last_triggered": (None, 10),
+    }
+    assert partition.apply({"chime": False, "pgm_2_last_triggered": 10}) == {}
+    assert partition["pgm_2_last_triggered"] == 10
+
+
+def test_apply_clears_stale_marker():
+    alarmState = AlarmState.get_initial_alarm_state(4, 1)
+    status = alarmState["zone"][1]["status"]
+    status.stale = True
+
+    # The marker is an attribute rather than a field so it is not reported as a change
+    assert status.apply({"open": False}) == {}
+    assert status.stale is False
+    assert "stale" not in status
+    assert "stale" not in alarmState["zone"][1].as_dict()["status"]
+    assert "stale" not in alarmState["partition"][1]["status"].copy()
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from pyenvisalink.callback_dispatcher import (
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_MERGE,
+    CallbackDispatcher,
+)
+
+
+def test_inline_dispatch():
+    async def run():
+        dispatcher = CallbackDispatcher()
+        calls = []
+
+        async def async_callback(value):
+            calls.append(("async", value))
+
+        def failing_callback(value):
+            raise RuntimeError("callback failed")
+
+        dispatcher.dispatch(calls.append, 1)
+        # Plain callbacks run before dispatch() returns
+        assert calls == [1]
+        dispatcher.dispatch(async_callback, 2)
+        dispatcher.dispatch(failing_callback, 3)
+        await dispatcher.stop()
+
+        assert calls == [1, ("async", 2)]
+        stats = dispatcher.stats()
+        assert stats["dispatched"] == 3
+        assert stats["completed"] == 2
+        assert stats["failed"] == 1
+
+    asyncio.run(run())
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        CallbackDispatcher(maxQueueSize=1, overflowPolicy="block")
+
+
+def dispatch_while_blocked(policy, argsList):
+    """Dispatch callbacks to a queue of two entries before the workers get a chance to run
+    and return the arguments the callback was eventually called with."""
+
+    async def run():
+        dispatcher = CallbackDispatcher(maxQueueSize=2, overflowPolicy=policy)
+        calls = []
+        for args in argsList:
+            dispatcher.dispatch(calls.append, args)
+        assert dispatcher.queue_length <= 2
+        await dispatcher.stop()
+        return calls, dispatcher.stats()
+
+    return asyncio.run(run())
+
+
+def test_overflow_drop_oldest():
+    calls, stats = dispatch_while_blocked(OVERFLOW_DROP_OLDEST, ["a", "b", "c", "d"])
+    assert calls == ["c", "d"]
+    assert stats["dropped"] == 2
+    assert stats["completed"] == 2
+    assert stats["max_queue_length"] == 2
+
+
+def test_overflow_drop_newest():
+    calls, stats = dispatch_while_blocked(OVERFLOW_DROP_NEWEST, ["a", "b", "c", "d"])
+    assert calls == ["a", "b"]
+    assert stats["dropped"] == 2
+
+
+def test_overflow_merge():
+    calls, stats = dispatch_while_blocked(OVERFLOW_MERGE, [[1], [2, 3], [3, 4], [5]])
+    # The IDs of the callbacks that did not fit are merged into the newest queued callback
+    assert calls == [[1], [2, 3, 4, 5]]
+    assert stats["merged"] == 2
+    assert stats["dropped"] == 0
+
+
+def test_overflow_merge_falls_back_to_dropping_the_oldest():
+    calls, stats = dispatch_while_blocked(OVERFLOW_MERGE, ["a", "b", "c"])
+    assert calls == ["b", "c"]
+    assert stats["dropped"] == 1
+
+
+def test_workers_run_coroutine_callbacks():
+    async def run():
+        dispatcher = CallbackDispatcher(maxQueueSize=10, workers=2)
+        calls = []
+
+        async def slow_callback(value):
+            await asyncio.sleep(0.01)
+            calls.append(value)
+
+        for value in range(4):
+            dispatcher.dispatch(slow_callback, value)
+        await dispatcher.stop()
+        assert sorted(calls) == [0, 1, 2, 3]
+        assert dispatcher.stats()["completed"] == 4
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+
+import pytest
+
+from pyenvisalink.capture import (
+    CAPTURE_RX,
+    CAPTURE_TX,
+    CaptureWriter,
+    _UnmatchedAckFilter,
+    read_capture,
+    replay_capture,
+)
+from pyenvisalink.const import STATE_CHANGE_ZONE
+from pyenvisalink.dsc_client import DSCClient
+
+
+def tpi_line(code, data):
+    return code + data + DSCClient.get_checksum(code, data)
+
+
+def test_lines_are_written_as_they_are_recorded(tmp_path):
+    path = tmp_path / "panel.capture"
+    writer = CaptureWriter(str(path), {"panel_type": "DSC"})
+    writer.record_lines(CAPTURE_RX, ["5053CD", "5000009E"], 100.0)
+    writer.record(CAPTURE_TX, "005****54", 100.5)
+
+    # Readable before the writer is closed (e.g. if the process is killed)
+    metadata, records = read_capture(str(path))
+    assert metadata["panel_type"] == "DSC"
+    assert records == [
+        (100.0, CAPTURE_RX, "5053CD"),
+        (100.0, CAPTURE_RX, "5000009E"),
+        (100.5, CAPTURE_TX, "005****54"),
+    ]
+    writer.close()
+
+
+def test_replay(tmp_path):
+    path = tmp_path / "panel.capture"
+    writer = CaptureWriter(str(path), {"panel_type": "DSC", "envisalink_version": "4"})
+    writer.record_lines(CAPTURE_RX, [tpi_line("609", "003")], 100.0)
+    writer.record_lines(CAPTURE_RX, [tpi_line("500", "000")], 100.1)
+    writer.record_lines(CAPTURE_RX, [tpi_line("610", "003")], 101.0)
+    writer.close()
+
+    result = asyncio.run(replay_capture(str(path)))
+    assert result["panel_type"] == "DSC"
+    assert result["messages"] == 3
+    assert result["acknowledgements"] == 1
+    assert [diff for _, diff in result["timeline"]] == [
+        {STATE_CHANGE_ZONE: {3: {"open": (False, True)}}},
+        {STATE_CHANGE_ZONE: {3: {"open": (True, False)}}},
+    ]
+
+
+def test_ack_filter_handles_any_message():
+    ackFilter = _UnmatchedAckFilter()
+
+    def make_record(msg, args=()):
+        return logging.LogRecord("test", logging.ERROR, __file__, 1, msg, args, None)
+
+    assert not ackFilter.filter(
+        make_record("Command acknowledgement received for '%s' when no command was issued.", "x")
+    )
+    assert not ackFilter.filter(
+        make_record("Command/system error received when no command is active.")
+    )
+    assert ackFilter.filter(make_record(ValueError("not a string")))
+    assert ackFilter.filter(make_record("Something else"))
+    assert ackFilter.count == 2
+
+
+@pytest.mark.parametrize("errorLine", [tpi_line("501", ""), tpi_line("502", "020")])
+def test_replay_hides_unmatched_acknowledgements(tmp_path, caplog, errorLine):
+    path = tmp_path / "panel.capture"
+    writer = CaptureWriter(str(path), {"panel_type": "DSC", "envisalink_version": "4"})
+    writer.record(CAPTURE_TX, "005****54", 100.0)
+    writer.record_lines(CAPTURE_RX, [tpi_line("500", "005")], 100.1)
+    writer.record(CAPTURE_TX, "0010091", 101.0)
+    writer.record_lines(CAPTURE_RX, [errorLine], 101.1)
+    writer.close()
+
+    with caplog.at_level(logging.ERROR, logger="pyenvisalink.envisalink_base_client"):
+        result = asyncio.run(replay_capture(str(path)))
+    assert result["acknowledgements"] == 2
+    assert not [
+        record for record in caplog.records if record.name == "pyenvisalink.envisalink_base_client"
+    ]
@@ -0,0 +1,186 @@
+import asyncio
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.const import PANEL_TYPE_DSC
+from pyenvisalink.dsc_envisalinkdefs import evl_Commands
+from pyenvisalink.envisalink_base_client import CommandPriority
+
+
+def make_client():
+    """Create a DSC client that records the commands it sends rather than sending them."""
+    panel = EnvisalinkAlarmPanel("127.0.0.1", zoneTimerInterval=0, keepAliveInterval=0)
+    panel.panel_type = PANEL_TYPE_DSC
+    client = panel.create_client()
+    sent = []
+
+    async def send_command(code, data, logData=None):
+        sent.append(code + data)
+
+    client.send_command = send_command
+    return client, sent
+
+
+async def settle():
+    """Let the tasks queueing commands run up to the point where they wait for a result."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def send_and_acknowledge(client, sent):
+    """Send each queued command in turn, acknowledging it as the EVL would."""
+    while True:
+        count = len(sent)
+        await client.send_queued_commands()
+        if len(sent) == count:
+            break
+        client.command_succeeded(sent[-1][:3])
+        await settle()
+
+
+def test_commands_are_sent_in_priority_order():
+    async def run():
+        client, sent = make_client()
+        tasks = [
+            asyncio.create_task(client.queue_command(evl_Commands["StatusReport"], "")),
+            asyncio.create_task(client.queue_command(evl_Commands["CommandOutput"], "11")),
+            asyncio.create_task(client.queue_command(evl_Commands["Disarm"], "1")),
+            asyncio.create_task(client.queue_command(evl_Commands["Panic"], "1")),
+            asyncio.create_task(client.queue_command(evl_Commands["CommandOutput"], "12")),
+        ]
+        await settle()
+        await send_and_acknowledge(client, sent)
+        assert sent == ["0601", "0401", "02011", "02012", "001"]
+        assert [task.result() for task in tasks] == [True] * 5
+
+    asyncio.run(run())
+
+
+def test_group_is_not_interrupted():
+    async def run():
+        client, sent = make_client()
+        keypresses = [
+            {"cmd": evl_Commands["PartitionKeypress"], "data": "1" + key} for key in "123"
+        ]
+        group = asyncio.create_task(client.queue_commands(keypresses))
+        await settle()
+
+        # Send the first keypress, then queue a panic while the group is part way through
+        await client.send_queued_commands()
+        panic = asyncio.create_task(client.queue_command(evl_Commands["Panic"], "1"))
+        await settle()
+        client.command_succeeded(sent[-1][:3])
+        await settle()
+
+        await send_and_acknowledge(client, sent)
+        assert sent == ["07111", "07112", "07113", "0601"]
+        assert group.result() is True
+        assert panic.result() is True
+
+    asyncio.run(run())
+
+
+def test_failed_and_retried_commands():
+    async def run():
+        client, sent = make_client()
+        failed = asyncio.create_task(client.queue_command(evl_Commands["CommandOutput"], "11"))
+        retried = asyncio.create_task(client.queue_command(evl_Commands["CommandOutput"], "12"))
+        await settle()
+
+        await client.send_queued_commands()
+        client.command_failed(retry=False)
+        await settle()
+        assert failed.result() is False
+
+        await client.send_queued_commands()
+        client.command_failed(retry=True)
+        await settle()
+        assert not retried.done()
+
+        # The retry is held back until its retry delay has passed
+        await client.send_queued_commands()
+        assert sent == ["02011", "02012"]
+        await client.process_command_deadlines(float("inf"))
+        await send_and_acknowledge(client, sent)
+        assert sent == ["02011", "02012", "02012"]
+        assert retried.result() is True
+
+    asyncio.run(run())
+
+
+def test_latency_stats_are_kept_per_priority():
+    async def run():
+        client, sent = make_client()
+        tasks = [
+            asyncio.create_task(client.queue_command(evl_Commands["Panic"], "1")),
+            asyncio.create_task(
+                client.queue_command(
+                    evl_Commands["CommandOutput"], "11", priority=CommandPriority.BACKGROUND
+                )
+            ),
+        ]
+        await settle()
+        await send_and_acknowledge(client, sent)
+        await asyncio.gather(*tasks)
+
+        stats = client.command_latency_stats()
+        assert stats["panic"]["count"] == 1
+        assert stats["background"]["count"] == 1
+        assert stats["normal"]["count"] == 0
+
+    asyncio.run(run())
+
+
+def test_identical_commands_are_coalesced():
+    async def run():
+        client, sent = make_client()
+        tasks = [
+            asyncio.create_task(client.queue_command(evl_Commands["StatusReport"], ""))
+            for _ in range(3)
+        ]
+        await settle()
+        await send_and_acknowledge(client, sent)
+        assert sent == ["001"]
+        assert [task.result() for task in tasks] == [True] * 3
+
+        # Once sent, an identical command is queued again
+        again = asyncio.create_task(client.queue_command(evl_Commands["StatusReport"], ""))
+        await settle()
+        await send_and_acknowledge(client, sent)
+        assert sent == ["001", "001"]
+        assert again.result() is True
+
+    asyncio.run(run())
+
+
+def test_coalesced_command_takes_the_higher_priority():
+    async def run():
+        client, sent = make_client()
+        background = asyncio.create_task(client.queue_command(evl_Commands["StatusReport"], ""))
+        normal = asyncio.create_task(client.queue_command(evl_Commands["CommandOutput"], "11"))
+        await settle()
+
+        # An urgent request for the same status report moves the queued one ahead of the
+        # normal priority command rather than waiting behind it
+        urgent = asyncio.create_task(
+            client.queue_command(evl_Commands["StatusReport"], "", priority=CommandPriority.ARM)
+        )
+        await settle()
+        await send_and_acknowledge(client, sent)
+        assert sent == ["001", "02011"]
+        assert background.result() is True
+        assert urgent.result() is True
+        assert normal.result() is True
+        assert client.command_latency_stats()["arm"]["count"] == 1
+
+        # A lower priority duplicate does not demote the queued command
+        urgent = asyncio.create_task(
+            client.queue_command(evl_Commands["StatusReport"], "", priority=CommandPriority.ARM)
+        )
+        normal = asyncio.create_task(client.queue_command(evl_Commands["CommandOutput"], "12"))
+        await settle()
+        background = asyncio.create_task(client.queue_command(evl_Commands["StatusReport"], ""))
+        await settle()
+        await send_and_acknowledge(client, sent)
+        assert sent == ["001", "02011", "001", "02012"]
+
+    asyncio.run(run())
@@ -0,0 +1,69 @@
+import asyncio
+
+import aiohttp
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.discovery import discover_panels
+from pyenvisalink.panel_manager import PanelManager
+
+
+def make_panel(host):
+    # Nothing listens on these ports so discovery fails straight away
+    return EnvisalinkAlarmPanel(host, port=1, httpPort=1, connectionTimeout=1)
+
+
+async def discover_all(results):
+    return [result async for result in results]
+
+
+def test_discovery_leaves_the_panel_session_alone():
+    async def run():
+        panel = make_panel("127.0.0.1")
+        ownSession = panel.get_http_session()
+        async with aiohttp.ClientSession() as shared:
+            results = await discover_all(discover_panels([panel], httpSession=shared))
+        assert [result.host for result in results] == ["127.0.0.1"]
+
+        # The panel still owns (and so closes) the session it created
+        assert panel.http_session is ownSession
+        await panel.close_http_session()
+        assert ownSession.closed
+
+    asyncio.run(run())
+
+
+def test_manager_does_not_discover_started_panels():
+    async def run():
+        manager = PanelManager()
+        started = manager.add_panel(make_panel("127.0.0.1"))
+        offline = manager.add_panel(make_panel("127.0.0.2"))
+        started._lastConnectionResult = EnvisalinkAlarmPanel.ConnectionResult.SUCCESS
+
+        results = await discover_all(manager.discover_panels(timeout=1))
+        assert [result.host for result in results] == [offline.host]
+        await manager.stop()
+
+    asyncio.run(run())
+
+
+def test_panel_type_fallback_uses_the_shared_session():
+    async def run():
+        async def handle_client(reader, writer):
+            writer.write(b"Login:\n")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        panel = EnvisalinkAlarmPanel("127.0.0.1", port=port, httpPort=1, connectionTimeout=1)
+        async with aiohttp.ClientSession() as shared:
+            results = await discover_all(discover_panels([panel], httpSession=shared))
+        assert results[0].panel_type == "HONEYWELL"
+
+        # Asking the web interface whether it is a Honeywell or UNO panel did not make the
+        # panel create (and leave unclosed) a session of its own
+        assert panel.http_session is None
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
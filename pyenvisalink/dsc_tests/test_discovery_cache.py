@@ -0,0 +1,73 @@
+import asyncio
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.discovery_cache import DiscoveryCache
+
+DETAILS = {
+    "panel_type": "DSC",
+    "envisalink_version": "4",
+    "firmware_version": "01.02.03",
+    "mac_address": "00:1C:2A:00:00:01",
+}
+
+
+def make_panel(cache, password):
+    # Nothing listens on the HTTP port so contacting the EVL fails straight away
+    return EnvisalinkAlarmPanel(
+        "127.0.0.1",
+        password=password,
+        httpPort=1,
+        connectionTimeout=1,
+        discoveryCache=cache,
+    )
+
+
+def test_cached_details_need_the_verified_credentials():
+    async def run():
+        cache = DiscoveryCache()
+        panel = make_panel(cache, "secret")
+        cache.put("127.0.0.1", 4025, DETAILS, ("user", "secret"))
+
+        result = await panel.discover()
+        assert result == EnvisalinkAlarmPanel.ConnectionResult.SUCCESS
+        assert panel.panel_type == "DSC"
+        assert panel.mac_address == "00:1c:2a:00:00:01"
+
+        # Different credentials are checked against the EVL rather than taken on trust
+        other = make_panel(cache, "wrong")
+        result = await other.discover()
+        assert result == EnvisalinkAlarmPanel.ConnectionResult.CONNECTION_FAILED
+        await panel.close_http_session()
+        await other.close_http_session()
+
+    asyncio.run(run())
+
+
+def test_unverified_details_keep_the_verified_credentials():
+    cache = DiscoveryCache()
+    cache.put("10.0.0.5", 4025, DETAILS, ("user", "secret"))
+
+    # e.g. the panel type found by probing the TPI, which does not check the credentials
+    cache.put("10.0.0.5", 4025, {"panel_type": "DSC", "mac_address": DETAILS["mac_address"]})
+    assert cache.credentials_verified("10.0.0.5", 4025, "user", "secret")
+    assert not cache.credentials_verified("10.0.0.5", 4025, "user", "wrong")
+    assert cache.get("10.0.0.5", 4025)["firmware_version"] == "01.02.03"
+
+    # A different EVL at the same address starts over
+    cache.put("10.0.0.5", 4025, {"panel_type": "DSC", "mac_address": "00:1c:2a:00:00:02"})
+    assert not cache.credentials_verified("10.0.0.5", 4025, "user", "secret")
+
+
+def test_credentials_are_not_stored(tmp_path):
+    path = tmp_path / "discovery.json"
+    cache = DiscoveryCache(str(path))
+    cache.put("10.0.0.5", 4025, DETAILS, ("user", "secret"))
+    fingerprint = cache.credentials_key("10.0.0.5", 4025, "user", "secret")
+    assert "secret" not in path.read_text()
+    assert fingerprint not in path.read_text()
+
+    # Each cache keys its fingerprints with its own secret
+    reloaded = DiscoveryCache(str(path))
+    assert reloaded.credentials_key("10.0.0.5", 4025, "user", "secret") != fingerprint
+    assert reloaded.get("10.0.0.5", 4025)["firmware_version"] == "01.02.03"
+    assert not reloaded.credentials_verified("10.0.0.5", 4025, "user", "secret")
@@ -0,0 +1,127 @@
+import asyncio
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.const import (
+    PANEL_TYPE_DSC,
+    STATE_CHANGE_KEYPAD,
+    STATE_CHANGE_PARTITION,
+    STATE_CHANGE_ZONE,
+    STATE_CHANGE_ZONE_BYPASS,
+)
+from pyenvisalink.dsc_client import DSCClient
+
+
+def make_client():
+    panel = EnvisalinkAlarmPanel(
+        "127.0.0.1", zoneTimerInterval=0, keepAliveInterval=0, zoneBypassEnabled=True
+    )
+    panel.panel_type = PANEL_TYPE_DSC
+    return panel, panel.create_client()
+
+
+def tpi_line(code, data):
+    return code + data + DSCClient.get_checksum(code, data)
+
+
+def test_zone_state_change():
+    async def run():
+        panel, client = make_client()
+        zone = panel.alarm_state["zone"][5]
+
+        result = client.handle_zone_state_change("609", "005")
+        assert result == {STATE_CHANGE_ZONE: {5: {"open": (False, True)}}}
+        assert zone["status"]["open"] is True
+        assert zone["last_fault"] > 0
+
+        # A repeated report is not a change
+        assert client.handle_zone_state_change("609", "005") is None
+
+        result = client.handle_zone_state_change("610", "005")
+        assert result == {STATE_CHANGE_ZONE: {5: {"open": (True, False)}}}
+        assert zone["status"]["open"] is False
+
+    asyncio.run(run())
+
+
+def test_partition_state_change():
+    async def run():
+        panel, client = make_client()
+        status = panel.alarm_state["partition"][1]["status"]
+
+        result = client.handle_partition_state_change("652", "10")
+        changes = result[STATE_CHANGE_PARTITION][1]
+        assert changes["armed_away"] == (False, True)
+        assert changes["alpha"] == ("N/A", "Arm Away")
+        # Fields that already had the reported value are left out
+        assert "armed_stay" not in changes
+        assert status["armed_away"] is True
+
+        result = client.handle_partition_state_change("663", "1")
+        assert result == {STATE_CHANGE_PARTITION: {1: {"chime": (None, True)}}}
+        assert status["chime"] is True
+
+        # Other partitions are untouched
+        assert panel.alarm_state["partition"][2]["status"]["armed_away"] is False
+
+    asyncio.run(run())
+
+
+def test_trouble_keypad_update():
+    async def run():
+        panel, client = make_client()
+
+        result = client.handle_keypad_update("849", "02")
+        updates = result[STATE_CHANGE_KEYPAD]
+        assert sorted(updates) == sorted(panel.alarm_state["partition"])
+        for partition in panel.alarm_state["partition"].values():
+            assert partition["status"]["ac_present"] is False
+        assert updates[1]["ac_present"] == (True, False)
+
+        assert client.handle_keypad_update("849", "02") == {STATE_CHANGE_KEYPAD: {}}
+
+    asyncio.run(run())
+
+
+def test_zone_bypass_update():
+    async def run():
+        panel, client = make_client()
+
+        result = client.handle_zone_bypass_update("616", "0500000000000080")
+        assert result == {
+            STATE_CHANGE_ZONE_BYPASS: {
+                1: {"bypassed": (False, True)},
+                3: {"bypassed": (False, True)},
+                64: {"bypassed": (False, True)},
+            }
+        }
+        assert panel.alarm_state["zone"][3]["bypassed"] is True
+
+        result = client.handle_zone_bypass_update("616", "0100000000000000")
+        assert result == {
+            STATE_CHANGE_ZONE_BYPASS: {
+                3: {"bypassed": (True, False)},
+                64: {"bypassed": (True, False)},
+            }
+        }
+
+    asyncio.run(run())
+
+
+def test_callbacks_receive_changes():
+    async def run():
+        panel, client = make_client()
+        zones = []
+        diffs = []
+        panel.callback_zone_state_change = zones.append
+        panel.callback_state_diff = diffs.append
+
+        client.process_lines(
+            [tpi_line("609", "007"), tpi_line("609", "007"), tpi_line("610", "007")]
+        )
+        assert zones == [[7], [7]]
+        assert diffs == [
+            {STATE_CHANGE_ZONE: {7: {"open": (False, True)}}},
+            {STATE_CHANGE_ZONE: {7: {"open": (True, False)}}},
+        ]
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.const import PANEL_TYPE_HONEYWELL
+from pyenvisalink.honeywell_client import HoneywellClient
+from pyenvisalink.honeywell_envisalinkdefs import IconLED_Flags
+from pyenvisalink.honeywell_keypad import KeypadCache, classify_alpha
+
+READY = 0x1C08  # ready and AC present, reported for the partition rather than a zone
+ARMED_AWAY = 0x0004
+ALARM = 0x0001
+BYPASS = 0x0010
+
+
+def test_cache_evicts_the_least_recently_used():
+    cache = KeypadCache(maxSize=2)
+    cache.lookup(READY, "Ready to Arm")
+    cache.lookup(ARMED_AWAY, "ARMED ***AWAY***")
+    cache.lookup(READY, "Ready to Arm")
+    cache.lookup(ALARM, "ALARM 03")
+
+    # The armed away display was the least recently used so it made way for the alarm
+    assert len(cache) == 2
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "hit_rate": 0.25,
+        "evictions": 1,
+        "size": 2,
+        "max_size": 2,
+    }
+    cache.lookup(ARMED_AWAY, "ARMED ***AWAY***")
+    assert cache.stats()["misses"] == 4
+
+    cache.clear()
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        KeypadCache(maxSize=0)
+
+
+def test_cached_reports_match_the_classifiers():
+    cache = KeypadCache()
+    updates = [
+        (READY, "Ready to Arm"),
+        (ARMED_AWAY, "ARMED ***AWAY*** You may exit now"),
+        (ARMED_AWAY | 0x0080, "ARMED ***AWAY***"),
+        (ALARM, "ALARM 03 FRONT DOOR"),
+        (BYPASS, "BYPAS 07 GARAGE"),
+        (BYPASS, "FAULT 07 GARAGE"),
+        (0x0000, "FAULT 05 FRONT DOOR"),
+    ]
+    for word, alpha in updates:
+        flags = IconLED_Flags()
+        flags.asShort = word
+        for _ in range(2):
+            report = cache.lookup(word, alpha)
+            assert report.partition_state == HoneywellClient.get_partition_state(flags, alpha)
+            assert report.zone_report == HoneywellClient.get_zone_report_type(flags, alpha)
+            assert report.zone == classify_alpha(alpha).zone
+            assert report.icons.bypass == bool(word & BYPASS)
+
+    assert cache.lookup(ARMED_AWAY, "ARMED ***AWAY*** You may exit now").partition_state == (
+        "arming"
+    )
+    assert cache.lookup(BYPASS, "BYPAS 07 GARAGE").zone_report == "bypass"
+    assert cache.lookup(BYPASS, "FAULT 07 GARAGE").zone_report == "notready"
+    assert cache.stats()["hits"] == len(updates) + 3
+
+
+def test_zone_falls_back_to_the_alpha():
+    async def run():
+        panel = EnvisalinkAlarmPanel("127.0.0.1", zoneTimerInterval=0, keepAliveInterval=0)
+        panel.panel_type = PANEL_TYPE_HONEYWELL
+        client = panel.create_client()
+
+        # The user/zone field is not a zone number so the zone named in the alpha is used
+        result = client.handle_keypad_update("00", "01,0008,FC,00,FAULT 05 FRONT DOOR     ")
+        assert result["zone"] == {5: {"open": (False, True), "fault": (False, True)}}
+
+        result = client.handle_keypad_update("00", "01,0008,09,00,FAULT 05 FRONT DOOR     ")
+        assert result == {"zone": {9: {"open": (False, True), "fault": (False, True)}}}
+        assert panel.keypad_cache_stats()["hits"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+import asyncio
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.panel_manager import PanelManager
+
+SUCCESS = EnvisalinkAlarmPanel.ConnectionResult.SUCCESS
+CONNECTION_FAILED = EnvisalinkAlarmPanel.ConnectionResult.CONNECTION_FAILED
+
+
+def make_panel(host, lastConnectionResult, calls):
+    panel = EnvisalinkAlarmPanel(host)
+    panel._lastConnectionResult = lastConnectionResult
+
+    async def start():
+        calls.append(("start", host))
+        panel._lastConnectionResult = SUCCESS
+        return SUCCESS
+
+    async def stop():
+        calls.append(("stop", host))
+
+    panel.start = start
+    panel.stop = stop
+    return panel
+
+
+def test_start_skips_started_panels():
+    async def run():
+        calls = []
+        manager = PanelManager(restartInterval=0)
+        # Started successfully but currently reconnecting, so not online
+        reconnecting = manager.add_panel(make_panel("10.0.0.1", SUCCESS, calls))
+        manager.add_panel(make_panel("10.0.0.2", CONNECTION_FAILED, calls))
+        manager.add_panel(make_panel("10.0.0.3", None, calls))
+        assert not reconnecting.is_online()
+
+        results = await manager.start()
+        assert results == {"10.0.0.2:4025": SUCCESS, "10.0.0.3:4025": SUCCESS}
+        assert ("start", "10.0.0.1") not in calls
+
+        # Now that they have all started, starting again does nothing
+        assert await manager.start() == {}
+        await manager.stop()
+
+    asyncio.run(run())
+
+
+def test_remove_stops_started_panels():
+    async def run():
+        calls = []
+        manager = PanelManager(restartInterval=0)
+        manager.add_panel(make_panel("10.0.0.1", SUCCESS, calls))
+        manager.add_panel(make_panel("10.0.0.2", None, calls))
+
+        await manager.remove_panel("10.0.0.1")
+        await manager.remove_panel("10.0.0.2")
+        assert calls == [("stop", "10.0.0.1")]
+        assert manager.panels == {}
+        await manager.stop()
+
+    asyncio.run(run())
@@ -2,7 +2,7 @@ import json
 import logging
 import re
 
-from pyenvisalink import AlarmState
+from pyenvisalink.alarm_state import AlarmState
 from pyenvisalink.dsc_envisalinkdefs import evl_ArmModes, evl_ResponseTypes
 
 _LOGGER = logging.getLogger(__name__)
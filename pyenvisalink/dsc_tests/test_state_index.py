@@ -0,0 +1,127 @@
+import ast
+import pathlib
+
+from pyenvisalink.alarm_state import (
+    PARTITION_INDEX_FIELDS,
+    ZONE_INDEX_FIELDS,
+    AlarmState,
+    StateIndex,
+)
+
+
+def make_state():
+    zoneIndex = StateIndex(ZONE_INDEX_FIELDS)
+    partitionIndex = StateIndex(PARTITION_INDEX_FIELDS)
+    alarmState = AlarmState.get_initial_alarm_state(64, 8, zoneIndex, partitionIndex)
+    return alarmState, zoneIndex, partitionIndex
+
+
+def assert_consistent(records, index, status=True):
+    # Every field's bitset matches the records it was built from
+    for field in index.fields:
+        expected = []
+        for number, record in records.items():
+            values = record["status"] if status and field in record["status"] else record
+            if values.get(field):
+                expected.append(number)
+        assert index.members(field) == expected, field
+
+
+def test_apply_updates_the_index():
+    alarmState, zoneIndex, partitionIndex = make_state()
+    zones = alarmState["zone"]
+
+    zones[3]["status"].apply({"open": True, "fault": True})
+    zones[64]["status"].apply({"open": True})
+    assert zoneIndex.members("open") == [3, 64]
+    assert zoneIndex.count("open", "fault") == 2
+
+    zones[3]["status"].apply({"open": False})
+    assert zoneIndex.members("open") == [64]
+    assert zoneIndex.is_set("fault", 3)
+
+    partitionStatus = alarmState["partition"][2]["status"]
+    partitionStatus.apply({"armed_away": True, "alpha": "Armed Away"})
+    assert partitionIndex.members("armed_away") == [2]
+    assert_consistent(zones, zoneIndex)
+    assert_consistent(alarmState["partition"], partitionIndex)
+
+
+def test_item_assignment_updates_the_index():
+    alarmState, zoneIndex, partitionIndex = make_state()
+
+    alarmState["zone"][5]["status"]["alarm"] = True
+    alarmState["zone"][6]["status"].update(tamper=True, low_battery=True)
+    alarmState["partition"][1]["status"]["ready"] = True
+    assert zoneIndex.members("alarm") == [5]
+    assert zoneIndex.members("tamper", "low_battery") == [6]
+    assert partitionIndex.members("ready") == [1]
+
+    alarmState["partition"][1]["status"]["ready"] = False
+    assert partitionIndex.members("ready") == []
+    assert_consistent(alarmState["zone"], zoneIndex)
+    assert_consistent(alarmState["partition"], partitionIndex)
+
+
+def test_bypass_updates_the_index():
+    alarmState, zoneIndex, _ = make_state()
+    zones = alarmState["zone"]
+
+    zones[1].bypassed = True
+    zones[2]["bypassed"] = True
+    zones[3].apply({"bypassed": True})
+    assert zoneIndex.members("bypassed") == [1, 2, 3]
+
+    zones[2].bypassed = False
+    assert zoneIndex.members("bypassed") == [1, 3]
+    assert_consistent(zones, zoneIndex)
+
+
+def test_delete_clears_the_index():
+    alarmState, zoneIndex, partitionIndex = make_state()
+    zone = alarmState["zone"][4]
+    partitionStatus = alarmState["partition"][3]["status"]
+
+    zone["status"]["open"] = True
+    zone["bypassed"] = True
+    partitionStatus["alarm"] = True
+    partitionStatus["custom"] = True
+
+    del zone["status"]["open"]
+    del zone["bypassed"]
+    del partitionStatus["alarm"]
+    del partitionStatus["custom"]
+    assert zoneIndex.members("open") == []
+    assert zoneIndex.members("bypassed") == []
+    assert partitionIndex.members("alarm") == []
+    assert "open" not in zone["status"]
+
+    # The fields can be set again afterwards
+    zone["status"]["open"] = True
+    zone.bypassed = True
+    assert zoneIndex.members("open", "bypassed") == [4]
+
+
+def test_indexed_fields_are_not_assigned_directly():
+    # Assigning an indexed status field as an attribute (e.g. status.open = True) would skip
+    # the index, so the library must change them through apply() or item assignment.
+    # 'bypassed' is a property that keeps the index up to date.  The mock servers build
+    # the EVL's own flags, which are not records.
+    package = pathlib.Path(__file__).parent.parent
+    indexed = (set(ZONE_INDEX_FIELDS) | set(PARTITION_INDEX_FIELDS)) - {"bypassed"}
+    assignments = []
+    for path in sorted(package.rglob("*.py")):
+        if path.name == "alarm_state.py" or path.name.startswith("mock_"):
+            continue
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.Assign):
+                targets = node.targets
+            elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+                targets = [node.target]
+            else:
+                continue
+            for target in targets:
+                for child in ast.walk(target):
+                    if isinstance(child, ast.Attribute) and child.attr in indexed:
+                        assignments.append(f"{path.name}:{node.lineno} {child.attr}")
+    assert assignments == []
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.dsc_client import DSCClient
+from pyenvisalink.state_snapshot import SNAPSHOT_VERSION, load_snapshot, save_snapshot
+
+
+def tpi_line(code, data):
+    return (code + data + DSCClient.get_checksum(code, data) + "\r\n").encode()
+
+
+async def start_rejecting_evl():
+    """Start a TPI server that prompts for the password and then rejects it."""
+
+    async def handle_client(reader, writer):
+        writer.write(tpi_line("505", "3"))
+        await reader.readline()
+        writer.write(tpi_line("505", "0"))
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle_client, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_failed_start_invalidates_the_snapshot_metadata(tmp_path):
+    async def run():
+        server, port = await start_rejecting_evl()
+        path = str(tmp_path / "snapshot.json")
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "saved": time.time(),
+            "host": "127.0.0.1",
+            "port": port,
+            "metadata": {"panel_type": "DSC", "envisalink_version": "4"},
+            "partition": {},
+            "zone": {},
+            "client": {},
+        }
+        save_snapshot(path, snapshot)
+
+        panel = EnvisalinkAlarmPanel(
+            "127.0.0.1",
+            port,
+            password="wrong",
+            connectionTimeout=2,
+            keepAliveInterval=0,
+            zoneTimerInterval=0,
+            stateSnapshotFile=path,
+        )
+        discoveries = []
+
+        async def discover_panel_type():
+            discoveries.append(panel.panel_type)
+            return EnvisalinkAlarmPanel.ConnectionResult.CONNECTION_FAILED
+
+        panel.discover_panel_type = discover_panel_type
+
+        result = await panel.start()
+        assert result == EnvisalinkAlarmPanel.ConnectionResult.INVALID_AUTHORIZATION
+        assert discoveries == []
+        assert panel.panel_type is None
+        assert load_snapshot(path)["metadata"]["invalid"] is True
+
+        # Later starts no longer trust the snapshot's panel type
+        for _ in range(2):
+            result = await panel.start()
+            assert result == EnvisalinkAlarmPanel.ConnectionResult.CONNECTION_FAILED
+        assert discoveries == [None, None]
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+import asyncio
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.const import PANEL_TYPE_UNO, STATE_CHANGE_ZONE
+
+
+def make_client():
+    panel = EnvisalinkAlarmPanel("127.0.0.1", zoneTimerInterval=0, keepAliveInterval=0)
+    panel.panel_type = PANEL_TYPE_UNO
+    return panel, panel.create_client()
+
+
+def test_zone_state_change():
+    async def run():
+        panel, client = make_client()
+
+        # Zones 1 and 10 faulted
+        result = client.handle_zone_state_change("%01", "0102")
+        assert result == {
+            STATE_CHANGE_ZONE: {
+                1: {"open": (False, True), "fault": (False, True)},
+                10: {"open": (False, True), "fault": (False, True)},
+            }
+        }
+        assert client.handle_zone_state_change("%01", "0102") == {STATE_CHANGE_ZONE: {}}
+
+    asyncio.run(run())
+
+
+def test_unchanged_zone_is_no_longer_stale():
+    async def run():
+        panel, client = make_client()
+        zone = panel.alarm_state["zone"][2]
+        # As restored from a state snapshot
+        zone.status.stale = True
+
+        client.handle_zone_state_change("%01", "0000")
+        assert zone.status.stale is False
+        assert zone.status.open is False
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from pyenvisalink.alarm_panel import EnvisalinkAlarmPanel
+from pyenvisalink.const import PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, STATE_CHANGE_ZONE
+
+
+def make_client(panelType):
+    panel = EnvisalinkAlarmPanel("127.0.0.1", zoneTimerInterval=0, keepAliveInterval=0)
+    panel.panel_type = panelType
+    return panel, panel.create_client()
+
+
+def zone_timer_dump(ticks, zones=64):
+    """Encode a zone timer dump with the given tick counts by zone number (others never
+    opened)."""
+    dump = ""
+    for zoneNumber in range(1, zones + 1):
+        value = 0xFFFF - ticks.get(zoneNumber, 0xFFFF)
+        dump += f"{value & 0xFF:02X}{value >> 8:02X}"
+    return dump
+
+
+def test_open_zones_keep_their_last_fault_current():
+    async def run():
+        panel, client = make_client(PANEL_TYPE_DSC)
+        zone = panel.alarm_state["zone"][3]
+        dump = zone_timer_dump({3: 0, 5: 12})
+
+        result = client.handle_zone_timer_dump("615", dump)
+        assert result == {STATE_CHANGE_ZONE: {3: {"open": (False, True), "fault": (False, True)}}}
+        closedLastFault = panel.alarm_state["zone"][5].last_fault
+        assert abs(closedLastFault - (time.time() - 60)) < 1
+
+        # The same dump again changes no state but zone 3 is still open as of now
+        zone.last_fault -= 100
+        assert client.handle_zone_timer_dump("615", dump) == {STATE_CHANGE_ZONE: {}}
+        assert abs(zone.last_fault - time.time()) < 1
+        assert panel.alarm_state["zone"][5].last_fault == closedLastFault
+
+    asyncio.run(run())
+
+
+def test_keypad_updates_invalidate_the_previous_dump():
+    async def run():
+        panel, client = make_client(PANEL_TYPE_HONEYWELL)
+        client.handle_zone_timer_dump("%FF", zone_timer_dump({}))
+        assert client._zoneTimerTicks is not None
+
+        result = client.handle_keypad_update("00", "01,0008,05,00,FAULT 05 FRONT DOOR     ")
+        assert result["zone"] == {5: {"open": (False, True), "fault": (False, True)}}
+        assert client._zoneTimerTicks is None
+
+        client.handle_zone_timer_dump("%FF", zone_timer_dump({}))
+        client.close_zone_timer("5|state", {})
+        assert client._zoneTimerTicks is None
+
+    asyncio.run(run())
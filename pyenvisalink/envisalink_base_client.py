@@ -1,21 +1,147 @@
 import asyncio
+import heapq
+import itertools
 import logging
-import re
+import sys
 import time
-from enum import Enum
+from array import array
+from collections import deque, namedtuple
+from enum import Enum, IntEnum
+from functools import partial
 
+from .capture import CAPTURE_RX, CAPTURE_TX, CaptureWriter
 from .const import (
     STATE_CHANGE_KEYPAD,
     STATE_CHANGE_PARTITION,
     STATE_CHANGE_ZONE,
     STATE_CHANGE_ZONE_BYPASS,
 )
+from .scheduler import get_default_scheduler
 
 _LOGGER = logging.getLogger(__name__)
 
 _RECONNECT_MIN_TIME = 2
 _RECONNECT_MAX_TIME = 128
 
+# Most data that will be buffered waiting for a line terminator before the connection is
+# dropped (TPI lines are well under 100 bytes)
+_MAX_LINE_BUFFER = 64 * 1024
+
+# A single message received from the EVL along with the (pre-resolved) handler for it
+ParsedMessage = namedtuple("ParsedMessage", ["code", "data", "handler", "state_change"])
+
+# Each zone timer tick is 5 seconds
+ZONE_TIMER_TICK_SECONDS = 5
+
+# Inverting every byte of a little endian UINT16 zone timer gives 0xFFFF - timer, i.e. the
+# number of ticks since the zone was last open.
+_INVERT_BYTES = bytes(0xFF - i for i in range(256))
+
+
+def decode_zone_timer_dump(data) -> array:
+    """Decode the packed hex string of a zone timer dump into an array of per-zone tick
+    counts (index 0 is zone 1).  Zone timers count down from 0xFFFF (open) so the tick count
+    is the number of 5 second intervals since the zone was last open."""
+    raw = bytes.fromhex(data[: len(data) & ~3]).translate(_INVERT_BYTES)
+    ticks = array("H", raw)
+    if sys.byteorder != "little":
+        ticks.byteswap()
+    return ticks
+
+
+def changed_zone_timer_slots(previous: array, current: array) -> list:
+    """Return the (0-based) indexes of the zone timers that differ between two decoded zone
+    timer dumps.  The dumps are XORed as a single integer so the cost scales with the number
+    of changed timers rather than the number of zones."""
+    diff = int.from_bytes(previous.tobytes(), "little") ^ int.from_bytes(
+        current.tobytes(), "little"
+    )
+    changed = []
+    while diff:
+        # Each zone timer occupies 16 bits; find the lowest differing one and clear it
+        slot = ((diff & -diff).bit_length() - 1) >> 4
+        changed.append(slot)
+        diff >>= (slot + 1) << 4
+        diff <<= (slot + 1) << 4
+    return changed
+
+
+class EnvisalinkProtocol(asyncio.Protocol):
+    """Transport protocol for the TPI connection.  Received bytes are accumulated in a single
+    buffer and every complete line in it is handed to the client in one batch, rather than
+    waiting on the stream for each line."""
+
+    def __init__(self, client):
+        self._client = client
+        self._transport = None
+        self._buffer = bytearray()
+        self._drainWaiter = None
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self._transport = transport
+        # The EVL may send its login prompt before create_connection() returns to the client so
+        # make sure the client can already reply to it
+        self._client._transport = transport
+        self._client._protocol = self
+
+    def data_received(self, data):
+        buffer = self._buffer
+        buffer += data
+        end = buffer.rfind(b"\n")
+        if end < 0:
+            if len(buffer) > _MAX_LINE_BUFFER:
+                _LOGGER.error(
+                    "Received %d bytes from the EVL without a line terminator; disconnecting",
+                    len(buffer),
+                )
+                buffer.clear()
+                self._transport.close()
+            return
+
+        lines = []
+        start = 0
+        with memoryview(buffer) as view:
+            while start <= end:
+                eol = buffer.find(b"\n", start, end + 1)
+                try:
+                    lines.append(str(view[start:eol], "ascii"))
+                except UnicodeDecodeError:
+                    _LOGGER.error("Discarding non-ASCII data received from the EVL")
+                start = eol + 1
+        del buffer[:start]
+        self._client.process_lines(lines)
+
+    def connection_lost(self, exc):
+        self._transport = None
+        if not self.closed.done():
+            self.closed.set_result(exc)
+        self.resume_writing()
+
+    def pause_writing(self):
+        if self._drainWaiter is None:
+            self._drainWaiter = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        waiter = self._drainWaiter
+        self._drainWaiter = None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def drain(self):
+        """Wait until the transport's write buffer has room for more data."""
+        if self._drainWaiter is not None:
+            await self._drainWaiter
+
+
+class CommandPriority(IntEnum):
+    """Priority of a queued command (lower values are sent first)."""
+
+    PANIC = 0
+    ARM = 1
+    NORMAL = 2
+    BACKGROUND = 3
+
 
 class EnvisalinkClient:
     """Abstract base class for the envisalink TPI client."""
@@ -28,33 +154,75 @@ class EnvisalinkClient:
             RETRY = "retry"
             FAILED = "failed"
 
-        def __init__(self, cmd, data, code, logData):
+        def __init__(self, cmd, data, code, logData, group=None, priority=CommandPriority.NORMAL):
             self.cmd = cmd
             self.data = data
             self.code = code
             self.logData = logData
+            self.group = group
+            self.priority = priority
+            self.queueTime = time.time()
             self.state = self.State.QUEUED
             self.retryDelay = 0.1  # Start the retry backoff at 100ms
             self.retryTime = 0
             self.expiryTime = 0
-            self.responseEvent = asyncio.Event()
+            self.future = asyncio.get_running_loop().create_future()
+
+        def complete(self, state):
+            """Record the final state of the operation and wake up anyone waiting on it."""
+            self.state = state
+            if not self.future.done():
+                self.future.set_result(state == self.State.SUCCEEDED)
 
     def __init__(self, panel):
         self._loggedin = False
         self._alarmPanel = panel
         self._eventLoop = asyncio.get_event_loop()
-        self._reader = None
-        self._writer = None
+        self._transport = None
+        self._protocol = None
+        self._loginTimer = None
         self._shutdown = False
         self._cachedCode = None
         self._commandTask = None
         self._readLoopTask = None
         self._keepAliveTask = None
         self._commandEvent = asyncio.Event()
-        self._commandQueue = []
+        self._commandQueues = [deque() for _ in CommandPriority]
+        self._groupQueue = None
+        self._inFlight = deque()
+        self._commandDeadlines = []
+        self._deadlineCounter = itertools.count()
+        self._groupCounter = itertools.count()
+        self._pipelinedCommands = frozenset()
+        self._coalescedCommands = frozenset()
+        self._queuedCommands = {}
+        self._commandPriorities = {}
+        self._commandLatency = {
+            priority: {"count": 0, "failed": 0, "total": 0.0, "max": 0.0}
+            for priority in CommandPriority
+        }
         self._activeTasks = set()
         self._reconnect_time = _RECONNECT_MIN_TIME
         self._connect_time = 0
+        self._dispatchTable = {}
+        self._zoneTimerTicks = None
+        self._periodicJobs = []
+        self._lastRxTime = 0
+        self._pendingUpdates = {}
+        self._flushTimer = None
+        self._capture = None
+
+    def build_dispatch_table(self, responseTypes):
+        """Resolve the handler for each response code once up front rather than looking it
+        up for every line received from the EVL."""
+        table = {}
+        for code, info in responseTypes.items():
+            handler = getattr(self, "handle_%s" % info["handler"], None)
+            if handler is None:
+                _LOGGER.debug("No handler method for '%s' (%s)", code, info["handler"])
+                continue
+            table[code] = (handler, info.get("state_change", False))
+        self._dispatchTable = table
 
     def create_internal_task(self, coro, name=None):
         task = self._eventLoop.create_task(coro, name=name)
@@ -67,23 +235,34 @@ class EnvisalinkClient:
     def start(self):
         """Public method for initiating connectivity with the envisalink."""
         self._shutdown = False
+        if self._alarmPanel.capture_file and self._capture is None:
+            self.start_capture(self._alarmPanel.capture_file)
         self._commandTask = self.create_internal_task(
             self.process_command_queue(), name="command_processor"
         )
         self._readLoopTask = self.create_internal_task(self.read_loop(), name="read_loop")
 
         if self._alarmPanel.keepalive_interval > 0:
-            self.create_internal_task(
-                self.periodic_command(self.keep_alive, self._alarmPanel.keepalive_interval),
-                name="keep_alive",
+            self.start_periodic_command(
+                self.keep_alive, self._alarmPanel.keepalive_interval, "keep_alive"
             )
 
         if self._alarmPanel.zone_timer_interval > 0:
-            self.create_internal_task(
-                self.periodic_command(self.dump_zone_timers, self._alarmPanel.zone_timer_interval),
-                name="zone_timer_dump",
+            self.start_periodic_command(
+                self.dump_zone_timers, self._alarmPanel.zone_timer_interval, "zone_timer_dump"
             )
 
+    def start_periodic_command(self, action, interval, name):
+        """Periodically run a command (e.g. a keepalive) while logged into the EVL.  Runs
+        from the panel's scheduler if it has one, otherwise from the scheduler shared by all
+        clients on the event loop.  The first run is randomly offset within the interval so
+        that many panels started together do not send their commands in lockstep."""
+        scheduler = self._alarmPanel.scheduler or get_default_scheduler()
+        job = scheduler.schedule(
+            action, interval, name=name, jitter=interval, condition=self.is_online
+        )
+        self._periodicJobs.append((scheduler, job))
+
     async def stop(self):
         """Public method for shutting down connectivity with the envisalink."""
         self._loggedin = False
@@ -92,60 +271,57 @@ class EnvisalinkClient:
         # Wake up the command processor task to allow it to exit
         self._commandEvent.set()
 
+        # Remove any periodic commands from the shared scheduler
+        for scheduler, job in self._periodicJobs:
+            scheduler.cancel(job)
+        self._periodicJobs = []
+
         # Cancel all tasks
         for t in self._activeTasks:
             t.cancel()
 
         await self.disconnect()
+        self.stop_capture()
 
         _LOGGER.info(
             "An event loop was given to us- we will shutdown when that event loop shuts down."
         )
 
+    def start_capture(self, path) -> bool:
+        """Record all of the lines received from and sent to the EVL (with credentials
+        scrubbed) to 'path' for later replay (see capture.replay_capture)."""
+        self.stop_capture()
+        metadata = {
+            "panel_type": self._alarmPanel.panel_type,
+            "envisalink_version": self._alarmPanel.envisalink_version,
+        }
+        try:
+            self._capture = CaptureWriter(path, metadata)
+        except OSError as ex:
+            _LOGGER.error("Unable to open capture file %s: %r", path, ex)
+            return False
+        return True
+
+    def stop_capture(self):
+        if self._capture:
+            self._capture.close()
+            self._capture = None
+
     async def read_loop(self):
         """Internal method handling connecting to the EVL and consuming data from it."""
         while not self._shutdown:
-            self._reader = None
-            self._writer = None
-
             _LOGGER.debug("Starting read loop.")
 
             try:
                 await self.connect()
 
-                if self._reader and self._writer:
-                    # Connected to EVL; start reading data from the connection
-                    while not self._shutdown and self._reader:
-                        _LOGGER.debug("Waiting for data from EVL")
-                        try:
-                            data = await asyncio.wait_for(
-                                self._reader.readuntil(separator=b"\n"), 5
-                            )
-                        except asyncio.exceptions.TimeoutError:
-                            if not self._loggedin and (
-                                (time.time() - self._connect_time)
-                                > self._alarmPanel.connection_timeout
-                            ):
-                                _LOGGER.error(
-                                    "Timed out waiting to complete login handshake; disconnecting."
-                                )
-                                await self.disconnect()
-                            continue
-                        except asyncio.IncompleteReadError:
-                            data = None
-
-                        if not data:
-                            if self._writer:
-                                _LOGGER.error("The server closed the connection.")
-                                await self.disconnect()
-                            break
-
-                        data = data.decode("ascii")
-                        _LOGGER.debug("{---------------------------------------")
-                        _LOGGER.debug(str.format("RX < {0}", data))
-
-                        self.process_data(data.strip())
-                        _LOGGER.debug("}---------------------------------------")
+                if self._transport:
+                    # Connected to EVL; data is processed by the protocol as it arrives so just
+                    # wait for the connection to go away.
+                    await asyncio.shield(self._protocol.closed)
+                    if self._transport:
+                        _LOGGER.error("The server closed the connection.")
+                        await self.disconnect()
 
             except Exception as ex:
                 _LOGGER.error("Caught unexpected exception: %r", ex)
@@ -158,30 +334,42 @@ class EnvisalinkClient:
 
         await self.disconnect()
 
-    async def periodic_command(self, action, interval):
-        """Used to periodically send a keepalive command to reset the envisalink's
-        watchdog timer."""
-        while not self._shutdown:
-            next_send = time.time() + interval
-
-            if self._loggedin:
-                await action()
-
-            now = time.time()
-            await asyncio.sleep(next_send - now)
+    def check_login_timeout(self):
+        """Drop the connection if the login handshake has not completed in time."""
+        self._loginTimer = None
+        if self._transport and not self._loggedin:
+            _LOGGER.error("Timed out waiting to complete login handshake; disconnecting.")
+            self.create_internal_task(self.disconnect(), name="login_timeout")
+
+    def process_lines(self, lines):
+        """Process a batch of lines received from the EVL."""
+        self._lastRxTime = time.time()
+        if self._capture:
+            self._capture.record_lines(
+                CAPTURE_RX, [self.scrub_sensitive_data(line) for line in lines], self._lastRxTime
+            )
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        try:
+            for line in lines:
+                if debug:
+                    _LOGGER.debug("RX < %s", line)
+                self.process_data(line.strip())
+        except Exception as ex:
+            _LOGGER.error("Caught unexpected exception: %r", ex)
+            self.create_internal_task(self.disconnect(), name="disconnect")
 
     async def connect(self):
         _LOGGER.info(
-            str.format(
-                "Started to connect to Envisalink... at {0}:{1}",
-                self._alarmPanel.host,
-                self._alarmPanel.port,
-            )
+            "Started to connect to Envisalink... at %s:%s",
+            self._alarmPanel.host,
+            self._alarmPanel.port,
         )
         self._loggedin = False
         try:
-            coro = asyncio.open_connection(self._alarmPanel.host, self._alarmPanel.port)
-            self._reader, self._writer = await asyncio.wait_for(
+            coro = self._eventLoop.create_connection(
+                partial(EnvisalinkProtocol, self), self._alarmPanel.host, self._alarmPanel.port
+            )
+            self._transport, self._protocol = await asyncio.wait_for(
                 coro, self._alarmPanel.connection_timeout
             )
             _LOGGER.info("Connection Successful!")
@@ -189,11 +377,14 @@ class EnvisalinkClient:
             self._alarmPanel.handle_connection_status(True)
             self._reconnect_time = _RECONNECT_MIN_TIME
             self._connect_time = time.time()
+            self._loginTimer = self._eventLoop.call_later(
+                self._alarmPanel.connection_timeout, self.check_login_timeout
+            )
             return
         except asyncio.exceptions.TimeoutError:
             _LOGGER.error("Timed out connecting to the envisalink at %s", self._alarmPanel.host)
             if not self._shutdown:
-                self._alarmPanel._loginTimeoutCallback(False)
+                self._alarmPanel.invoke_callback(self._alarmPanel.callback_login_timeout, False)
             await self.disconnect()
         except ConnectionResetError:
             _LOGGER.error(
@@ -214,29 +405,45 @@ class EnvisalinkClient:
         """Internal method for forcing connection closure if hung."""
         _LOGGER.debug("Cleaning up from disconnection with server.")
 
-        if not self._writer:
+        if not self._transport:
             # Already disconnected so don't do anything
             return
 
-        writer = self._writer
-        self._writer = None
-        self._reader = None
+        transport = self._transport
+        protocol = self._protocol
+        self._transport = None
+        self._protocol = None
+        if self._loginTimer:
+            self._loginTimer.cancel()
+            self._loginTimer = None
 
         self._loggedin = False
+        self._zoneTimerTicks = None
+
+        # Deliver any state changes still waiting in the current batch
+        self.flush_state_change_updates()
 
         # Fail all outstanding commands
-        for op in self._commandQueue:
-            op.state = self.Operation.State.FAILED
+        for op in self._inFlight:
+            self.complete_command(op, self.Operation.State.FAILED)
+        self._inFlight.clear()
+        for queue in self._commandQueues:
+            for op in queue:
+                self.complete_command(op, self.Operation.State.FAILED)
+            queue.clear()
+        self._groupQueue = None
+        self._queuedCommands.clear()
+        self._commandDeadlines.clear()
 
         # Tear down the connection
         try:
-            writer.close()
-            await writer.wait_closed()
+            transport.close()
+            await asyncio.shield(protocol.closed)
         except Exception as ex:
             if not self._shutdown:
                 _LOGGER.error("Exception while closing connection: %s", ex)
 
-        # Clean out all the failed commands from the queue
+        # Wake up the command processor so it notices the disconnection
         self._commandEvent.set()
 
         self._alarmPanel.handle_connection_status(False)
@@ -247,14 +454,16 @@ class EnvisalinkClient:
         if not logData:
             logData = self.scrub_sensitive_data(data)
         _LOGGER.debug("TX > %s", str(logData))
+        if self._capture:
+            self._capture.record(CAPTURE_TX, logData)
 
-        if not self._writer:
+        if not self._transport:
             _LOGGER.debug("Unable to send data; not connected.")
             return
 
         try:
-            self._writer.write((data + "\r\n").encode("ascii"))
-            await self._writer.drain()
+            self._transport.write((data + "\r\n").encode("ascii"))
+            await self._protocol.drain()
         except Exception as err:
             _LOGGER.error("Failed to write to the stream: %r", err)
             await self.disconnect()
@@ -268,7 +477,8 @@ class EnvisalinkClient:
         raise NotImplementedError()
 
     async def keep_alive(self):
-        """Send a keepalive command to reset it's watchdog timer."""
+        """Send a keepalive command to reset it's watchdog timer.  Returns True if the EVL
+        acknowledged it."""
         raise NotImplementedError()
 
     async def change_partition(self, partitionNumber):
@@ -319,81 +529,151 @@ class EnvisalinkClient:
         """Public method to activate the selected command output"""
         raise NotImplementedError()
 
-    def parseHandler(self, rawInput):
-        """When the envisalink contacts us- parse out which command and data."""
+    def parseHandler(self, rawInput) -> ParsedMessage:
+        """When the envisalink contacts us- parse out which command and data.  Returns None
+        if there is no handler for the received data."""
         raise NotImplementedError()
 
+    def lookup_handler(self, code, data) -> ParsedMessage:
+        """Build the parsed message for a code using the pre-built dispatch table.  Returns
+        None if there is no handler for the code."""
+        entry = self._dispatchTable.get(code)
+        if entry is None:
+            return None
+        return ParsedMessage(code, data, entry[0], entry[1])
+
     def process_data(self, data) -> str:
-        cmd = self.parseHandler(data)
+        msg = self.parseHandler(data)
+        if msg is None:
+            return
 
         result = None
         try:
             _LOGGER.debug(
-                str.format(
-                    "calling handler: {0} for code: {1} with data: {2}",
-                    cmd["handler"],
-                    cmd["code"],
-                    cmd["data"],
-                )
+                "calling handler: %s for code: %s with data: %s",
+                msg.handler.__name__,
+                msg.code,
+                msg.data,
             )
-            handlerFunc = getattr(self, cmd["handler"])
-            result = handlerFunc(cmd["code"], cmd["data"])
+            result = msg.handler(msg.code, msg.data)
 
-        except (AttributeError, TypeError, KeyError):
-            _LOGGER.debug("No handler configured for evl command.")
+        except (AttributeError, TypeError, KeyError) as ex:
+            _LOGGER.debug("Unable to process evl command %s: %r", msg.code, ex)
 
-        try:
-            _LOGGER.debug("Invoking state change callbacks")
-            if result and cmd["state_change"]:
+        if result and msg.state_change:
+            history = self._alarmPanel.event_history
+            if history is not None:
+                history.record_updates(result)
+
+            if self._alarmPanel.state_change_batch_window is not None:
+                self.queue_state_change_updates(result)
+                return
+
+            try:
+                _LOGGER.debug("Invoking state change callbacks")
                 self.handle_state_change_callbacks(result)
 
+            except (AttributeError, TypeError, KeyError) as ex:
+                _LOGGER.debug("No callback configured for evl command. %r", ex)
+
+    def queue_state_change_updates(self, updates):
+        """Hold on to state changes so that the callbacks are invoked once per change type for
+        everything received within the panel's batch window (a window of 0 batches the lines
+        received together in one read)."""
+        pending = self._pendingUpdates
+        for change_type, values in updates.items():
+            if not values:
+                continue
+            pendingChanges = pending.setdefault(change_type, {})
+            if not isinstance(values, dict):
+                values = dict.fromkeys(values, {})
+            for key, changes in values.items():
+                merged = pendingChanges.get(key)
+                if merged is None:
+                    pendingChanges[key] = dict(changes)
+                    continue
+                # Keep the original old value of a field that changed more than once and drop
+                # changes that were reverted within the window
+                reverted = False
+                for field, (old, new) in changes.items():
+                    if field in merged:
+                        old = merged[field][0]
+                        if old == new:
+                            del merged[field]
+                            reverted = True
+                            continue
+                    merged[field] = (old, new)
+                if reverted and not merged:
+                    del pendingChanges[key]
+
+        if pending and self._flushTimer is None:
+            self._flushTimer = self._eventLoop.call_later(
+                self._alarmPanel.state_change_batch_window, self.flush_state_change_updates
+            )
+
+    def flush_state_change_updates(self):
+        """Invoke the state change callbacks for all the batched changes."""
+        if self._flushTimer:
+            self._flushTimer.cancel()
+            self._flushTimer = None
+
+        if not self._pendingUpdates:
+            return
+        updates = self._pendingUpdates
+        self._pendingUpdates = {}
+        try:
+            _LOGGER.debug("Invoking batched state change callbacks")
+            self.handle_state_change_callbacks(updates)
+
         except (AttributeError, TypeError, KeyError) as ex:
             _LOGGER.debug("No callback configured for evl command. %r", ex)
 
     def handle_state_change_callbacks(self, updates):
+        """Invoke the panel's state change callbacks.  Handlers report the IDs that changed
+        either as a list or as a dict of {id: {field: (old, new)}}; the latter is also passed
+        on (as-is) to the state diff callback."""
+        panel = self._alarmPanel
+        if panel.callback_state_diff is not None:
+            diffs = {
+                change_type: values
+                for change_type, values in updates.items()
+                if values and isinstance(values, dict)
+            }
+            if diffs:
+                panel.invoke_callback(panel.callback_state_diff, diffs)
+
         for change_type, values in updates.items():
             if values:
+                if isinstance(values, dict):
+                    values = list(values)
                 _LOGGER.debug("Triggering state change callback for %s: %s", change_type, values)
                 if change_type == STATE_CHANGE_PARTITION:
-                    self._alarmPanel.callback_partition_state_change(values)
+                    panel.invoke_callback(panel.callback_partition_state_change, values)
                 elif change_type == STATE_CHANGE_ZONE:
-                    self._alarmPanel.callback_zone_state_change(values)
+                    panel.invoke_callback(panel.callback_zone_state_change, values)
                 elif change_type == STATE_CHANGE_ZONE_BYPASS:
-                    self._alarmPanel.callback_zone_bypass_state_change(values)
+                    panel.invoke_callback(panel.callback_zone_bypass_state_change, values)
                 elif change_type == STATE_CHANGE_KEYPAD:
-                    self._alarmPanel.callback_keypad_update(values)
+                    panel.invoke_callback(panel.callback_keypad_update, values)
                 else:
                     _LOGGER.error("Unhandled state change update: %s: %s", change_type, values)
 
     def convertZoneDump(self, theString):
         """Interpret the zone dump result, and convert to readable times."""
         returnItems = []
-        zoneNumber = 1
-        # every four characters
-        inputItems = re.findall("....", theString)
-        for inputItem in inputItems:
-            # Swap the couples of every four bytes (little endian to big endian)
-            swapedBytes = []
-            swapedBytes.insert(0, inputItem[0:2])
-            swapedBytes.insert(0, inputItem[2:4])
-
-            # add swapped set of four bytes to our return items, converting from hex to int
-            itemHexString = "".join(swapedBytes)
-            itemInt = int(itemHexString, 16)
-
-            # each value is a timer for a zone that ticks down every five seconds from maxint
-            MAXINT = 0xFFFF
-            itemTicks = MAXINT - itemInt
-            itemSeconds = itemTicks * 5
-
-            status = ""
+        for zoneNumber, itemTicks in enumerate(decode_zone_timer_dump(theString), start=1):
             if self.is_zone_open_from_zonedump(zoneNumber, itemTicks):
                 status = "open"
             else:
                 status = "closed"
 
-            returnItems.append({"zone": zoneNumber, "status": status, "seconds": itemSeconds})
-            zoneNumber += 1
+            returnItems.append(
+                {
+                    "zone": zoneNumber,
+                    "status": status,
+                    "seconds": itemTicks * ZONE_TIMER_TICK_SECONDS,
+                }
+            )
         return returnItems
 
     def handle_login(self, code, data):
@@ -446,32 +726,104 @@ class EnvisalinkClient:
         raise NotImplementedError()
 
     def handle_zone_timer_dump(self, code, data):
-        """Handle the zone timer data."""
-        results = []
+        """Handle the zone timer data.  Only zones whose timer has changed since the previous
+        dump, and open zones, are re-evaluated."""
+        results = {}
         now = time.time()
-        zoneInfoArray = self.convertZoneDump(data)
-        for zoneNumber, zoneInfo in enumerate(zoneInfoArray, start=1):
-            currentStatus = self._alarmPanel.alarm_state["zone"][zoneNumber]["status"]
-            newOpen = zoneInfo["status"] == "open"
-            newFault = zoneInfo["status"] == "open"
-            if newOpen != currentStatus["open"] or newFault != currentStatus["fault"]:
-                # State changed so add to result list
-                results.append(zoneNumber)
-
-            self._alarmPanel.alarm_state["zone"][zoneNumber]["status"].update(
-                {"open": newOpen, "fault": newFault}
-            )
-            self._alarmPanel.alarm_state["zone"][zoneNumber]["last_fault"] = (
-                now - zoneInfo["seconds"]
-            )
-            _LOGGER.debug("(zone %i) %s", zoneNumber, zoneInfo["status"])
+        allTicks = decode_zone_timer_dump(data)
+        previousTicks = self._zoneTimerTicks
+        self._zoneTimerTicks = allTicks
+        if previousTicks is None or len(previousTicks) != len(allTicks):
+            changed = range(len(allTicks))
+        else:
+            changed = changed_zone_timer_slots(previousTicks, allTicks)
+            # An open zone's timer reads the same in every dump but its last fault time still
+            # has to move forward
+            openSlots = [
+                zoneNumber - 1
+                for zoneNumber in self._alarmPanel.zone_index.members("open")
+                if zoneNumber <= len(allTicks)
+            ]
+            if openSlots:
+                changed = sorted(set(changed).union(openSlots))
+
+        zones = self._alarmPanel.alarm_state["zone"]
+        is_zone_open = self.is_zone_open_from_zonedump
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        for idx in changed:
+            zoneNumber = idx + 1
+            ticks = allTicks[idx]
+            zone = zones[zoneNumber]
+            currentStatus = zone.status
+            newOpen = is_zone_open(zoneNumber, ticks)
+            if (
+                newOpen != currentStatus.open
+                or newOpen != currentStatus.fault
+                or currentStatus.stale
+            ):
+                changes = currentStatus.apply({"open": newOpen, "fault": newOpen})
+                if changes:
+                    # State changed so add to the results
+                    results[zoneNumber] = changes
+
+            # Timers only have a 5 second resolution so ignore any smaller movement
+            lastFault = now - ticks * ZONE_TIMER_TICK_SECONDS
+            if abs(lastFault - zone.last_fault) >= ZONE_TIMER_TICK_SECONDS:
+                zone.last_fault = lastFault
+            if debug:
+                _LOGGER.debug("(zone %i) %s", zoneNumber, "open" if newOpen else "closed")
         return {STATE_CHANGE_ZONE: results}
 
-    async def queue_command(self, cmd, data, code=None):
-        return await self.queue_commands([{"cmd": cmd, "data": data, "code": code}])
+    def get_snapshot_data(self) -> dict:
+        """Client specific state to be saved in a state snapshot (must be JSON serializable)."""
+        return {}
+
+    def restore_snapshot_data(self, data: dict):
+        """Restore the client specific state saved by get_snapshot_data()."""
+        pass
+
+    def invalidate_zone_timer_dump(self):
+        """Force the next zone timer dump to re-evaluate every zone.  Used when zone state has
+        been changed by something other than a zone timer dump."""
+        self._zoneTimerTicks = None
+
+    async def queue_command(self, cmd, data, code=None, priority=None):
+        return await self.queue_commands([{"cmd": cmd, "data": data, "code": code}], priority)
+
+    async def queue_commands(self, command_list: list, priority=None):
+        """Queue a list of commands and wait for them to complete.  The commands are sent to
+        the EVL together as a group so that an unrelated command cannot be inserted in the
+        middle (e.g. of a sequence of keypresses).
+
+        Commands with a higher priority are sent ahead of any lower priority commands still
+        waiting in the queue.  If not given, the priority is looked up from
+        _commandPriorities (the highest priority of the commands in a group is used).
+
+        An idempotent command (see _coalescedCommands) that is identical to one already
+        waiting to be sent is not queued again; the caller instead shares the result of the
+        queued one, which is moved up to the caller's priority if that is higher."""
+        if priority is None:
+            priority = min(
+                self._commandPriorities.get(command["cmd"], CommandPriority.NORMAL)
+                for command in command_list
+            )
+
+        if len(command_list) == 1:
+            command = command_list[0]
+            op = self._queuedCommands.get((command["cmd"], command["data"]))
+            if op is not None:
+                _LOGGER.debug(
+                    "Command '%s' is already queued; waiting on the queued command", op.cmd
+                )
+                if priority < op.priority:
+                    self._commandQueues[op.priority].remove(op)
+                    op.priority = priority
+                    self._commandQueues[priority].append(op)
+                    self._commandEvent.set()
+                return await op.future
 
-    async def queue_commands(self, command_list: list):
         operations = []
+        group = next(self._groupCounter) if len(command_list) > 1 else None
         for command in command_list:
             cmd = command["cmd"]
             data = command["data"]
@@ -488,20 +840,24 @@ class EnvisalinkClient:
                 asyncio.current_task().get_name(),
             )
 
-            op = self.Operation(cmd, data, code, logData)
-            op.expiryTime = time.time() + self._alarmPanel.command_timeout
-            operations.append(op)
-            self._commandQueue.append(op)
+            operations.append(self.Operation(cmd, data, code, logData, group, priority))
 
+        if group is None and operations[0].cmd in self._coalescedCommands:
+            op = operations[0]
+            self._queuedCommands[(op.cmd, op.data)] = op
+        self._commandQueues[priority].extend(operations)
         self._commandEvent.set()
         for op in operations:
-            await op.responseEvent.wait()
-        return op.state == op.State.SUCCEEDED
+            result = await op.future
+        return result
 
     async def process_command_queue(self):
         """Manage processing of commands to be issued to the EVL.  Commands are serialized to
         the EVL to avoid overwhelming it and to make it easy to pair up responses (since there
-        are no sequence numbers for requests).
+        are no sequence numbers for requests).  If the panel is configured with a command
+        pipeline depth greater than 1, commands the EVL can accept back-to-back (see
+        _pipelinedCommands) are sent without waiting for the previous response, in which
+        case responses are paired up in the order the commands were sent.
 
         Operations that fail due to a recoverable error (e.g. buffer overruns) will be re-tried
         with a backoff."""
@@ -509,81 +865,143 @@ class EnvisalinkClient:
 
         while not self._shutdown:
             try:
-                now = time.time()
-                op = None
+                self._commandEvent.clear()
+                await self.process_command_deadlines(time.time())
+                await self.send_queued_commands()
 
-                # Default timeout to ensure we wake up periodically.
+                # Wait until there is more work to do (or the next deadline passes) but ensure
+                # we wake up periodically.
                 timeout = self._alarmPanel.command_timeout
-
-                while self._commandQueue:
-                    _LOGGER.debug(f"Checking command queue: len={len(self._commandQueue)}")
-                    op = self._commandQueue[0]
-                    timeout = op.expiryTime - now
-
-                    if op.state == self.Operation.State.SENT:
-                        # Still waiting on a response from the EVL so break out of loop and wait
-                        # for the response
-                        if now >= op.expiryTime:
-                            # Timeout waiting for response from the EVL so fail the command,
-                            # This is likely due to the EVL becoming unresponsive so tear down the
-                            # connection to start a recovery.
-                            _LOGGER.error(
-                                (
-                                    "Command '%s' failed due to timeout waiting for response "
-                                    "from EVL"
-                                ),
-                                op.cmd,
-                            )
-                            op.state = self.Operation.State.FAILED
-                            await self.disconnect()
-                        break
-                    elif op.state == self.Operation.State.QUEUED:
-                        # Send command to the EVL
-                        op.state = self.Operation.State.SENT
-                        op.expiryTime = time.time() + self._alarmPanel.command_timeout
-                        self._cachedCode = op.code
-                        try:
-                            await self.send_command(op.cmd, op.data, op.logData)
-                        except Exception as ex:
-                            _LOGGER.error(f"Unexpected exception trying to send command: {ex}")
-                            op.state = self.Operation.State.FAILED
-                    elif op.state == self.Operation.State.SUCCEEDED:
-                        # Remove completed command from head of the queue
-                        self._commandQueue.pop(0)
-                        op.responseEvent.set()
-                    elif op.state == self.Operation.State.RETRY:
-                        if now >= op.retryTime:
-                            # Time to re-issue the command
-                            op.state = self.Operation.State.QUEUED
-                        else:
-                            # Not time to re-issue yet so go back to sleep
-                            timeout = op.retryTime - now
-                            break
-                    elif op.state == self.Operation.State.FAILED:
-                        # Command completed; check the queue for more
-                        op.responseEvent.set()
-                        self._commandQueue.pop(0)
-
-                # Wait until there is more work to do
+                if self._commandDeadlines:
+                    timeout = min(timeout, self._commandDeadlines[0][0] - time.time())
                 try:
-                    self._commandEvent.clear()
-                    await asyncio.wait_for(self._commandEvent.wait(), timeout=timeout)
+                    await asyncio.wait_for(self._commandEvent.wait(), timeout=max(timeout, 0))
                     _LOGGER.debug("Command processor woke up.")
                 except asyncio.exceptions.TimeoutError:
                     pass
                 except Exception as ex:
-                    _LOGGER.error(f"Command processor woke up due unexpected exception {ex}")
+                    _LOGGER.error("Command processor woke up due unexpected exception %s", ex)
 
             except Exception as ex:
-                _LOGGER.error(f"Command processor caught unexpected exception {ex}")
+                _LOGGER.error("Command processor caught unexpected exception %s", ex)
 
         _LOGGER.info("Command processing task exited.")
 
+    def add_command_deadline(self, deadline, op):
+        heapq.heappush(self._commandDeadlines, (deadline, next(self._deadlineCounter), op))
+
+    async def process_command_deadlines(self, now):
+        """Handle the response timeouts and retry delays that have expired.  Deadlines are
+        left in the heap when an operation completes and are simply discarded here if they no
+        longer apply."""
+        deadlines = self._commandDeadlines
+        while deadlines and deadlines[0][0] <= now:
+            deadline, _, op = heapq.heappop(deadlines)
+            if op.state == self.Operation.State.SENT and op.expiryTime == deadline:
+                # Timeout waiting for response from the EVL so fail the command,
+                # This is likely due to the EVL becoming unresponsive so tear down the
+                # connection to start a recovery.
+                _LOGGER.error(
+                    "Command '%s' failed due to timeout waiting for response from EVL", op.cmd
+                )
+                if op in self._inFlight:
+                    self._inFlight.remove(op)
+                self.complete_command(op, self.Operation.State.FAILED)
+                await self.disconnect()
+                return
+            if op.state == self.Operation.State.RETRY and op.retryTime == deadline:
+                # Time to re-issue the command
+                op.state = self.Operation.State.QUEUED
+
+    def can_send_command(self, op) -> bool:
+        """Indicate whether the operation can be sent given the commands already in flight."""
+        inFlight = self._inFlight
+        if not inFlight:
+            return True
+        if len(inFlight) >= self._alarmPanel.command_pipeline_depth:
+            return False
+        pipelined = self._pipelinedCommands
+        if op.cmd not in pipelined or inFlight[0].cmd not in pipelined:
+            return False
+        # A group is only started once everything ahead of it has completed so that a retry
+        # of an earlier command cannot end up in the middle of the group.
+        return op.group is None or op.group == inFlight[-1].group
+
+    def next_command_queue(self):
+        """Return the queue holding the next command to send: the remainder of a partially
+        sent group, otherwise the highest priority queue with commands waiting."""
+        if self._groupQueue:
+            return self._groupQueue
+        for queue in self._commandQueues:
+            if queue:
+                return queue
+        return None
+
+    async def send_queued_commands(self):
+        while not self._shutdown:
+            queue = self.next_command_queue()
+            if queue is None:
+                break
+            op = queue[0]
+            if op.state == self.Operation.State.RETRY or not self.can_send_command(op):
+                break
+
+            queue.popleft()
+            # Keep sending from this queue until the rest of the group has been sent
+            if op.group is not None and queue and queue[0].group == op.group:
+                self._groupQueue = queue
+            else:
+                self._groupQueue = None
+            if op.cmd in self._coalescedCommands:
+                self._queuedCommands.pop((op.cmd, op.data), None)
+            op.state = self.Operation.State.SENT
+            op.expiryTime = time.time() + self._alarmPanel.command_timeout
+            self.add_command_deadline(op.expiryTime, op)
+            self._inFlight.append(op)
+            self._cachedCode = op.code
+            try:
+                await self.send_command(op.cmd, op.data, op.logData)
+            except Exception as ex:
+                _LOGGER.error("Unexpected exception trying to send command: %s", ex)
+                if op in self._inFlight:
+                    self._inFlight.remove(op)
+                self.complete_command(op, self.Operation.State.FAILED)
+
+    def complete_command(self, op, state):
+        """Complete an operation and record how long it took for its priority class."""
+        op.complete(state)
+        stats = self._commandLatency[op.priority]
+        latency = time.time() - op.queueTime
+        stats["count"] += 1
+        if state != self.Operation.State.SUCCEEDED:
+            stats["failed"] += 1
+        stats["total"] += latency
+        if latency > stats["max"]:
+            stats["max"] = latency
+
+    def command_latency_stats(self) -> dict:
+        """Number of commands completed (and failed) and their latency, from being queued to
+        being acknowledged by the EVL, for each priority class."""
+        result = {}
+        for priority, stats in self._commandLatency.items():
+            count = stats["count"]
+            result[priority.name.lower()] = {
+                "count": count,
+                "failed": stats["failed"],
+                "average": stats["total"] / count if count else 0.0,
+                "max": stats["max"],
+            }
+        return result
+
+    def keypad_cache_stats(self) -> dict:
+        """Hit rate of the keypad update cache for panels that have one."""
+        return {}
+
     def command_succeeded(self, cmd):
         """Indicate that a command has been successfully processed by the EVL."""
 
-        if self._commandQueue:
-            op = self._commandQueue[0]
+        if self._inFlight:
+            op = self._inFlight[0]
             if cmd and op.cmd != cmd:
                 _LOGGER.error(
                     (
@@ -594,25 +1012,24 @@ class EnvisalinkClient:
                     op.cmd,
                 )
             else:
-                op.state = self.Operation.State.SUCCEEDED
+                self._inFlight.popleft()
+                self.complete_command(op, self.Operation.State.SUCCEEDED)
         else:
             _LOGGER.error(
-                f"Command acknowledgement received for '{cmd}' when no command was issued."
+                "Command acknowledgement received for '%s' when no command was issued.", cmd
             )
 
-        # Wake up the command processing task to process this result
+        # Wake up the command processing task to send the next command
         self._commandEvent.set()
 
     def command_failed(self, retry=False):
         """Indicate that a command issued to the EVL has failed."""
 
-        if self._commandQueue:
-            op = self._commandQueue[0]
-            if op.state != self.Operation.State.SENT:
-                _LOGGER.error("Command/system error received when no command was issued.")
-            elif retry is False:
+        if self._inFlight:
+            op = self._inFlight.popleft()
+            if retry is False:
                 # No retry request so tag the command as failed
-                op.state = self.Operation.State.FAILED
+                self.complete_command(op, self.Operation.State.FAILED)
             else:
                 # Update the retry delay based on an exponential backoff
                 op.retryDelay *= 2
@@ -620,13 +1037,29 @@ class EnvisalinkClient:
                 if op.retryDelay >= self._alarmPanel.command_timeout:
                     # Don't extend the retry delay beyond the overall command timeout
                     _LOGGER.error("Maximum command retries attempted; aborting command.")
-                    op.state = self.Operation.State.FAILED
+                    self.complete_command(op, self.Operation.State.FAILED)
+                elif (
+                    op.group is not None and self._inFlight and self._inFlight[0].group == op.group
+                ):
+                    # The rest of the group has already been sent so re-issuing this command
+                    # would change the order of the group
+                    _LOGGER.error(
+                        "Command '%s %s' failed; unable to retry it after the rest of its group.",
+                        op.cmd,
+                        op.logData,
+                    )
+                    self.complete_command(op, self.Operation.State.FAILED)
                 else:
                     # Tag the command to be retried in the future by the command processor task
                     op.state = self.Operation.State.RETRY
                     op.retryTime = time.time() + op.retryDelay
+                    self.add_command_deadline(op.retryTime, op)
+                    self._commandQueues[op.priority].appendleft(op)
                     _LOGGER.warn(
-                        f"Command '{op.cmd} {op.data}' failed; retry in {op.retryDelay} seconds."
+                        "Command '%s %s' failed; retry in %s seconds.",
+                        op.cmd,
+                        op.logData,
+                        op.retryDelay,
                     )
         else:
             _LOGGER.error("Command/system error received when no command is active.")
@@ -641,8 +1074,8 @@ class EnvisalinkClient:
         else:
             logData = data
 
-        if not code and self._commandQueue and self._commandQueue[0].code:
-            code = str(self._commandQueue[0].code)
+        if not code and self._inFlight and self._inFlight[-1].code:
+            code = str(self._inFlight[-1].code)
         if code:
             logData = logData.replace(code, "*" * len(code))
         return logData
@@ -651,12 +1084,14 @@ class EnvisalinkClient:
         """Indicate whether we are connected and successfully logged into the EVL"""
         return self._loggedin
 
+    @property
+    def last_message_time(self) -> float:
+        """Time at which data was last received from the EVL (0 if never)."""
+        return self._lastRxTime
+
     def clear_zone_bypass_state(self) -> list:
-        cleared_zones = []
-        for zone_number, zone_info in enumerate(
-            self._alarmPanel.alarm_state["zone"].values(), start=1
-        ):
-            if zone_info["bypassed"]:
-                cleared_zones.append(zone_number)
-            zone_info["bypassed"] = False
+        zones = self._alarmPanel.alarm_state["zone"]
+        cleared_zones = self._alarmPanel.zone_index.members("bypassed")
+        for zone_number in cleared_zones:
+            zones[zone_number].bypassed = False
         return cleared_zones
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from array import array
+from collections import namedtuple
+
+from .alarm_state import PartitionStatus, ZoneState, ZoneStatus
+from .const import (
+    STATE_CHANGE_KEYPAD,
+    STATE_CHANGE_PARTITION,
+    STATE_CHANGE_ZONE,
+    STATE_CHANGE_ZONE_BYPASS,
+)
+
+DEFAULT_EVENT_HISTORY_SIZE = 1024
+
+# Event type codes
+EVENT_ZONE = 1
+EVENT_PARTITION = 2
+EVENT_ZONE_BYPASS = 3
+EVENT_KEYPAD = 4
+EVENT_TYPES = {
+    STATE_CHANGE_ZONE: EVENT_ZONE,
+    STATE_CHANGE_PARTITION: EVENT_PARTITION,
+    STATE_CHANGE_ZONE_BYPASS: EVENT_ZONE_BYPASS,
+    STATE_CHANGE_KEYPAD: EVENT_KEYPAD,
+}
+EVENT_TYPE_NAMES = {code: name for name, code in EVENT_TYPES.items()}
+
+# Each field of the zone and partition records has a bit in an event's field mask.  Fields
+# that are not known ahead of time (e.g. the DSC 'pgm_N_last_triggered' entries) share the
+# top bit, and an event whose handler did not report which fields changed has them all set.
+EVENT_FIELDS = tuple(
+    field
+    for field in dict.fromkeys(ZoneStatus._fields + ZoneState._fields + PartitionStatus._fields)
+    if field != "status"
+)
+FIELD_BITS = {field: 1 << bit for bit, field in enumerate(EVENT_FIELDS)}
+FIELD_OTHER = 1 << 63
+ALL_FIELDS = (1 << 64) - 1
+
+# A single event read from the history.  'seq' is its position in the panel's event stream,
+# which keeps counting up as the ring buffer wraps.
+EventRecord = namedtuple("EventRecord", ["seq", "timestamp", "type", "id", "fields"])
+
+
+def fields_mask(fields) -> int:
+    """Return the field mask for an iterable of field names."""
+    mask = 0
+    for field in fields:
+        mask |= FIELD_BITS.get(field, FIELD_OTHER)
+    return mask
+
+
+def mask_fields(mask) -> list:
+    """Return the names of the (known) fields set in a field mask."""
+    return [field for field, bit in FIELD_BITS.items() if mask & bit]
+
+
+class EventHistory:
+    """Bounded history of a panel's state changes.
+
+    Events are kept as compact records (timestamp, type code, zone or partition number and
+    a mask of the fields that changed) in preallocated arrays used as a ring buffer, so
+    recording one never allocates.  Any number of consumers can follow the history through
+    their own EventCursor, reading only the events they have not yet seen:
+
+        cursor = panel.event_history.cursor()
+        async for event in cursor:
+            zone = panel.alarm_state["zone"][event.id]
+
+    A consumer that falls more than 'size' events behind skips the events that were
+    overwritten; the number skipped is counted in its cursor's 'missed'."""
+
+    def __init__(self, size=DEFAULT_EVENT_HISTORY_SIZE):
+        if size <= 0:
+            raise ValueError("The event history size must be positive")
+        self._size = size
+        self._timestamps = array("d", bytes(8 * size))
+        self._types = array("B", bytes(size))
+        self._ids = array("H", bytes(2 * size))
+        self._masks = array("Q", bytes(8 * size))
+        self._next = 0
+        self._waiter = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def next_seq(self) -> int:
+        """Sequence number that the next event recorded will be given."""
+        return self._next
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest event still held."""
+        return max(0, self._next - self._size)
+
+    def __len__(self):
+        return self._next - self.first_seq
+
+    def record(self, eventType, recordId, mask=ALL_FIELDS, timestamp=None):
+        idx = self._next % self._size
+        self._timestamps[idx] = timestamp or time.time()
+        self._types[idx] = eventType
+        self._ids[idx] = recordId
+        self._masks[idx] = mask
+        self._next += 1
+        if self._waiter is not None:
+            if not self._waiter.done():
+                self._waiter.set_result(None)
+            self._waiter = None
+
+    def record_updates(self, updates, timestamp=None):
+        """Record the state changes reported by a message handler, i.e. {change_type: ids}
+        where the IDs are either a list or a dict of {id: {field: (old, new)}}."""
+        timestamp = timestamp or time.time()
+        for changeType, values in updates.items():
+            eventType = EVENT_TYPES.get(changeType)
+            if not values or eventType is None:
+                continue
+            if isinstance(values, dict):
+                for recordId, changes in values.items():
+                    self.record(
+                        eventType,
+                        recordId,
+                        fields_mask(changes) if changes else ALL_FIELDS,
+                        timestamp,
+                    )
+            else:
+                for recordId in values:
+                    self.record(eventType, recordId, ALL_FIELDS, timestamp)
+
+    def read(self, seq, maxEvents=None) -> list:
+        """Return the events from 'seq' onwards (or from the oldest held, if 'seq' has been
+        overwritten), up to 'maxEvents' of them."""
+        seq = max(seq, self.first_seq)
+        end = self._next
+        if maxEvents is not None:
+            end = min(end, seq + maxEvents)
+        size = self._size
+        events = []
+        for s in range(seq, end):
+            idx = s % size
+            events.append(
+                EventRecord(
+                    s, self._timestamps[idx], self._types[idx], self._ids[idx], self._masks[idx]
+                )
+            )
+        return events
+
+    def cursor(self, fromStart=False):
+        """Return a cursor positioned after the most recent event, or at the oldest event
+        still held if 'fromStart' is set."""
+        return EventCursor(self, self.first_seq if fromStart else self._next)
+
+    async def wait(self, seq):
+        """Wait until there is an event with a sequence number of at least 'seq'."""
+        while self._next <= seq:
+            if self._waiter is None:
+                self._waiter = asyncio.get_running_loop().create_future()
+            await asyncio.shield(self._waiter)
+
+
+class EventCursor:
+    """A consumer's position in an EventHistory.  Iterate over it with 'async for' to wait for
+    and receive each new event, or call read() to collect whatever is available."""
+
+    def __init__(self, history: EventHistory, seq):
+        self._history = history
+        self._seq = seq
+        self._missed = 0
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the next event this cursor will return."""
+        return self._seq
+
+    @property
+    def missed(self) -> int:
+        """Number of events that were overwritten before this cursor read them."""
+        return self._missed
+
+    @property
+    def pending(self) -> int:
+        return self._history.next_seq - max(self._seq, self._history.first_seq)
+
+    def read(self, maxEvents=None) -> list:
+        """Return the events recorded since the last read (up to 'maxEvents')."""
+        first = self._history.first_seq
+        if self._seq < first:
+            self._missed += first - self._seq
+            self._seq = first
+        events = self._history.read(self._seq, maxEvents)
+        self._seq += len(events)
+        return events
+
+    async def read_wait(self, maxEvents=None) -> list:
+        """As read(), but waits for at least one event."""
+        await self._history.wait(self._seq)
+        return self.read(maxEvents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return (await self.read_wait(1))[0]
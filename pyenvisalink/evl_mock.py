@@ -1,10 +1,12 @@
+import argparse
 import asyncio
 import base64
 import logging
 import re
-import sys
 
 from .alarm_panel import EnvisalinkAlarmPanel
+from .mock_load_generator import LoadGenerator, load_replay_file, parse_mix
+from .mock_panel_server import MockPanelServer
 from .mock_server_dsc import DscServer
 from .mock_server_honeywell import HoneywellServer
 from .mock_server_uno import UnoServer
@@ -188,7 +190,48 @@ def accept_cli_client(client_reader, client_writer):
     task.add_done_callback(client_done)
 
 
-async def main():
+async def main_load(args):
+    """Serve 'args.panels' mock EVLs on consecutive ports, each flooding its client with
+    generated (or replayed) traffic once it has logged in."""
+    mix = parse_mix(args.mix) if args.mix else None
+    replayLines = load_replay_file(args.replay) if args.replay else None
+
+    panels = []
+    for idx in range(args.panels):
+        panel = MockPanelServer(
+            evl_mock_type,
+            evl_version,
+            password=evl_password,
+            alarmCode=evl_code,
+            host=None,
+            port=args.port + idx,
+        )
+        await panel.start()
+        generator = LoadGenerator(
+            panel.evl,
+            evl_mock_type,
+            rate=args.rate,
+            burst=args.burst,
+            poisson=args.poisson,
+            mix=mix,
+            replayLines=replayLines,
+        )
+        generator.start()
+        panels.append((panel, generator))
+        log.info("Mock EVL %d listening on port %d", idx + 1, panel.port)
+
+    try:
+        while True:
+            await asyncio.sleep(5)
+            sent = sum(generator.sent for _, generator in panels)
+            log.info("Sent %d messages across %d panel(s)", sent, len(panels))
+    finally:
+        for panel, generator in panels:
+            await generator.stop()
+            await panel.stop()
+
+
+async def main(args):
     global evl_server
 
     if evl_mock_type == "DSC":
@@ -206,46 +249,72 @@ async def main():
     else:
         raise KeyError(f"Unknown panel type: {evl_mock_type}")
 
-    server = await asyncio.start_server(accept_client, host=None, port=4025)
+    server = await asyncio.start_server(accept_client, host=None, port=args.port)
     await server.start_serving()
 
-    http_server = await asyncio.start_server(accept_http_client, host=None, port=8080)
+    http_server = await asyncio.start_server(accept_http_client, host=None, port=args.http_port)
     await http_server.start_serving()
 
-    cli_server = await asyncio.start_server(accept_cli_client, host=None, port=8000)
+    cli_server = await asyncio.start_server(accept_cli_client, host=None, port=args.cli_port)
     await cli_server.start_serving()
 
     while True:
         await asyncio.sleep(5)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Mock Envisalink.  With --rate the mock serves --panels EVLs on consecutive "
+        "ports and floods each connected client with traffic instead of serving the HTTP and "
+        "CLI endpoints."
+    )
+    parser.add_argument("panel_type", type=str.upper, choices=["HONEYWELL", "DSC", "UNO"])
+    parser.add_argument("version", choices=["3", "4"])
+    parser.add_argument("username")
+    parser.add_argument("password")
+    parser.add_argument("alarm_code")
+    parser.add_argument("--port", type=int, default=4025, help="TPI port (of the first panel)")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--cli-port", type=int, default=8000)
+    parser.add_argument("--panels", type=int, default=1, help="Number of panels in load mode")
+    parser.add_argument("--rate", type=float, help="Messages per second per panel (load mode)")
+    parser.add_argument("--burst", type=int, default=1, help="Messages sent per write")
+    parser.add_argument(
+        "--poisson",
+        action="store_true",
+        help="Space bursts randomly (exponentially) rather than evenly",
+    )
+    parser.add_argument(
+        "--mix",
+        help="Relative weights of the generated messages, e.g. zone=6,keypad=2,cid=1,timers=1 "
+        "(kinds: zone, keypad, partition, cid, timers)",
+    )
+    parser.add_argument("--replay", help="Replay the raw TPI lines in this file instead")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
     global evl_mock_type
     global evl_username
     global evl_password
     global evl_version
 
-    if len(sys.argv) != 6:
-        print(f"Usage: {sys.argv[0]} panel_type version username password alarm_code")
-        print("    panel_type: HONEYWELL | DSC | UNO")
-        print("    version: 3 | 4")
-        sys.exit(1)
-
-    evl_mock_type = sys.argv[1].upper()
-    evl_version = sys.argv[2]
-    evl_username = sys.argv[3]
-    evl_password = sys.argv[4]
-    evl_code = sys.argv[5]
+    args = parse_args()
+    evl_mock_type = args.panel_type
+    evl_version = args.version
+    evl_username = args.username
+    evl_password = args.password
+    evl_code = args.alarm_code
 
     log = logging.getLogger("")
     formatter = logging.Formatter(
         "%(asctime)s %(levelname)s " + "[%(module)s:%(lineno)d] %(message)s"
     )
     # setup console logging
-    log.setLevel(logging.DEBUG)
+    log.setLevel(logging.INFO if args.rate else logging.DEBUG)
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
 
     ch.setFormatter(formatter)
     log.addHandler(ch)
-    asyncio.run(main())
+    asyncio.run(main_load(args) if args.rate else main(args))
@@ -1,13 +1,9 @@
-import json
 import logging
-import re
 import time
 
 from .const import STATE_CHANGE_PARTITION, STATE_CHANGE_ZONE, STATE_CHANGE_ZONE_BYPASS
-from .envisalink_base_client import EnvisalinkClient
+from .envisalink_base_client import CommandPriority, EnvisalinkClient
 from .honeywell_envisalinkdefs import (
-    Beep_Flags,
-    IconLED_Flags,
     evl_ArmDisarm_CIDs,
     evl_CID_Events,
     evl_CID_Qualifiers,
@@ -15,8 +11,8 @@ from .honeywell_envisalinkdefs import (
     evl_PanicTypes,
     evl_ResponseTypes,
     evl_TPI_Response_Codes,
-    evl_Virtual_Keypad_How_To_Beep,
 )
+from .honeywell_keypad import KeypadCache, classify_alpha, decode_beep, decode_icons
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,15 +23,31 @@ class HoneywellClient(EnvisalinkClient):
     def __init__(self, panel):
         super().__init__(panel)
         self._zoneTimers = {}
+        self._keypadCache = KeypadCache()
         self._evl_ResponseTypes = evl_ResponseTypes
         self._evl_TPI_Response_Codes = evl_TPI_Response_Codes
+        self._pipelinedCommands = frozenset(
+            (
+                evl_Commands["KeepAlive"],
+                evl_Commands["DumpZoneTimers"],
+                evl_Commands["PartitionKeypress"],
+            )
+        )
+        self._coalescedCommands = frozenset(
+            (evl_Commands["KeepAlive"], evl_Commands["DumpZoneTimers"])
+        )
+        self._commandPriorities = {
+            evl_Commands["KeepAlive"]: CommandPriority.BACKGROUND,
+            evl_Commands["DumpZoneTimers"]: CommandPriority.BACKGROUND,
+        }
+        self.build_dispatch_table(self._evl_ResponseTypes)
 
     def detect(prompt):
         """Given the initial connection data, determine if this is a Honeywell panel."""
         return prompt == "Login:"
 
     async def keep_alive(self):
-        await self.queue_command(evl_Commands["KeepAlive"], "")
+        return await self.queue_command(evl_Commands["KeepAlive"], "")
 
     async def send_command(self, code, data, logData=None):
         """Send a command in the proper honeywell format."""
@@ -48,7 +60,9 @@ class HoneywellClient(EnvisalinkClient):
         """Send a command to dump out the zone timers."""
         await self.queue_command(evl_Commands["DumpZoneTimers"], "")
 
-    async def queue_keypresses_to_partition(self, partitionNumber, keypresses, logData):
+    async def queue_keypresses_to_partition(
+        self, partitionNumber, keypresses, logData, priority=CommandPriority.NORMAL
+    ):
         commands = []
         for idx, char in enumerate(keypresses):
             log = data = f"{partitionNumber},{char}"
@@ -65,7 +79,7 @@ class HoneywellClient(EnvisalinkClient):
 
         # Queue up all the keypresses together to ensure an unrelated command cannot
         # be inserted in the middle.
-        await self.queue_commands(commands)
+        await self.queue_commands(commands, priority)
 
     async def keypresses_to_partition(self, partitionNumber, keypresses):
         """Send keypresses to a particular partition."""
@@ -77,6 +91,7 @@ class HoneywellClient(EnvisalinkClient):
             partitionNumber,
             code + "3",
             ("*" * len(code)) + "3",
+            CommandPriority.ARM,
         )
 
     async def arm_away_partition(self, code, partitionNumber):
@@ -85,6 +100,7 @@ class HoneywellClient(EnvisalinkClient):
             partitionNumber,
             code + "2",
             ("*" * len(code)) + "2",
+            CommandPriority.ARM,
         )
 
     async def arm_max_partition(self, code, partitionNumber):
@@ -93,6 +109,7 @@ class HoneywellClient(EnvisalinkClient):
             partitionNumber,
             code + "4",
             ("*" * len(code)) + "4",
+            CommandPriority.ARM,
         )
 
     async def arm_night_partition(self, code, partitionNumber, mode=None):
@@ -104,6 +121,7 @@ class HoneywellClient(EnvisalinkClient):
             partitionNumber,
             code + mode_keys,
             ("*" * len(code)) + mode_keys,
+            CommandPriority.ARM,
         )
 
     async def disarm_partition(self, code, partitionNumber):
@@ -112,11 +130,14 @@ class HoneywellClient(EnvisalinkClient):
             partitionNumber,
             code + "1",
             ("*" * len(code)) + "1",
+            CommandPriority.ARM,
         )
 
     async def panic_alarm(self, panicType):
         """Public method to raise a panic alarm."""
-        await self.keypresses_to_partition(1, evl_PanicTypes[panicType])
+        await self.queue_keypresses_to_partition(
+            1, evl_PanicTypes[panicType], None, CommandPriority.PANIC
+        )
 
     async def toggle_chime(self, code):
         """Public method to toggle a zone's bypass state."""
@@ -124,33 +145,26 @@ class HoneywellClient(EnvisalinkClient):
 
     def parseHandler(self, rawInput):
         """When the envisalink contacts us- parse out which command and data."""
-        cmd = {}
-        _LOGGER.debug(str.format("Data received:{0}", rawInput))
+        _LOGGER.debug("Data received:%s", rawInput)
 
-        parse = re.match(r"([%\^].+)\$", rawInput)
-        if parse and parse.group(1):
+        end = rawInput.rfind("$")
+        if end > 1 and rawInput[0] in "%^":
             # keep first sentinel char to tell difference between tpi and
             # Envisalink command responses.  Drop the trailing $ sentinel.
-            inputList = parse.group(1).split(",")
-            code = inputList[0]
-            cmd["code"] = code
-            cmd["data"] = ",".join(inputList[1:])
-            _LOGGER.debug(str.format("Code:{0} Data:{1}", code, cmd["data"]))
+            code, _, data = rawInput[:end].partition(",")
+            _LOGGER.debug("Code:%s Data:%s", code, data)
         elif not self._loggedin:
             # assume it is login info
             code = rawInput
-            cmd["code"] = code
-            cmd["data"] = ""
+            data = ""
         else:
             _LOGGER.error("Unrecognized data received from the envisalink. Ignoring.")
             return None
-        try:
-            cmd["handler"] = "handle_%s" % self._evl_ResponseTypes[code]["handler"]
-            cmd["state_change"] = self._evl_ResponseTypes[code].get("state_change", False)
-        except KeyError:
-            _LOGGER.warning(str.format("No handler defined in config for {0}, skipping...", code))
 
-        return cmd
+        msg = self.lookup_handler(code, data)
+        if msg is None:
+            _LOGGER.warning("No handler defined in config for %s, skipping...", code)
+        return msg
 
     def handle_login(self, code, data):
         """When the envisalink asks us for our password- send it."""
@@ -163,118 +177,95 @@ class HoneywellClient(EnvisalinkClient):
         """Handle the envisalink's initial response to our commands."""
         if data in self._evl_TPI_Response_Codes:
             responseInfo = self._evl_TPI_Response_Codes[data]
-            _LOGGER.debug("Envisalink response: " + responseInfo["msg"])
+            _LOGGER.debug("Envisalink response: %s", responseInfo["msg"])
             if data == "00":
                 self.command_succeeded(code[1:])
             else:
                 _LOGGER.error(
-                    "error sending command to envisalink.  Response was: " + responseInfo["msg"]
+                    "error sending command to envisalink.  Response was: %s", responseInfo["msg"]
                 )
                 self.command_failed(retry=responseInfo["retry"])
         else:
-            _LOGGER.error(str.format("Unrecognized response code ({0}) received", data))
+            _LOGGER.error("Unrecognized response code (%s) received", data)
             self.command_failed(retry=False)
 
     def handle_keypad_update(self, code, data):
         """Handle the response to when the envisalink sends keypad updates our way."""
-        partition_updates = []
-        zone_updates = []
-        bypass_updates = []
+        partition_updates = {}
+        zone_updates = {}
+        bypass_updates = {}
 
         now = time.time()
 
-        dataList = data.split(",")
-        # Custom messages and alpha fields might contain unescaped commas, so we'll recombine them:
-        if len(dataList) > 5:
-            dataList[4] = ",".join(dataList[4:])
-            del dataList[5:]
         # make sure data is in format we expect, current TPI seems to send bad data every so often
         # TODO: Make this a regex...
         if "%" in data:
             _LOGGER.error("Data format invalid from Envisalink, ignoring...")
             return
 
+        # Custom messages and alpha fields might contain unescaped commas so only split off the
+        # fields before the alpha
+        dataList = data.split(",", 4)
         partitionNumber = int(dataList[0])
         if not (partitionNumber in self._zoneTimers.keys()):
             self._zoneTimers[partitionNumber] = {}
-        partition_updates.append(partitionNumber)
-        flags = IconLED_Flags()
-        flags.asShort = int(dataList[1], 16)
+        iconWord = int(dataList[1], 16)
         try:
             user_zone_field = int(dataList[2])
         except ValueError:
             user_zone_field = None
-        beep_field = Beep_Flags()
-        beep_field.asByte = int(dataList[3], 16)
-        beep = evl_Virtual_Keypad_How_To_Beep.get(beep_field.beeps, "unknown")
-        armed_night = bool(beep_field.armed_night)
+        beep, armed_night = decode_beep(int(dataList[3], 16))
         alpha = dataList[4]
-        partition_status = HoneywellClient.get_partition_state(flags, alpha)
-        zone_code = HoneywellClient.get_zone_report_type(flags, alpha)
-        prior_ready = self._alarmPanel.alarm_state["partition"][partitionNumber]["status"]["ready"]
-        prior_bypass = self._alarmPanel.alarm_state["partition"][partitionNumber]["status"][
-            "armed_bypass"
-        ]
+        report = self._keypadCache.lookup(iconWord, alpha)
+        icons = report.icons
+        partition_status = report.partition_state
+        zone_code = report.zone_report
+        zones = self._alarmPanel.alarm_state["zone"]
+        if report.zone is not None and (user_zone_field is None or user_zone_field not in zones):
+            # The user/zone field isn't a zone but the alpha names one ("FAULT 05 ...")
+            user_zone_field = report.zone
+        status = self._alarmPanel.alarm_state["partition"][partitionNumber].status
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        prior_ready = status.ready
+        prior_bypass = status.armed_bypass
 
         # TODO "armed_bypass" is included in the state below but just passes the bypass flag.
         # How is that used?
-        self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
-            {
-                "alarm": bool(flags.alarm),
-                "alarm_in_memory": bool(flags.alarm_in_memory),
-                "armed_away": bool(flags.armed_away),
-                "ac_present": bool(flags.ac_present),
-                "armed_bypass": bool(flags.bypass),
-                "chime": bool(flags.chime),
-                "armed_zero_entry_delay": bool(flags.armed_zero_entry_delay),
-                "alarm_fire_zone": bool(flags.alarm_fire_zone),
-                "trouble": bool(flags.system_trouble),
-                "ready": bool(flags.ready),
-                "fire": bool(flags.fire),
-                "armed_stay": bool(flags.armed_stay),
-                "alpha": alpha,
-                "beep": beep,
-                "armed_night": armed_night,
-            }
-        )
+        changes = status.apply(dict(icons.status, alpha=alpha, beep=beep, armed_night=armed_night))
 
         if (partition_status == "ready") and not prior_ready:
             # Clear all zones known to be in this partition
-            _LOGGER.debug(f"Clear partition {partitionNumber}")
+            _LOGGER.debug("Clear partition %d", partitionNumber)
             for z in list(self._zoneTimers[partitionNumber]):
-                _LOGGER.debug(f"Timer {z} :: {self._zoneTimers[partitionNumber][z]} Closing")
-                timer = str.split(z, "|")
-                zone_updates.append(int(timer[0]))
-                if timer[1] == "state":
-                    self._alarmPanel.alarm_state["zone"][int(timer[0])]["status"].update(
-                        {"open": False, "fault": False}
-                    )
+                if debug:
+                    _LOGGER.debug("Timer %s :: %s Closing", z, self._zoneTimers[partitionNumber][z])
+                self.close_zone_timer(z, zone_updates)
                 self._zoneTimers[partitionNumber].pop(z)
 
-        if prior_bypass and not bool(flags.bypass):
+        if prior_bypass and not icons.bypass:
             # Partition has switched from bypassed to not bypassed, so clear bypass flags
             # TODO Need to know which bypassed zones are in which partition to handle this.
             # No zone timers for these - either maintain a list or add partition to zone status
             _LOGGER.debug("Clear bypassed zones")
 
-        if flags.not_used2 and flags.not_used3:
+        if icons.partition_report:
             # Keypad update is giving partition status. Battery report applies to system battery
             _LOGGER.debug(
-                f"Keypad update is giving partition {partitionNumber} status. "
-                f"Partition: {partition_status} Zonecode: {zone_code}"
-            )
-            self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
-                {"bat_trouble": bool(flags.low_battery)}
+                "Keypad update is giving partition %d status. Partition: %s Zonecode: %s",
+                partitionNumber,
+                partition_status,
+                zone_code,
             )
+            changes.update(status.apply({"bat_trouble": icons.low_battery}))
 
         elif (partition_status == "arming") and (zone_code == "notready"):
             # Keypad is counting down. Nothing to do
             # TODO Add entry_delay to %00 update handler
-            _LOGGER.debug(f"Keypad is counting down to arm partition {partitionNumber}.")
+            _LOGGER.debug("Keypad is counting down to arm partition %d.", partitionNumber)
 
         elif user_zone_field is not None:
             # Keypad is giving zone status. Update zone status and check zone timers
-            _LOGGER.debug(f"Keypad is giving zone status for partition {partitionNumber}.")
+            _LOGGER.debug("Keypad is giving zone status for partition %d.", partitionNumber)
 
             # Increment all existing zone timers by 1
             for z in self._zoneTimers[partitionNumber]:
@@ -288,22 +279,25 @@ class HoneywellClient(EnvisalinkClient):
             elif zone_code == "bypass":
                 # Bypassed zones only show once in keypad updates and only clear when the
                 # partition is disarmed. No zone timer needed.
-                self._alarmPanel.alarm_state["zone"][user_zone_field]["bypassed"] = True
-                bypass_updates.append(user_zone_field)
+                zone = zones[user_zone_field]
+                if not zone.bypassed:
+                    zone.bypassed = True
+                    bypass_updates[user_zone_field] = {"bypassed": (False, True)}
             elif zone_code in ["alarm", "alarmcleared", "notready"]:
                 # Zone is open
 
                 # Only update the last_fault time if the zone transitioned to a faulted state
-                current_status = self._alarmPanel.alarm_state["zone"][user_zone_field]["status"]
-                if not current_status["open"] and not current_status["fault"]:
-                    _LOGGER.debug(f"Setting last fault for {user_zone_field}: {now}")
-                    self._alarmPanel.alarm_state["zone"][user_zone_field]["last_fault"] = now
-
-                self._alarmPanel.alarm_state["zone"][user_zone_field]["status"].update(
-                    {"open": True, "fault": True}
-                )
+                zone = zones[user_zone_field]
+                current_status = zone.status
+                if not current_status.open and not current_status.fault:
+                    _LOGGER.debug("Setting last fault for %d: %s", user_zone_field, now)
+                    zone.last_fault = now
+
+                zone_changes = current_status.apply({"open": True, "fault": True})
+                if zone_changes:
+                    zone_updates[user_zone_field] = zone_changes
+                    self.invalidate_zone_timer_dump()
                 self._zoneTimers[partitionNumber][f"{user_zone_field}|state"] = 1
-                zone_updates.append(user_zone_field)
 
             # Check and kill any overdue timers
             active_timers = len(self._zoneTimers[partitionNumber])
@@ -311,23 +305,21 @@ class HoneywellClient(EnvisalinkClient):
             max_timer = round(active_timers * 2 + 2, 0)
             for z in list(self._zoneTimers[partitionNumber]):
                 if self._zoneTimers[partitionNumber][z] > max_timer:
-                    _LOGGER.debug(f"Timer {z} :: {self._zoneTimers[partitionNumber][z]} Closing")
-                    timer = str.split(z, "|")
-                    zone_updates.append(int(timer[0]))
-                    if timer[1] == "state":
-                        self._alarmPanel.alarm_state["zone"][int(timer[0])]["status"].update(
-                            {"open": False, "fault": False}
+                    if debug:
+                        _LOGGER.debug(
+                            "Timer %s :: %s Closing", z, self._zoneTimers[partitionNumber][z]
                         )
+                    self.close_zone_timer(z, zone_updates)
                     # else:
                     # TODO Clear tamper/battery status
                     self._zoneTimers[partitionNumber].pop(z)
-                else:
-                    _LOGGER.debug(f"Timer {z} :: {self._zoneTimers[partitionNumber][z]}")
-            _LOGGER.debug(f"There are ({active_timers}) active timers")
+                elif debug:
+                    _LOGGER.debug("Timer %s :: %s", z, self._zoneTimers[partitionNumber][z])
+            _LOGGER.debug("There are (%d) active timers", active_timers)
 
-        _LOGGER.debug(
-            json.dumps(self._alarmPanel.alarm_state["partition"][partitionNumber]["status"])
-        )
+        _LOGGER.debug("Partition %d status: %s", partitionNumber, status)
+        if changes:
+            partition_updates[partitionNumber] = changes
         results = {}
         if partition_updates:
             results[STATE_CHANGE_PARTITION] = partition_updates
@@ -354,79 +346,73 @@ class HoneywellClient(EnvisalinkClient):
         partitionNumber = int(data[4:6])
         zoneOrUser = int(data[6:9])
         if cidEventInt in evl_ArmDisarm_CIDs:
+            status = self._alarmPanel.alarm_state["partition"][partitionNumber].status
             if eventTypeInt == 1:
-                self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
-                    {"last_disarmed_by_user": zoneOrUser}
-                )
+                status.last_disarmed_by_user = zoneOrUser
             if eventTypeInt == 3:
-                self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
-                    {"last_armed_by_user": zoneOrUser}
-                )
+                status.last_armed_by_user = zoneOrUser
 
-        _LOGGER.debug("Event Type is " + eventType)
-        _LOGGER.debug("CID Type is " + cidEvent["type"])
-        _LOGGER.debug("CID Description is " + cidEvent["label"])
-        _LOGGER.debug("Partition is " + str(partitionNumber))
-        _LOGGER.debug(cidEvent["type"] + " value is " + str(zoneOrUser))
+        _LOGGER.debug("Event Type is %s", eventType)
+        _LOGGER.debug("CID Type is %s", cidEvent["type"])
+        _LOGGER.debug("CID Description is %s", cidEvent["label"])
+        _LOGGER.debug("Partition is %d", partitionNumber)
+        _LOGGER.debug("%s value is %d", cidEvent["type"], zoneOrUser)
 
-        self._alarmPanel.callback_realtime_cid_event(cidEvent)
+        self._alarmPanel.invoke_callback(self._alarmPanel.callback_realtime_cid_event, cidEvent)
         return cidEvent
 
+    def close_zone_timer(self, timerKey, zone_updates):
+        """A keypad zone timer ('zone|type') has expired so close the zone if it was opened by
+        a keypad update."""
+        zoneNumber, timerType = timerKey.split("|")
+        if timerType == "state":
+            zoneNumber = int(zoneNumber)
+            changes = self._alarmPanel.alarm_state["zone"][zoneNumber].status.apply(
+                {"open": False, "fault": False}
+            )
+            if changes:
+                zone_updates[zoneNumber] = changes
+            self.invalidate_zone_timer_dump()
+
+    def keypad_cache_stats(self) -> dict:
+        return self._keypadCache.stats()
+
+    def get_snapshot_data(self) -> dict:
+        return {"zone_timers": self._zoneTimers}
+
+    def restore_snapshot_data(self, data: dict):
+        zoneTimers = data.get("zone_timers", {})
+        self._zoneTimers = {
+            int(partition): dict(timers) for partition, timers in zoneTimers.items()
+        }
+
     def is_zone_open_from_zonedump(self, zone, ticks) -> bool:
         now = time.time()
         last_zone_dump = now - self._alarmPanel.zone_timer_interval
-        last_update = self._alarmPanel.alarm_state["zone"][zone]["updated"]
+        zone_state = self._alarmPanel.alarm_state["zone"][zone]
 
-        if last_zone_dump < last_update:
+        if last_zone_dump < zone_state.updated:
             # This zone has been explicitly updated since the last zone timer dump so honor
             # its current state
-            return self._alarmPanel.alarm_state["zone"][zone]["status"]["open"]
+            return zone_state.status.open
 
         # The envisalink never seems to report back exactly 0 seconds for an open zone.
         # It always seems to be 1-3 ticks.  So 3 ticks or less will be considered open.
         return ticks <= 3
 
+    @staticmethod
     def get_partition_state(flags, alpha):
-        if bool(flags.alarm) or bool(flags.alarm_fire_zone) or bool(flags.fire):
-            return "alarm"
-        elif bool(flags.alarm_in_memory):
-            return "alarmcleared"
-        elif alpha.find("You may exit now") != -1:
-            return "arming"
-        elif alpha.find("May Exit Now") != -1:
-            return "arming"
-        elif bool(flags.armed_stay) and bool(flags.armed_zero_entry_delay):
-            return "armedinstant"
-        elif bool(flags.armed_away) and bool(flags.armed_zero_entry_delay):
-            return "armedmax"
-        elif bool(flags.armed_stay):
-            return "armedstay"
-        elif bool(flags.armed_away):
-            return "armedaway"
-        elif bool(flags.ready):
-            return "ready"
-        elif not bool(flags.ready):
-            return "notready"
-        else:
-            return "unknown"
+        """Return the partition state for a keypad update's IconLED_Flags and alpha text."""
+        return decode_icons(flags.asShort).partition_state[classify_alpha(alpha).arming]
 
+    @staticmethod
     def get_zone_report_type(flags, alpha):
-        if bool(flags.alarm) or bool(flags.alarm_fire_zone) or bool(flags.fire):
-            return "alarm"
-        elif bool(flags.alarm_in_memory):
-            return "alarmcleared"
-        elif bool(flags.system_trouble):
-            return "tamper"
-        elif bool(flags.low_battery):
-            return "battery"
-        elif bool(flags.bypass) and (alpha.find("BYPAS") != -1):
-            return "bypass"
-        elif not bool(flags.ready):
-            return "notready"
-        else:
-            return "unknown"
+        """Return the zone report type for a keypad update's IconLED_Flags and alpha text."""
+        return decode_icons(flags.asShort).zone_report[classify_alpha(alpha).bypass]
 
     def handle_debug_info(self, code, data):
         """Handle when the envisalink sends a debug message indicating that it received
         a malformed message from the panel."""
-        _LOGGER.debug(f"EVL received a malformed message from the panel; code={code} data={data}")
+        _LOGGER.debug(
+            "EVL received a malformed message from the panel; code=%s data=%s", code, data
+        )
@@ -0,0 +1,175 @@
+import re
+from collections import OrderedDict, namedtuple
+
+from .honeywell_envisalinkdefs import IconLED_Bitfield, evl_Virtual_Keypad_How_To_Beep
+
+# Icon bits in the keypad update's 16-bit icon word (bit 0 first)
+ICON_BITS = tuple(field[0] for field in IconLED_Bitfield._fields_)
+_ICON_MASKS = {name: 1 << bit for bit, name in enumerate(ICON_BITS)}
+
+# Partition status fields set directly from an icon of the same (or a renamed) bit
+_ICON_STATUS_FIELDS = (
+    ("alarm", "alarm"),
+    ("alarm_in_memory", "alarm_in_memory"),
+    ("armed_away", "armed_away"),
+    ("ac_present", "ac_present"),
+    ("armed_bypass", "bypass"),
+    ("chime", "chime"),
+    ("armed_zero_entry_delay", "armed_zero_entry_delay"),
+    ("alarm_fire_zone", "alarm_fire_zone"),
+    ("trouble", "system_trouble"),
+    ("ready", "ready"),
+    ("fire", "fire"),
+    ("armed_stay", "armed_stay"),
+)
+
+# Everything about a keypad update that depends only on its icon word:
+#   status            partition status fields set from the icons
+#   partition_state   (state, state if the alpha says the panel is arming)
+#   zone_report       (report type, report type if the alpha mentions a bypass)
+#   partition_report  True if the update reports on the partition rather than on a zone
+#   bypass, low_battery   the icons of the same name
+KeypadIcons = namedtuple(
+    "KeypadIcons",
+    ["status", "partition_state", "zone_report", "partition_report", "bypass", "low_battery"],
+)
+
+# Classification of a keypad update's alpha text.  'zone' is the zone number the alpha
+# names (e.g. 05 in "FAULT 05 FRONT DOOR"), or None.
+KeypadAlpha = namedtuple("KeypadAlpha", ["arming", "bypass", "zone"])
+
+# The decoded icons, partition state and zone report type for an icon word and alpha text,
+# along with the zone number named in the alpha
+KeypadReport = namedtuple("KeypadReport", ["icons", "partition_state", "zone_report", "zone"])
+
+# Beep byte -> (how to beep, armed night)
+_BEEPS = tuple(
+    (evl_Virtual_Keypad_How_To_Beep.get(byte & 0x0F, "unknown"), bool(byte & 0x10))
+    for byte in range(256)
+)
+
+_ALPHA_ZONE_REGEX = re.compile(r"(?:FAULT|BYPAS|ALARM|CHECK|LOBAT|FIRE|TRBL)\s+(\d+)")
+
+DEFAULT_KEYPAD_CACHE_SIZE = 512
+
+
+def _partition_state(icons, arming) -> str:
+    if icons["alarm"] or icons["alarm_fire_zone"] or icons["fire"]:
+        return "alarm"
+    elif icons["alarm_in_memory"]:
+        return "alarmcleared"
+    elif arming:
+        return "arming"
+    elif icons["armed_stay"] and icons["armed_zero_entry_delay"]:
+        return "armedinstant"
+    elif icons["armed_away"] and icons["armed_zero_entry_delay"]:
+        return "armedmax"
+    elif icons["armed_stay"]:
+        return "armedstay"
+    elif icons["armed_away"]:
+        return "armedaway"
+    elif icons["ready"]:
+        return "ready"
+    return "notready"
+
+
+def _zone_report(icons, bypassAlpha) -> str:
+    if icons["alarm"] or icons["alarm_fire_zone"] or icons["fire"]:
+        return "alarm"
+    elif icons["alarm_in_memory"]:
+        return "alarmcleared"
+    elif icons["system_trouble"]:
+        return "tamper"
+    elif icons["low_battery"]:
+        return "battery"
+    elif icons["bypass"] and bypassAlpha:
+        return "bypass"
+    elif not icons["ready"]:
+        return "notready"
+    return "unknown"
+
+
+def decode_icons(word) -> KeypadIcons:
+    """Decode a keypad update's 16-bit icon word.  KeypadCache caches the result along with
+    the rest of the update's KeypadReport."""
+    icons = {name: bool(word & mask) for name, mask in _ICON_MASKS.items()}
+    return KeypadIcons(
+        {field: icons[icon] for field, icon in _ICON_STATUS_FIELDS},
+        (_partition_state(icons, False), _partition_state(icons, True)),
+        (_zone_report(icons, False), _zone_report(icons, True)),
+        icons["not_used2"] and icons["not_used3"],
+        icons["bypass"],
+        icons["low_battery"],
+    )
+
+
+def decode_beep(byte) -> tuple:
+    """Decode a keypad update's beep byte into (how to beep, armed night)."""
+    return _BEEPS[byte & 0xFF]
+
+
+def classify_alpha(alpha) -> KeypadAlpha:
+    """Classify a keypad update's alpha text."""
+    match = _ALPHA_ZONE_REGEX.match(alpha)
+    return KeypadAlpha(
+        alpha.find("You may exit now") != -1 or alpha.find("May Exit Now") != -1,
+        alpha.find("BYPAS") != -1,
+        int(match.group(1)) if match else None,
+    )
+
+
+class KeypadCache:
+    """Bounded LRU cache of KeypadReports keyed by (icon word, alpha text).  A panel cycles
+    through a small set of keypad displays ("FAULT 05 ...", "Ready to Arm", "May Exit Now")
+    so nearly every update is answered without classifying its alpha again."""
+
+    def __init__(self, maxSize=DEFAULT_KEYPAD_CACHE_SIZE):
+        if maxSize <= 0:
+            raise ValueError("The keypad cache size must be positive")
+        self._maxSize = maxSize
+        self._cache = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def lookup(self, word, alpha) -> KeypadReport:
+        key = (word, alpha)
+        cache = self._cache
+        report = cache.get(key)
+        if report is not None:
+            self._hits += 1
+            cache.move_to_end(key)
+            return report
+
+        self._misses += 1
+        icons = decode_icons(word)
+        alphaInfo = classify_alpha(alpha)
+        report = cache[key] = KeypadReport(
+            icons,
+            icons.partition_state[alphaInfo.arming],
+            icons.zone_report[alphaInfo.bypass],
+            alphaInfo.zone,
+        )
+        if len(cache) > self._maxSize:
+            cache.popitem(last=False)
+            self._evictions += 1
+        return report
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """Number of lookups answered from the cache (and not), entries evicted and the
+        cache's current and maximum size."""
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "size": len(self._cache),
+            "max_size": self._maxSize,
+        }
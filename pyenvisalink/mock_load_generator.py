@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+
+from .const import PANEL_TYPE_DSC
+from .honeywell_envisalinkdefs import evl_ArmDisarm_CIDs, evl_CID_Events
+
+log = logging.getLogger(__name__)
+
+# Kinds of message the load generator synthesizes along with their default relative weights
+MESSAGE_ZONE = "zone"
+MESSAGE_KEYPAD = "keypad"
+MESSAGE_PARTITION = "partition"
+MESSAGE_CID = "cid"
+MESSAGE_TIMERS = "timers"
+DEFAULT_MIX = {
+    MESSAGE_ZONE: 60,
+    MESSAGE_KEYPAD: 25,
+    MESSAGE_PARTITION: 8,
+    MESSAGE_CID: 5,
+    MESSAGE_TIMERS: 2,
+}
+
+# Shortest pause between bursts; anything shorter is rounded up to a burst per loop iteration
+_MIN_SLEEP = 0.001
+
+_CID_CODES = sorted(evl_CID_Events)
+
+
+def parse_mix(text) -> dict:
+    """Parse a message mix such as 'zone=6,keypad=2,cid=1'."""
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown message kind '{kind}'")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def load_replay_file(path) -> list:
+    """Read raw TPI lines to replay, ignoring blank lines and '#' comments."""
+    with open(path, encoding="utf-8") as f:
+        lines = [line.rstrip("\r\n") for line in f]
+    return [line for line in lines if line.strip() and not line.startswith("#")]
+
+
+class LoadGenerator:
+    """Floods a client connected to a mock EVL with traffic, far faster than the mock's own
+    human paced updates.
+
+    Messages are either replayed from a list of raw TPI lines or synthesized (zone faults and
+    restores, keypad updates, partition updates, CID events and zone timer dumps) in the
+    proportions given by 'mix'.  They are sent 'burst' at a time in a single write, at an
+    average of 'rate' messages per second.  With 'poisson' set the gaps between bursts are
+    exponentially distributed rather than even, giving a more realistic (clumpy) arrival
+    pattern.  DSC panels do not report CID events so those are skipped for them."""
+
+    def __init__(
+        self,
+        server,
+        panelType,
+        rate=1000.0,
+        burst=1,
+        poisson=False,
+        mix=None,
+        replayLines=None,
+        seed=None,
+    ):
+        self._server = server
+        self._panelType = panelType
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._poisson = poisson
+        self._replayLines = replayLines
+        self._replayIndex = 0
+        self._random = random.Random(seed)
+        self._task = None
+        self._faulted = set()
+        self._sent = 0
+
+        mix = dict(mix or DEFAULT_MIX)
+        if panelType == PANEL_TYPE_DSC:
+            mix.pop(MESSAGE_CID, None)
+        self._kinds = [kind for kind, weight in mix.items() if weight > 0]
+        self._weights = [mix[kind] for kind in self._kinds]
+        self._builders = {
+            MESSAGE_ZONE: self.zone_message,
+            MESSAGE_KEYPAD: self.keypad_message,
+            MESSAGE_PARTITION: self.partition_message,
+            MESSAGE_CID: self.cid_message,
+            MESSAGE_TIMERS: self.zone_timer_message,
+        }
+
+    @property
+    def sent(self) -> int:
+        return self._sent
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="load_generator")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        log.info("Generating %.0f messages/s in bursts of %d", self._rate, self._burst)
+        loop = asyncio.get_running_loop()
+        interval = self._burst / self._rate
+        due = loop.time()
+        while True:
+            if not self._server.logged_in:
+                await asyncio.sleep(0.1)
+                due = loop.time()
+                continue
+
+            await self._server.write_raw("".join(self.next_line() for _ in range(self._burst)))
+            self._sent += self._burst
+
+            due += self._random.expovariate(1 / interval) if self._poisson else interval
+            delay = due - loop.time()
+            if delay < -1.0:
+                # Can't keep up; don't try to catch up on more than a second's worth
+                due = loop.time()
+            await asyncio.sleep(max(delay, 0) if delay >= _MIN_SLEEP else 0)
+
+    def next_line(self) -> str:
+        if self._replayLines:
+            line = self._replayLines[self._replayIndex]
+            self._replayIndex = (self._replayIndex + 1) % len(self._replayLines)
+            return f"{line}\r\n"
+
+        kind = self._random.choices(self._kinds, self._weights)[0]
+        return self._builders[kind]()
+
+    def encode(self, cmd, data) -> str:
+        if self._panelType == PANEL_TYPE_DSC:
+            return self._server.encode_command(cmd, data)
+        return f"%{cmd},{data}$\r\n"
+
+    def random_zone(self) -> int:
+        return self._random.randint(1, self._server.num_zones)
+
+    def zone_message(self) -> str:
+        zone = self.random_zone()
+        fault = zone not in self._faulted
+        if fault:
+            self._faulted.add(zone)
+        else:
+            self._faulted.discard(zone)
+        self._server.update_zone_state(zone, fault)
+
+        if self._panelType == PANEL_TYPE_DSC:
+            return self.encode("609" if fault else "610", "%03d" % zone)
+
+        zoneBits = 0
+        for faulted in self._faulted:
+            zoneBits |= 1 << (faulted - 1)
+        data = zoneBits.to_bytes(self._server.num_zones // 8, "little").hex().upper()
+        return self.encode("01", data)
+
+    def keypad_message(self) -> str:
+        if self._panelType == PANEL_TYPE_DSC:
+            # Keypad LED state; toggle the 'ready' LED
+            return self.encode("510", "81" if self._random.random() < 0.5 else "80")
+
+        return self.encode("00", self._server.build_keypad_zone_fault_update(self.random_zone()))
+
+    def partition_message(self) -> str:
+        if self._panelType == PANEL_TYPE_DSC:
+            return self.encode("650" if self._random.random() < 0.5 else "651", "1")
+        state = "01" if self._random.random() < 0.5 else "03"
+        return self.encode("02", state + "00" * 7)
+
+    def cid_message(self) -> str:
+        code = self._random.choice(_CID_CODES)
+        if code in evl_ArmDisarm_CIDs:
+            qualifier = self._random.choice((1, 3))
+        else:
+            qualifier = self._random.choice((1, 3, 6))
+        return self.encode("03", f"{qualifier}{code:03}01{self.random_zone():03}")
+
+    def zone_timer_message(self) -> str:
+        if self._panelType == PANEL_TYPE_DSC:
+            return self.encode("615", self._server.encode_zone_timers())
+        return self.encode("FF", self._server.encode_zone_timers())
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+from .alarm_panel import EnvisalinkAlarmPanel
+from .const import PANEL_TYPE_DSC, PANEL_TYPE_HONEYWELL, PANEL_TYPE_UNO
+from .mock_server_dsc import ZONE_STATUS_OPEN, ZONE_STATUS_RESTORED, DscServer
+from .mock_server_honeywell import HoneywellServer
+from .mock_server_uno import UnoServer
+
+_LOGGER = logging.getLogger(__name__)
+
+_SERVER_CLASSES = {
+    PANEL_TYPE_DSC: DscServer,
+    PANEL_TYPE_HONEYWELL: HoneywellServer,
+    PANEL_TYPE_UNO: UnoServer,
+}
+
+
+class MockPanelServer:
+    """Serves one of the mock EVLs (see evl_mock) on its own port so that any number of
+    them can run in the same process as the clients being measured."""
+
+    def __init__(
+        self,
+        panelType,
+        evlVersion="4",
+        password="user",
+        alarmCode="1234",
+        host="127.0.0.1",
+        port=0,
+        numPartitions=8,
+    ):
+        self._host = host
+        self._port = port
+        self._server = None
+        self._clientTask = None
+        self._numZones = EnvisalinkAlarmPanel.get_max_zones_by_version(evlVersion)
+        self._evl = _SERVER_CLASSES[panelType](self._numZones, numPartitions, password, alarmCode)
+        self._panelType = panelType
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def num_zones(self):
+        return self._numZones
+
+    @property
+    def evl(self):
+        return self._evl
+
+    async def start(self):
+        self._server = await asyncio.start_server(self.handle_client, self._host, self._port)
+        self._port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._clientTask:
+            # Give the client connection a moment to wind down now that the server is closed
+            task = self._clientTask
+            await asyncio.wait([task], timeout=1.0)
+            if not task.done():
+                task.cancel()
+
+    async def handle_client(self, reader, writer):
+        if self._clientTask is not None:
+            # Just like the EVL, only a single client can be connected at a time
+            writer.close()
+            return
+
+        self._clientTask = asyncio.current_task()
+        self._evl.connected(writer)
+        try:
+            await self._evl.hello()
+            while True:
+                data = await reader.readline()
+                line = data.decode().rstrip()
+                if not line or not await self._evl.process_command(line):
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as ex:
+            _LOGGER.error("Mock EVL on port %d failed: %r", self._port, ex)
+        finally:
+            self._clientTask = None
+            try:
+                await self._evl.disconnected()
+            except ConnectionError:
+                pass
+
+    async def set_zone_state(self, zone, faulted):
+        """Fault or restore a zone, sending the EVL's usual notifications for it."""
+        if self._panelType == PANEL_TYPE_DSC:
+            # The DSC mock only reports zone changes in its status report so send them here
+            self._evl.update_zone_state(zone, faulted)
+            status = ZONE_STATUS_OPEN if faulted else ZONE_STATUS_RESTORED
+            await self._evl.send_response(self._evl.encode_command(status, "%03d" % zone))
+        else:
+            await self._evl.set_zone_state(zone, faulted)
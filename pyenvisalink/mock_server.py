@@ -1,7 +1,7 @@
 import logging
 import time
 
-from alarm_state import AlarmState
+from .alarm_state import AlarmState
 
 log = logging.getLogger(__name__)
 
@@ -22,6 +22,14 @@ class MockServer:
             {"fault": False, "changed": 0.0, "bypassed": False} for idx in range(num_zones)
         ]
 
+    @property
+    def logged_in(self) -> bool:
+        return self._logged_in
+
+    @property
+    def num_zones(self) -> int:
+        return self._num_zones
+
     def connected(self, client_writer):
         self._client_writer = client_writer
 
@@ -55,6 +63,10 @@ class MockServer:
             await self._client_writer.drain()
 
     async def set_zone_state(self, zone: int, faulted: bool):
+        self.update_zone_state(zone, faulted)
+
+    def update_zone_state(self, zone: int, faulted: bool):
+        """Record a zone change without notifying the client."""
         self._zone_states[zone - 1].update({"fault": faulted, "changed": time.time()})
 
     def is_partition_ready(self, partition: int) -> bool:
@@ -1,7 +1,7 @@
 import asyncio
 import logging
 
-from mock_server import MockServer
+from .mock_server import MockServer
 
 ZONE_STATUS_ALARM = "601"
 ZONE_STATUS_ALARM_RESTORE = "602"
@@ -104,6 +104,10 @@ class DscServer(MockServer):
         checksum = self.get_checksum(cmd, data)
         return f"{cmd}{data}{checksum}\r\n"
 
+    def update_zone_state(self, zone: int, faulted: bool):
+        super().update_zone_state(zone, faulted)
+        self._zone_status[zone - 1] = ZONE_STATUS_OPEN if faulted else ZONE_STATUS_RESTORED
+
     async def send_response(self, response):
         log.info(f"send: {response}")
         await self.write_raw(response)
@@ -147,6 +151,7 @@ class DscServer(MockServer):
             return False
 
         response += self.encode_command("505", "1")
+        self._logged_in = True
 
         await self.send_response(response)
 
@@ -3,8 +3,8 @@ import logging
 import re
 import time
 
-from honeywell_envisalinkdefs import Beep_Bitfield, IconLED_Bitfield
-from mock_server import MockServer
+from .honeywell_envisalinkdefs import Beep_Bitfield, IconLED_Bitfield
+from .mock_server import MockServer
 
 ARM_DELAY = 5
 
@@ -274,9 +274,12 @@ class HoneywellServer(MockServer):
             )
 
     async def send_keypad_update_for_faulted_zone(self, zone: int):
-        await self.send_server_data(
-            "00",
-            f"01,{self._led_state},{zone:02},{self._beep_state},{self.build_keypad_zone_fault_string(zone)}",  # noqa: E501
+        await self.send_server_data("00", self.build_keypad_zone_fault_update(zone))
+
+    def build_keypad_zone_fault_update(self, zone: int) -> str:
+        return (
+            f"01,{self._led_state},{zone:02},{self._beep_state},"
+            f"{self.build_keypad_zone_fault_string(zone)}"
         )
 
     def get_next_faulted_zone(self) -> int:
@@ -1,6 +1,6 @@
 import logging
 
-from mock_server_honeywell import ERR_SUCCESS, HoneywellServer
+from .mock_server_honeywell import ERR_SUCCESS, HoneywellServer
 
 ARM_DELAY = 5
 
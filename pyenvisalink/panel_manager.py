@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from .alarm_panel import EnvisalinkAlarmPanel
+from .discovery import DEFAULT_DISCOVERY_TIMEOUT, discover_panels
+from .discovery_cache import DiscoveryCache
+from .scheduler import DEFAULT_RESOLUTION, PeriodicScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+# How often to retry starting panels whose last start attempt failed
+_RESTART_INTERVAL = 60
+
+
+class PanelManager:
+    """Supervises many EnvisalinkAlarmPanel instances running on a single event loop.
+
+    All managed panels share one PeriodicScheduler for their keepalive and zone timer dump
+    commands so that the number of tasks does not grow with the number of panels for
+    periodic work.  Panels that fail to start are retried periodically (except when the
+    credentials were rejected) and health() reports an aggregate view of the fleet.  If a
+    DiscoveryCache is given it is shared by all of the panels, as is a single aiohttp
+    session for the EVLs' web interfaces."""
+
+    def __init__(
+        self,
+        maxConcurrentStarts=20,
+        restartInterval=_RESTART_INTERVAL,
+        schedulerResolution=DEFAULT_RESOLUTION,
+        discoveryCache=None,
+        httpSession=None,
+    ):
+        self._panels = {}
+        self._scheduler = PeriodicScheduler(schedulerResolution)
+        self._discoveryCache = discoveryCache
+        self._httpSession = httpSession
+        self._ownsHttpSession = False
+        self._maxConcurrentStarts = maxConcurrentStarts
+        self._restartInterval = restartInterval
+        self._restartJob = None
+        self._startSemaphore = None
+
+    @property
+    def panels(self) -> dict:
+        return self._panels
+
+    @property
+    def scheduler(self) -> PeriodicScheduler:
+        return self._scheduler
+
+    @property
+    def discovery_cache(self) -> DiscoveryCache:
+        return self._discoveryCache
+
+    def get_http_session(self) -> aiohttp.ClientSession:
+        """The aiohttp.ClientSession shared by all managed panels to query the EVLs' web
+        interfaces.  Created on first use if one was not given."""
+        if self._httpSession is None or self._httpSession.closed:
+            self._httpSession = aiohttp.ClientSession()
+            self._ownsHttpSession = True
+            for panel in self._panels.values():
+                panel.http_session = self._httpSession
+        return self._httpSession
+
+    @staticmethod
+    def panel_key(host, port) -> str:
+        return f"{host}:{port}"
+
+    def get_panel(self, host, port=4025) -> EnvisalinkAlarmPanel:
+        return self._panels.get(PanelManager.panel_key(host, port))
+
+    def add_panel(self, panel: EnvisalinkAlarmPanel) -> EnvisalinkAlarmPanel:
+        """Place an existing panel under management.  The panel is not started."""
+        key = PanelManager.panel_key(panel.host, panel.port)
+        if key in self._panels:
+            raise ValueError(f"A panel is already managed for {key}")
+        panel.scheduler = self._scheduler
+        if self._discoveryCache is not None and panel.discovery_cache is None:
+            panel.discovery_cache = self._discoveryCache
+        if self._httpSession is not None:
+            panel.http_session = self._httpSession
+        self._panels[key] = panel
+        return panel
+
+    def create_panel(self, host, *args, **kwargs) -> EnvisalinkAlarmPanel:
+        """Create a new panel (see EnvisalinkAlarmPanel for arguments) and manage it."""
+        return self.add_panel(EnvisalinkAlarmPanel(host, *args, **kwargs))
+
+    async def remove_panel(self, host, port=4025):
+        """Stop a panel and remove it from management."""
+        panel = self._panels.pop(PanelManager.panel_key(host, port), None)
+        if panel is None:
+            return
+        if panel.last_connection_result:
+            # Started at some point, so it may still be connected or reconnecting
+            await panel.stop()
+        panel.scheduler = None
+        if panel.http_session is self._httpSession:
+            panel.http_session = None
+
+    async def start(self) -> dict:
+        """Start all managed panels that have never been started or whose last start
+        failed, with at most maxConcurrentStarts connection attempts in progress at once.
+        Panels that started successfully are left alone even while they are reconnecting.
+        Returns the ConnectionResult for each panel that was started, keyed by 'host:port'."""
+        if self._startSemaphore is None:
+            self._startSemaphore = asyncio.Semaphore(self._maxConcurrentStarts)
+        self.get_http_session()
+
+        if self._restartJob is None and self._restartInterval > 0:
+            self._restartJob = self._scheduler.schedule(
+                self.restart_failed_panels,
+                self._restartInterval,
+                name="restart_failed_panels",
+                delay=self._restartInterval,
+            )
+
+        pending = {key: panel for key, panel in self._panels.items() if not self.is_started(panel)}
+        results = await asyncio.gather(*[self._start_panel(panel) for panel in pending.values()])
+        return dict(zip(pending.keys(), results))
+
+    @staticmethod
+    def is_started(panel) -> bool:
+        """Whether a panel's last start succeeded, i.e. its client is connected or is
+        reconnecting."""
+        return panel.last_connection_result == EnvisalinkAlarmPanel.ConnectionResult.SUCCESS
+
+    async def _start_panel(self, panel):
+        async with self._startSemaphore:
+            try:
+                return await panel.start()
+            except Exception as ex:
+                _LOGGER.error("Unexpected exception starting panel %s: %r", panel.host, ex)
+                return EnvisalinkAlarmPanel.ConnectionResult.CONNECTION_FAILED
+
+    async def restart_failed_panels(self):
+        """Retry starting the panels whose last start attempt failed."""
+        failed = [
+            panel
+            for panel in self._panels.values()
+            if panel.last_connection_result
+            not in (
+                None,
+                EnvisalinkAlarmPanel.ConnectionResult.SUCCESS,
+                EnvisalinkAlarmPanel.ConnectionResult.INVALID_AUTHORIZATION,
+            )
+        ]
+        if failed:
+            _LOGGER.info("Retrying %d panel(s) that failed to start", len(failed))
+            await asyncio.gather(*[self._start_panel(panel) for panel in failed])
+
+    async def stop(self):
+        """Stop all managed panels."""
+        if self._restartJob:
+            self._scheduler.cancel(self._restartJob)
+            self._restartJob = None
+
+        await asyncio.gather(
+            *[panel.stop() for panel in self._panels.values() if panel.last_connection_result]
+        )
+
+        if self._ownsHttpSession and self._httpSession is not None:
+            await self._httpSession.close()
+            self._httpSession = None
+            self._ownsHttpSession = False
+
+    def discover_panels(self, timeout=DEFAULT_DISCOVERY_TIMEOUT):
+        """Discover the managed panels that are not started concurrently (at most
+        maxConcurrentStarts at a time), yielding a DiscoveryResult for each as it completes.
+        Started panels are skipped since their details are already known and the EVL only
+        accepts a single TPI connection.  See discovery.discover_panels."""
+        return discover_panels(
+            [panel for panel in self._panels.values() if not self.is_started(panel)],
+            self._maxConcurrentStarts,
+            timeout,
+            self.get_http_session(),
+            self._discoveryCache,
+        )
+
+    def health(self) -> dict:
+        """Aggregate health of all managed panels."""
+        now = time.time()
+        panels = {}
+        online = 0
+        for key, panel in self._panels.items():
+            isOnline = panel.is_online()
+            if isOnline:
+                online += 1
+            lastMessage = panel.last_message_time
+            result = panel.last_connection_result
+            panels[key] = {
+                "online": isOnline,
+                "panel_type": panel.panel_type,
+                "last_connection_result": result.value if result else None,
+                "disconnects": panel.disconnect_count,
+                "seconds_since_last_message": (now - lastMessage) if lastMessage else None,
+            }
+
+        return {
+            "panels": len(self._panels),
+            "online": online,
+            "offline": len(self._panels) - online,
+            "offline_panels": [key for key, info in panels.items() if not info["online"]],
+            "scheduled_jobs": self._scheduler.job_count,
+            "panel_health": panels,
+        }
@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import logging
+import math
+import random
+import weakref
+
+_LOGGER = logging.getLogger(__name__)
+
+# Granularity of the scheduler.  Jobs falling due within the same tick are run together
+# from a single event loop timer.
+DEFAULT_RESOLUTION = 0.5
+
+
+class PeriodicJob:
+    """A periodic action registered with a PeriodicScheduler."""
+
+    __slots__ = ("action", "interval", "name", "condition", "due", "task", "cancelled")
+
+    def __init__(self, action, interval, name, condition):
+        self.action = action
+        self.interval = interval
+        self.name = name
+        self.condition = condition
+        self.due = 0
+        self.task = None
+        self.cancelled = False
+
+
+class PeriodicScheduler:
+    """Runs periodic coroutine actions (e.g. keepalives and zone timer dumps) for any number
+    of clients without a dedicated task per action.
+
+    Jobs are hashed into buckets by the tick in which they fall due and a single event loop
+    timer is armed for the earliest occupied bucket, so thousands of jobs cost one pending
+    timer rather than thousands of sleeping tasks.  A job whose previous run is still in
+    progress when it falls due again, or whose condition is not met, is skipped for that
+    period."""
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION):
+        self._resolution = resolution
+        self._buckets = {}
+        self._ticks = []
+        self._timer = None
+        self._timerTick = None
+        self._running = False
+        self._jobCount = 0
+
+    @property
+    def job_count(self) -> int:
+        return self._jobCount
+
+    def schedule(
+        self, action, interval, name=None, delay=None, jitter=0.0, condition=None
+    ) -> PeriodicJob:
+        """Run the coroutine function 'action' every 'interval' seconds, starting after
+        'delay' seconds (defaults to immediately).
+
+        A random offset of up to 'jitter' seconds is added to the first run so that the
+        same job registered for many panels at once does not fire in lockstep.  If given,
+        'condition' is called when the job falls due and the run is skipped (without
+        creating a task) unless it returns True."""
+        job = PeriodicJob(action, interval, name, condition)
+        self._jobCount += 1
+        loop = asyncio.get_running_loop()
+        due = loop.time() + (delay or 0)
+        if jitter > 0:
+            due += random.uniform(0, jitter)
+        self._add(loop, job, due)
+        return job
+
+    def cancel(self, job: PeriodicJob):
+        """Stop running a job.  Any in-progress run of the job is cancelled."""
+        if job.cancelled:
+            return
+        job.cancelled = True
+        self._jobCount -= 1
+        if job.task:
+            job.task.cancel()
+            job.task = None
+
+    def _add(self, loop, job, due):
+        job.due = due
+        tick = math.ceil(due / self._resolution)
+        bucket = self._buckets.get(tick)
+        if bucket is None:
+            self._buckets[tick] = [job]
+            heapq.heappush(self._ticks, tick)
+            if not self._running and (self._timerTick is None or tick < self._timerTick):
+                self._arm(loop, tick)
+        else:
+            bucket.append(job)
+
+    def _arm(self, loop, tick):
+        if self._timer:
+            self._timer.cancel()
+        self._timerTick = tick
+        self._timer = loop.call_at(tick * self._resolution, self._run, loop)
+
+    def _run(self, loop):
+        self._timer = None
+        self._timerTick = None
+        self._running = True
+
+        now = loop.time()
+        currentTick = math.ceil(now / self._resolution)
+        due = []
+        while self._ticks and self._ticks[0] <= currentTick:
+            due.extend(self._buckets.pop(heapq.heappop(self._ticks)))
+
+        for job in due:
+            if job.cancelled:
+                continue
+            self._fire(loop, job)
+            # Schedule relative to the previous due time to avoid drift but never in the past
+            nextDue = job.due + job.interval
+            if nextDue <= now:
+                nextDue = now + job.interval
+            self._add(loop, job, nextDue)
+
+        self._running = False
+        if self._ticks:
+            self._arm(loop, self._ticks[0])
+
+    def _fire(self, loop, job):
+        if job.condition is not None and not job.condition():
+            return
+        if job.task and not job.task.done():
+            _LOGGER.debug("Skipping periodic job '%s'; previous run still in progress", job.name)
+            return
+        job.task = loop.create_task(job.action(), name=job.name)
+        job.task.add_done_callback(self._job_done)
+
+    def _job_done(self, task):
+        if task.cancelled():
+            return
+        ex = task.exception()
+        if ex:
+            _LOGGER.error("Periodic job '%s' failed: %r", task.get_name(), ex)
+
+
+_defaultSchedulers = weakref.WeakKeyDictionary()
+
+
+def get_default_scheduler() -> PeriodicScheduler:
+    """Return the PeriodicScheduler shared by all clients on the running event loop."""
+    loop = asyncio.get_running_loop()
+    scheduler = _defaultSchedulers.get(loop)
+    if scheduler is None:
+        scheduler = _defaultSchedulers[loop] = PeriodicScheduler()
+    return scheduler
@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import time
+
+from .alarm_state import PartitionStatus
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bump whenever the layout of the snapshot changes; snapshots of any other version are ignored
+SNAPSHOT_VERSION = 1
+
+_MISSING = object()
+
+# Layout of each zone row in a snapshot; zones are saved as rows rather than dicts to keep the
+# snapshot of a 128 zone system small
+_ZONE_ROW = ("open", "fault", "alarm", "tamper", "low_battery", "bypassed", "last_fault", "updated")
+_ZONE_STATUS_FIELDS = _ZONE_ROW[:5]
+
+
+def build_snapshot(panel, clientData=None) -> dict:
+    """Capture the alarm state and discovered metadata of a panel as a plain dict.
+
+    Only partition fields and zones that differ from their initial state are included."""
+    alarmState = panel.alarm_state
+    partitions = {}
+    zones = {}
+    if alarmState:
+        initialStatus = PartitionStatus()
+        for number, partition in alarmState["partition"].items():
+            status = {
+                key: value
+                for key, value in partition.status.items()
+                if initialStatus.get(key, _MISSING) != value
+            }
+            if status:
+                partitions[number] = status
+
+        for number, zone in alarmState["zone"].items():
+            status = zone.status
+            row = [status[key] for key in _ZONE_STATUS_FIELDS]
+            if not any(row) and not zone.bypassed and not zone.last_fault:
+                continue
+            row.extend((zone.bypassed, round(zone.last_fault, 1), round(zone.updated, 1)))
+            zones[number] = row
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "saved": time.time(),
+        "host": panel.host,
+        "port": panel.port,
+        "metadata": {
+            "panel_type": panel.panel_type,
+            "envisalink_version": panel.envisalink_version,
+            "firmware_version": panel.firmware_version,
+            "mac_address": panel.mac_address,
+        },
+        "partition": partitions,
+        "zone_row": _ZONE_ROW,
+        "zone": zones,
+        "client": clientData or {},
+    }
+
+
+def save_snapshot(path, snapshot: dict):
+    """Write a snapshot to 'path'.  The file is replaced atomically so that a crash part
+    way through never leaves a truncated snapshot behind."""
+    tmpPath = f"{path}.tmp"
+    with open(tmpPath, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmpPath, path)
+
+
+def load_snapshot(path, host=None, port=None):
+    """Read a snapshot previously written by save_snapshot().  Returns None if there is no
+    usable snapshot, i.e. it is missing, unreadable, from a different version or (if given)
+    for a different host/port."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as ex:
+        _LOGGER.warning("Ignoring unreadable state snapshot %s: %r", path, ex)
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        _LOGGER.warning("Ignoring state snapshot %s with an unsupported version", path)
+        return None
+    if (host is not None and snapshot.get("host") != host) or (
+        port is not None and snapshot.get("port") != port
+    ):
+        _LOGGER.warning("Ignoring state snapshot %s taken from a different panel", path)
+        return None
+    return snapshot
+
+
+def invalidate_snapshot_metadata(path):
+    """Mark the discovered metadata in the snapshot at 'path' as invalid (e.g. logging in
+    with it failed) so that it is no longer trusted.  The alarm state is still restored if
+    the panel type that is discovered instead matches."""
+    snapshot = load_snapshot(path)
+    if snapshot is None or snapshot["metadata"].get("invalid"):
+        return
+    snapshot["metadata"]["invalid"] = True
+    try:
+        save_snapshot(path, snapshot)
+    except OSError as ex:
+        _LOGGER.error("Unable to invalidate state snapshot %s: %r", path, ex)
+
+
+def restore_alarm_state(alarmState: dict, snapshot: dict):
+    """Load the partitions and zones of a snapshot into an alarm state collection.  Each
+    partition and zone restored is marked as stale until the panel next reports on it."""
+    for number, status in snapshot.get("partition", {}).items():
+        partition = alarmState["partition"].get(int(number))
+        if partition is not None:
+            partition.status.update(status)
+            partition.status.stale = True
+
+    rowLayout = snapshot.get("zone_row", _ZONE_ROW)
+    for number, row in snapshot.get("zone", {}).items():
+        zone = alarmState["zone"].get(int(number))
+        if zone is None:
+            continue
+        values = dict(zip(rowLayout, row))
+        zone.status.update({key: values[key] for key in _ZONE_STATUS_FIELDS if key in values})
+        zone.bypassed = values.get("bypassed", False)
+        zone.last_fault = values.get("last_fault", 0)
+        zone.updated = values.get("updated", 0.0)
+        zone.status.stale = True
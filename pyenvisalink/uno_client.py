@@ -1,8 +1,8 @@
-import json
 import logging
 import time
 
 from .const import STATE_CHANGE_PARTITION, STATE_CHANGE_ZONE, STATE_CHANGE_ZONE_BYPASS
+from .envisalink_base_client import CommandPriority
 from .honeywell_client import HoneywellClient
 from .uno_envisalinkdefs import (
     MajorTrouble_Flags,
@@ -23,6 +23,16 @@ class UnoClient(HoneywellClient):
         super().__init__(panel)
         self._evl_ResponseTypes = evl_ResponseTypes
         self._evl_TPI_Response_Codes = evl_TPI_Response_Codes
+        self._coalescedCommands |= {evl_Commands["InitialStateDump"]}
+        self._commandPriorities = self._commandPriorities | {
+            evl_Commands["PanicAlarm"]: CommandPriority.PANIC,
+            evl_Commands["Disarm"]: CommandPriority.ARM,
+            evl_Commands["StayArm"]: CommandPriority.ARM,
+            evl_Commands["AwayArm"]: CommandPriority.ARM,
+            evl_Commands["InitialStateDump"]: CommandPriority.BACKGROUND,
+            evl_Commands["HostInfo"]: CommandPriority.BACKGROUND,
+        }
+        self.build_dispatch_table(self._evl_ResponseTypes)
 
     def handle_login_success(self, code, data):
         """Handler for when the envisalink accepts our credentials."""
@@ -38,10 +48,13 @@ class UnoClient(HoneywellClient):
         return None
 
     def handle_zone_state_change(self, code, data):
-        """Handle when the envisalink sends us a zone change."""
-        zone_updates = []
+        """Handle when the envisalink sends us a zone change.  Only the zones whose state
+        actually changed are reported."""
+        zone_updates = {}
         now = time.time()
 
+        zones = self._alarmPanel.alarm_state["zone"]
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
         zoneNumber = 0
         num_bytes = len(data)
         idx = 0
@@ -52,24 +65,27 @@ class UnoClient(HoneywellClient):
                 faulted = byte & (1 << bit) != 0
                 zoneNumber += 1
 
-                self._alarmPanel.alarm_state["zone"][zoneNumber]["status"].update(
-                    {"open": faulted, "fault": faulted}
-                )
+                zone = zones[zoneNumber]
+                status = zone.status
+                if status.open != faulted or status.fault != faulted or status.stale:
+                    changes = status.apply({"open": faulted, "fault": faulted})
+                    if changes:
+                        zone_updates[zoneNumber] = changes
                 if faulted:
-                    self._alarmPanel.alarm_state["zone"][zoneNumber]["last_fault"] = now
+                    zone.last_fault = now
 
-                _LOGGER.debug(
-                    "(zone %i) is %s",
-                    zoneNumber,
-                    "Open/Faulted" if faulted else "Closed/Not Faulted",
-                )
-                zone_updates.append(zoneNumber)
+                if debug:
+                    _LOGGER.debug(
+                        "(zone %i) is %s",
+                        zoneNumber,
+                        "Open/Faulted" if faulted else "Closed/Not Faulted",
+                    )
 
         return {STATE_CHANGE_ZONE: zone_updates}
 
     def handle_partition_state_change(self, code, data):
         """Handle when the envisalink sends us a partition change."""
-        partition_updates = []
+        partition_updates = {}
         for currentIndex in range(0, 8):
             partitionNumber = currentIndex + 1
             partitionStateCode = data[currentIndex * 2 : (currentIndex * 2) + 2]
@@ -85,33 +101,27 @@ class UnoClient(HoneywellClient):
             if not partitionState or partitionState["name"] == "NOT_USED":
                 continue
 
-            previouslyArmed = self._alarmPanel.alarm_state["partition"][partitionNumber][
-                "status"
-            ].get("armed", False)
-            self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
-                partitionState["status"]
-            )
+            status = self._alarmPanel.alarm_state["partition"][partitionNumber].status
+            previouslyArmed = status.get("armed", False)
+            changes = status.apply(partitionState["status"])
 
             if partitionState["name"] == "EXIT_ENTRY_DELAY":
-                self._alarmPanel.alarm_state["partition"][partitionNumber]["status"].update(
-                    {
-                        "exit_delay": not previouslyArmed,
-                        "entry_delay": previouslyArmed,
-                    }
+                changes.update(
+                    status.apply(
+                        {"exit_delay": not previouslyArmed, "entry_delay": previouslyArmed}
+                    )
                 )
 
-            _LOGGER.debug(
-                "Partition " + str(partitionNumber) + " is in state " + partitionState["name"]
-            )
-            _LOGGER.debug(
-                json.dumps(self._alarmPanel.alarm_state["partition"][partitionNumber]["status"])
-            )
-            partition_updates.append(partitionNumber)
+            _LOGGER.debug("Partition %d is in state %s", partitionNumber, partitionState["name"])
+            _LOGGER.debug("Partition %d status: %s", partitionNumber, status)
+            if changes:
+                partition_updates[partitionNumber] = changes
 
         return {STATE_CHANGE_PARTITION: partition_updates}
 
     def handle_zone_bypass_update(self, code, data):
-        updates = []
+        updates = {}
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
         zoneNumber = 0
         num_bytes = len(data)
         idx = 0
@@ -122,18 +132,13 @@ class UnoClient(HoneywellClient):
                 bypassed = byte & (1 << bit) != 0
                 zoneNumber += 1
 
-                _LOGGER.debug(
-                    str.format(
-                        "(zone {0}) bypass state: {1}",
-                        zoneNumber,
-                        bypassed,
-                    )
-                )
+                if debug:
+                    _LOGGER.debug("(zone %i) bypass state: %s", zoneNumber, bypassed)
 
-                if self._alarmPanel.alarm_state["zone"][zoneNumber]["bypassed"] != bypassed:
-                    updates.append(zoneNumber)
-                    self._alarmPanel.alarm_state["zone"][zoneNumber]["bypassed"] = bypassed
-                    updates.append(zoneNumber)
+                zone = self._alarmPanel.alarm_state["zone"][zoneNumber]
+                if zone.bypassed != bypassed:
+                    updates[zoneNumber] = {"bypassed": (zone.bypassed, bypassed)}
+                    zone.bypassed = bypassed
 
         return {STATE_CHANGE_ZONE_BYPASS: updates}
 
@@ -154,24 +159,29 @@ class UnoClient(HoneywellClient):
 
     def handle_partition_trouble_state_change(self, code, data):
         """Process Partition Trouble State Change"""
-        partition_updates = []
+        partition_updates = {}
         for currentIndex in range(0, 8):
             partitionNumber = currentIndex + 1
             troubleCode = data[currentIndex * 2 : (currentIndex * 2) + 2]
             flags = MajorTrouble_Flags()
             flags.asByte = int(troubleCode, 16)
 
-            _LOGGER.debug(f"Partition {partitionNumber} has new trouble state {flags}")
+            _LOGGER.debug("Partition %d has new trouble state %s", partitionNumber, flags)
 
-            status = self._alarmPanel.alarm_state["partition"][partitionNumber]["status"]
-            status["trouble"] = bool(flags.service_required)
-            status["ac_present"] = not bool(flags.ac_failure)
-            status["bat_trouble"] = bool(flags.system_battery_overcurrent)
-            status["bell_trouble"] = bool(flags.system_bell_fault)
+            status = self._alarmPanel.alarm_state["partition"][partitionNumber].status
+            changes = status.apply(
+                {
+                    "trouble": bool(flags.service_required),
+                    "ac_present": not bool(flags.ac_failure),
+                    "bat_trouble": bool(flags.system_battery_overcurrent),
+                    "bell_trouble": bool(flags.system_bell_fault),
+                }
+            )
 
-            _LOGGER.debug(f"Partition {partitionNumber} status: {json.dumps(status)}")
+            _LOGGER.debug("Partition %d status: %s", partitionNumber, status)
 
-            partition_updates.append(partitionNumber)
+            if changes:
+                partition_updates[partitionNumber] = changes
 
         return {STATE_CHANGE_PARTITION: partition_updates}
 
@@ -16,7 +16,7 @@ setup(
     author="David O'Neill",
     author_email="ufodone@gmail.com",
     license="MIT",
-    packages=["pyenvisalink"],
+    packages=["pyenvisalink", "pyenvisalink.benchmark"],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Programming Language :: Python :: 3.10",